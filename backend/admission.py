@@ -0,0 +1,217 @@
+import asyncio
+import heapq
+import itertools
+import math
+import threading
+import time
+
+from fastapi import HTTPException
+
+import config
+import tracing
+
+# Priority classes, selectable per request (?priority=... or 'X-Priority'), best first.
+# Waiting requests are admitted in priority order; when the queue is full a request may
+# take the place of a queued request of a lower class, which is shed with a 503.
+PRIORITIES = ("high", "normal", "low")
+
+# Status of a request whose client went away (as in nginx); never actually delivered
+CLIENT_CLOSED = 499
+
+
+def _rejection(status_code, detail, retry_after):
+    return HTTPException(
+        status_code=status_code, detail=detail, headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+    )
+
+
+class _Waiter:
+    __slots__ = ("rank", "seq", "future")
+
+    def __init__(self, rank, seq, future):
+        self.rank = rank
+        self.seq = seq
+        self.future = future
+
+    def __lt__(self, other):
+        return (self.rank, self.seq) < (other.rank, other.seq)
+
+
+class AdmissionController:
+    """
+    Bounded concurrency in front of the /detect pipeline.
+
+    At most `max_concurrent` requests are processed at once and at most `max_queue`
+    wait for a slot; beyond that requests are rejected right away with 429 and a
+    Retry-After estimated from the recent service time. Every request has a deadline
+    (ADMISSION_DEFAULT_TIMEOUT unless it asks for another): a request that cannot be
+    served within it is rejected up front (503), one whose deadline passes in the
+    queue leaves it (503), and one still running at its deadline is cancelled (504).
+    Work of a request whose client disconnected is cancelled as well.
+
+    Cancellation stops the pipeline at its next stage: a pass already running on the
+    inference pool finishes, queued passes and later stages (ViT, OCR) never start.
+    """
+
+    def __init__(self, max_concurrent=None, max_queue=None):
+        self.max_concurrent = config.ADMISSION_MAX_CONCURRENT if max_concurrent is None else max_concurrent
+        self.max_queue = config.ADMISSION_MAX_QUEUE if max_queue is None else max_queue
+        self._active = 0
+        self._queue = []  # heap of _Waiter, best priority / oldest first
+        self._seq = itertools.count()
+        # Exponentially weighted mean of the time a request holds a slot
+        self._service_time = config.ADMISSION_INITIAL_SERVICE_S
+        self._lock = threading.Lock()
+        self._counts = dict.fromkeys(
+            ("admitted", "queued", "rejected_full", "rejected_deadline", "shed", "queue_timeouts",
+             "deadline_exceeded", "disconnects"), 0,
+        )
+
+    @property
+    def enabled(self):
+        return self.max_concurrent > 0
+
+    def _count(self, name):
+        with self._lock:
+            self._counts[name] += 1
+        tracing.count(f"admission_{name}")
+
+    def deadline(self, timeout=None):
+        """Absolute deadline (time.monotonic) for a request asking for `timeout` seconds."""
+        if timeout is None:
+            timeout = config.ADMISSION_DEFAULT_TIMEOUT
+        return time.monotonic() + min(timeout, config.ADMISSION_MAX_TIMEOUT)
+
+    def expected_wait(self, ahead):
+        """Seconds until a request with `ahead` requests queued before it gets a slot."""
+        if self._active < self.max_concurrent:
+            return 0.0
+        return (ahead // self.max_concurrent + 1) * self._service_time
+
+    async def run(self, work, request=None, priority=None, deadline=None):
+        """
+        Runs the coroutine function `work` once admitted, bounded by `deadline` and
+        cancelled if `request`'s client disconnects. Raises HTTPException 429 / 503 /
+        504 (with Retry-After where retrying makes sense).
+        """
+        deadline = self.deadline() if deadline is None else deadline
+        task = asyncio.ensure_future(self._run(work, priority or "normal", deadline))
+        watcher = asyncio.ensure_future(self._watch_disconnect(request, task)) if request is not None else None
+        try:
+            return await task
+        except asyncio.CancelledError:
+            if watcher is not None and watcher.done() and not watcher.cancelled() and watcher.result():
+                self._count("disconnects")
+                raise HTTPException(status_code=CLIENT_CLOSED, detail="Client closed request")
+            task.cancel()
+            raise
+        finally:
+            if watcher is not None:
+                watcher.cancel()
+
+    async def _watch_disconnect(self, request, task):
+        # True once the client is gone (and the work cancelled)
+        while not task.done():
+            if await request.is_disconnected():
+                task.cancel()
+                return True
+            await asyncio.sleep(config.ADMISSION_DISCONNECT_POLL_S)
+        return False
+
+    async def _run(self, work, priority, deadline):
+        if self.enabled:
+            with tracing.stage("admission_wait"):
+                await self._acquire(PRIORITIES.index(priority), deadline)
+        started = time.monotonic()
+        try:
+            remaining = deadline - started
+            if remaining <= 0:
+                raise asyncio.TimeoutError()
+            return await asyncio.wait_for(work(), remaining)
+        except asyncio.TimeoutError:
+            self._count("deadline_exceeded")
+            raise HTTPException(status_code=504, detail="Request deadline exceeded")
+        finally:
+            if self.enabled:
+                self._release(time.monotonic() - started)
+
+    async def _acquire(self, rank, deadline):
+        now = time.monotonic()
+        with self._lock:
+            if self._active < self.max_concurrent and not self._queue:
+                self._active += 1
+                self._counts["admitted"] += 1
+                return
+
+            ahead = sum(1 for w in self._queue if w.rank <= rank and not w.future.done())
+            wait = self.expected_wait(ahead)
+            if now + wait + self._service_time > deadline:
+                self._counts["rejected_deadline"] += 1
+                raise _rejection(503, "Server busy: the request deadline cannot be met", wait)
+
+            shed = None
+            if len(self._queue) >= self.max_queue:
+                # Full: take the place of the newest waiter of the lowest class below ours
+                candidates = [w for w in self._queue if w.rank > rank and not w.future.done()]
+                if not candidates:
+                    self._counts["rejected_full"] += 1
+                    raise _rejection(429, "Too many requests queued", self.expected_wait(len(self._queue)))
+                shed = max(candidates, key=lambda w: (w.rank, w.seq))
+                self._queue.remove(shed)
+                heapq.heapify(self._queue)
+                self._counts["shed"] += 1
+
+            waiter = _Waiter(rank, next(self._seq), asyncio.get_running_loop().create_future())
+            heapq.heappush(self._queue, waiter)
+            self._counts["queued"] += 1
+        tracing.count("admission_queued")
+        if shed is not None:
+            shed.future.set_exception(_rejection(503, "Shed for a higher-priority request", self._service_time))
+
+        try:
+            await asyncio.wait_for(waiter.future, deadline - now)
+        except asyncio.TimeoutError:
+            # Granted a slot in the same iteration as the timeout: hand it on
+            if self._granted(waiter):
+                self._release(None)
+            self._count("queue_timeouts")
+            raise _rejection(503, "Server busy: the request deadline passed while queued", self._service_time)
+        except asyncio.CancelledError:
+            # Granted a slot in the meantime: hand it on
+            if self._granted(waiter):
+                self._release(None)
+            raise
+        finally:
+            with self._lock:
+                if waiter in self._queue:
+                    self._queue.remove(waiter)
+                    heapq.heapify(self._queue)
+
+    @staticmethod
+    def _granted(waiter):
+        future = waiter.future
+        return future.done() and not future.cancelled() and future.exception() is None
+
+    def _release(self, service_time):
+        with self._lock:
+            if service_time is not None:
+                self._service_time += 0.2 * (service_time - self._service_time)
+            # The slot goes straight to the best waiter still waiting
+            while self._queue:
+                waiter = heapq.heappop(self._queue)
+                if not waiter.future.done():
+                    waiter.future.set_result(True)
+                    self._counts["admitted"] += 1
+                    return
+            self._active -= 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "max_concurrent": self.max_concurrent,
+                "max_queue": self.max_queue,
+                "active": self._active,
+                "queue_depth": sum(1 for w in self._queue if not w.future.done()),
+                "service_time_s": round(self._service_time, 4),
+                **self._counts,
+            }
@@ -0,0 +1,223 @@
+"""
+Inference backends for the YOLO and ViT models (INFERENCE_BACKEND):
+
+  torch     PyTorch eager (default)
+  onnx      ONNX Runtime, CPU execution provider      (pip install onnx onnxruntime)
+  openvino  OpenVINO runtime on CPU                    (pip install openvino nncf)
+
+Exported models live in BACKEND_DIR (default <MODEL_DIR>/exported) and are created
+on first load when BACKEND_AUTO_EXPORT is set, or ahead of time (e.g. in the Docker
+build) with:
+
+    python backends.py export --backend onnx [--int8]
+
+With BACKEND_INT8, ONNX models are dynamically quantized (INT8 weights, no
+calibration data needed). OpenVINO INT8 uses post-training quantization for YOLO,
+which needs a calibration dataset yaml (BACKEND_CALIBRATION_DATA), and INT8 weight
+compression for the ViT.
+
+Exported YOLO models are loaded back through ultralytics.YOLO, which returns the
+same Results objects as the torch model; the ViT is wrapped so it is called exactly
+like ViTForImageClassification. bench_backends.py checks parity and speed.
+"""
+import argparse
+import os
+import shutil
+from collections import namedtuple
+
+import torch
+from ultralytics import YOLO
+
+import config
+from model_registry import model_path
+
+BACKENDS = ("torch", "onnx", "openvino")
+
+# What ViTForImageClassification returns, as far as the detector is concerned
+ViTOutput = namedtuple("ViTOutput", ["logits"])
+
+
+def export_dir():
+    return config.BACKEND_DIR or os.path.join(config.MODEL_DIR, "exported")
+
+
+def _stem(name):
+    return os.path.splitext(os.path.basename(name.rstrip("/")))[0].replace("/", "_")
+
+
+def yolo_export_path(name, backend=None, int8=None):
+    backend = backend or config.INFERENCE_BACKEND
+    int8 = config.BACKEND_INT8 if int8 is None else int8
+    stem = _stem(name) + ("_int8" if int8 else "")
+    if backend == "onnx":
+        return os.path.join(export_dir(), f"{stem}.onnx")
+    return os.path.join(export_dir(), f"{stem}_openvino_model")
+
+
+def vit_export_path(backend=None, int8=None):
+    backend = backend or config.INFERENCE_BACKEND
+    int8 = config.BACKEND_INT8 if int8 is None else int8
+    stem = "vit_" + _stem(config.VIT_MODEL) + ("_int8" if int8 else "")
+    return os.path.join(export_dir(), f"{stem}.onnx" if backend == "onnx" else f"{stem}.xml")
+
+
+def _quantize_onnx(source, target):
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    quantize_dynamic(source, target, weight_type=QuantType.QInt8)
+
+
+# --- YOLO ---
+
+def export_yolo(name, backend, int8=False):
+    """Exports YOLO weights `name` for `backend` into export_dir() and returns the path."""
+    target = yolo_export_path(name, backend, int8)
+    os.makedirs(export_dir(), exist_ok=True)
+    model = YOLO(model_path(name))
+    print(f"Exporting {name} to {backend}{' (INT8)' if int8 else ''}...")
+
+    if backend == "onnx":
+        # Dynamic axes so micro-batches and tiles of any size go through one session
+        exported = model.export(format="onnx", dynamic=True, simplify=True)
+        if int8:
+            _quantize_onnx(exported, target)
+            os.remove(exported)
+        else:
+            shutil.move(exported, target)
+    elif backend == "openvino":
+        if int8 and not config.BACKEND_CALIBRATION_DATA:
+            raise ValueError("OpenVINO INT8 export of YOLO needs BACKEND_CALIBRATION_DATA (a dataset yaml)")
+        options = {"int8": True, "data": config.BACKEND_CALIBRATION_DATA} if int8 else {}
+        exported = model.export(format="openvino", dynamic=True, **options)
+        shutil.rmtree(target, ignore_errors=True)
+        shutil.move(exported, target)
+    else:
+        raise ValueError(f"Unknown backend '{backend}'")
+    return target
+
+
+def load_yolo(name, backend=None):
+    """Loads YOLO weights `name` on the configured backend, exporting them first if needed."""
+    backend = backend or config.INFERENCE_BACKEND
+    if backend == "torch":
+        return YOLO(model_path(name))
+    path = yolo_export_path(name, backend)
+    if not os.path.exists(path):
+        if not config.BACKEND_AUTO_EXPORT:
+            raise FileNotFoundError(f"{path} not found; run 'python backends.py export --backend {backend}'")
+        export_yolo(name, backend, config.BACKEND_INT8)
+    return YOLO(path, task="detect")
+
+
+# --- ViT ---
+
+class RuntimeViT:
+    """
+    Runs an exported ViT classifier but is called like ViTForImageClassification:
+    model(pixel_values=tensor).logits, model.config.id2label.
+    """
+
+    def __init__(self, run, vit_config):
+        self._run = run
+        self.config = vit_config
+
+    def __call__(self, pixel_values):
+        logits = self._run(pixel_values.numpy())
+        return ViTOutput(torch.from_numpy(logits))
+
+    def eval(self):
+        return self
+
+
+def export_vit(backend, int8=False):
+    """Exports the ViT classifier (dynamic batch) for `backend` and returns the path."""
+    from transformers import ViTForImageClassification
+
+    target = vit_export_path(backend, int8)
+    os.makedirs(export_dir(), exist_ok=True)
+    print(f"Exporting {config.VIT_MODEL} to {backend}{' (INT8)' if int8 else ''}...")
+
+    model = ViTForImageClassification.from_pretrained(
+        model_path(config.VIT_MODEL), local_files_only=config.MODELS_OFFLINE, return_dict=False
+    )
+    model.eval()
+    size = model.config.image_size
+    onnx_path = target if backend == "onnx" and not int8 else os.path.splitext(target)[0] + "_fp32.onnx"
+    with torch.no_grad():
+        torch.onnx.export(
+            model, (torch.zeros(1, 3, size, size),), onnx_path,
+            input_names=["pixel_values"], output_names=["logits"],
+            dynamic_axes={"pixel_values": {0: "batch"}, "logits": {0: "batch"}},
+            opset_version=17,
+        )
+
+    if backend == "onnx":
+        if int8:
+            _quantize_onnx(onnx_path, target)
+            os.remove(onnx_path)
+    elif backend == "openvino":
+        import openvino as ov
+
+        ov_model = ov.convert_model(onnx_path)
+        if int8:
+            import nncf
+
+            ov_model = nncf.compress_weights(ov_model)
+        ov.save_model(ov_model, target)
+        os.remove(onnx_path)
+    else:
+        raise ValueError(f"Unknown backend '{backend}'")
+    return target
+
+
+def _onnx_runner(path):
+    import onnxruntime as ort
+
+    session = ort.InferenceSession(path, providers=["CPUExecutionProvider"])
+    return lambda pixel_values: session.run(["logits"], {"pixel_values": pixel_values})[0]
+
+
+def _openvino_runner(path):
+    import openvino as ov
+
+    compiled = ov.Core().compile_model(path, "CPU")
+    output = compiled.output(0)
+    return lambda pixel_values: compiled({"pixel_values": pixel_values})[output]
+
+
+def load_runtime_vit(backend=None):
+    """(processor, RuntimeViT) for the ONNX Runtime / OpenVINO backends, exporting if needed."""
+    from transformers import ViTConfig, ViTImageProcessor
+
+    backend = backend or config.INFERENCE_BACKEND
+    path = vit_export_path(backend)
+    if not os.path.exists(path):
+        if not config.BACKEND_AUTO_EXPORT:
+            raise FileNotFoundError(f"{path} not found; run 'python backends.py export --backend {backend}'")
+        export_vit(backend, config.BACKEND_INT8)
+
+    source = model_path(config.VIT_MODEL)
+    processor = ViTImageProcessor.from_pretrained(source, local_files_only=config.MODELS_OFFLINE)
+    vit_config = ViTConfig.from_pretrained(source, local_files_only=config.MODELS_OFFLINE)
+    run = _onnx_runner(path) if backend == "onnx" else _openvino_runner(path)
+    return processor, RuntimeViT(run, vit_config)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["export"])
+    parser.add_argument("--backend", choices=["onnx", "openvino"], default="onnx")
+    parser.add_argument("--int8", action="store_true")
+    parser.add_argument("--models", nargs="+", default=["person", "ppe", "vit"])
+    args = parser.parse_args()
+
+    names = {"person": config.PERSON_MODEL, "ppe": config.PPE_MODEL}
+    for model in args.models:
+        if model == "vit":
+            print(export_vit(args.backend, args.int8))
+        else:
+            print(export_yolo(names[model], args.backend, args.int8))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class _PendingItem:
+    __slots__ = ("image", "future", "enqueued_at")
+
+    def __init__(self, image):
+        self.image = image
+        self.future = Future()
+        self.enqueued_at = time.perf_counter()
+
+
+class MicroBatcher:
+    """
+    Coalesces single-image inference calls arriving from concurrent requests into
+    one batched forward pass.
+
+    Images are collected until either `max_batch_size` images are waiting or the
+    oldest one has waited `max_wait_ms`. `predict_batch(images)` must return one
+    result per image, in order; each caller gets its own result back through a
+    concurrent.futures.Future (use asyncio.wrap_future to await it).
+    """
+
+    def __init__(self, name, predict_batch, max_batch_size=8, max_wait_ms=10):
+        self.name = name
+        self.predict_batch = predict_batch
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0, max_wait_ms) / 1000.0
+
+        self._queue = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self._batches = 0
+        self._images = 0
+        self._max_batch_seen = 0
+        self._total_wait = 0.0
+        self._max_wait_seen = 0.0
+        self._errors = 0
+
+        # The worker thread starts with the first submit, so a process can build its
+        # batchers and still fork workers safely (see prefork.py)
+        self._start_lock = threading.Lock()
+        self._worker = None
+
+    def submit(self, image):
+        """Queues an image and returns a Future resolving to its result."""
+        if self._worker is None:
+            with self._start_lock:
+                if self._worker is None:
+                    self._worker = threading.Thread(target=self._run, name=f"batcher-{self.name}", daemon=True)
+                    self._worker.start()
+        item = _PendingItem(image)
+        self._queue.put(item)
+        return item.future
+
+    def _collect(self):
+        # Block until there is work, then keep filling the batch until it is full
+        # or the oldest item's wait budget is spent
+        first = self._queue.get()
+        batch = [first]
+        deadline = first.enqueued_at + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            # Items whose caller gave up (cancelled future) are dropped unprocessed
+            batch = [item for item in self._collect() if item.future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            started = time.perf_counter()
+            waits = [started - item.enqueued_at for item in batch]
+
+            try:
+                results = self.predict_batch([item.image for item in batch])
+                for item, result in zip(batch, results):
+                    item.future.set_result(result)
+            except Exception as e:
+                print(f"Batcher '{self.name}' Error: {e}")
+                with self._stats_lock:
+                    self._errors += 1
+                for item in batch:
+                    if not item.future.done():
+                        item.future.set_exception(e)
+
+            with self._stats_lock:
+                self._batches += 1
+                self._images += len(batch)
+                self._max_batch_seen = max(self._max_batch_seen, len(batch))
+                self._total_wait += sum(waits)
+                self._max_wait_seen = max(self._max_wait_seen, max(waits))
+
+    def stats(self):
+        """Queue depth, batch size and wait time metrics for tuning the window."""
+        with self._stats_lock:
+            batches = self._batches
+            images = self._images
+            return {
+                "queue_depth": self._queue.qsize(),
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000.0,
+                "batches": batches,
+                "images": images,
+                "avg_batch_size": images / batches if batches else 0.0,
+                "max_batch_size_seen": self._max_batch_seen,
+                "avg_wait_ms": (self._total_wait / images) * 1000.0 if images else 0.0,
+                "max_wait_ms_seen": self._max_wait_seen * 1000.0,
+                "errors": self._errors,
+            }
@@ -0,0 +1,186 @@
+"""
+Parity check and benchmark of the inference backends (backends.py).
+
+Runs the person YOLO, the hard-hat YOLO and the ViT classifier on torch and on each
+requested exported backend over the same images, and reports per backend:
+  - parity against torch: share of torch boxes matched (same class, IoU >= 0.5),
+    mean IoU and largest confidence difference of the matches; ViT top-1 agreement
+    and largest logit difference
+  - latency: p50 / p95 of a single-image YOLO call, a batch of --batch images and a
+    ViT batch of VIT_BATCH_SIZE crops
+
+Images: --images DIR, else the sample photos shipped with ultralytics (no network).
+Exits with code 1 if a backend falls below --min-recall / --min-vit-agreement.
+
+Usage (from the backend directory):
+    python bench_backends.py [--backends onnx openvino] [--int8] [--repeat 10]
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+import torch
+
+import config
+from backends import load_runtime_vit, load_yolo
+from detector import load_vit, vit_pixel_values
+from geometry import iou_matrix
+
+
+def load_images(directory):
+    if directory:
+        paths = sorted(p for p in glob.glob(os.path.join(directory, "*")) if p.lower().endswith((".jpg", ".jpeg", ".png")))
+    else:
+        from ultralytics.utils import ASSETS
+
+        paths = sorted(glob.glob(os.path.join(str(ASSETS), "*.jpg")))
+    images = [cv2.imread(p) for p in paths]
+    return [image for image in images if image is not None]
+
+
+def as_arrays(result):
+    boxes = result.boxes
+    return boxes.xyxy.cpu().numpy(), boxes.conf.cpu().numpy(), boxes.cls.cpu().numpy().astype(int)
+
+
+def box_parity(reference, candidate):
+    """Greedy same-class IoU >= 0.5 matching of candidate boxes to reference boxes."""
+    ref_xyxy, ref_conf, ref_cls = reference
+    xyxy, conf, cls = candidate
+    if len(ref_xyxy) == 0:
+        return 0, 0, [], []
+    ious = iou_matrix(ref_xyxy, xyxy)
+    ious[ref_cls[:, None] != cls[None, :]] = 0.0
+    matched_ious, conf_diffs = [], []
+    used = set()
+    for flat in np.argsort(-ious, axis=None):
+        i, j = np.unravel_index(flat, ious.shape)
+        if ious[i, j] < 0.5:
+            break
+        if i in used or ("c", j) in used:
+            continue
+        used.update({i, ("c", j)})
+        matched_ious.append(float(ious[i, j]))
+        conf_diffs.append(abs(float(ref_conf[i]) - float(conf[j])))
+    return len(ref_xyxy), len(matched_ious), matched_ious, conf_diffs
+
+
+def timed(func, repeat):
+    func()  # warm-up (first call allocates / compiles)
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    timings = np.asarray(timings) * 1000
+    return {"p50_ms": round(float(np.percentile(timings, 50)), 2), "p95_ms": round(float(np.percentile(timings, 95)), 2)}
+
+
+def vit_inputs(processor, images, count):
+    """`count` random crops from the images, preprocessed like ObjectDetector._preprocess_rois."""
+    rng = np.random.default_rng(0)
+    crops = []
+    for i in range(count):
+        image = images[i % len(images)]
+        h, w = image.shape[:2]
+        cw, ch = int(rng.integers(w // 6, w // 2)), int(rng.integers(h // 6, h // 2))
+        x, y = int(rng.integers(0, w - cw)), int(rng.integers(0, h - ch))
+        crops.append(image[y:y + ch, x:x + cw])
+    return vit_pixel_values(processor, crops)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", nargs="+", choices=["onnx", "openvino"], default=["onnx"])
+    parser.add_argument("--int8", action="store_true", help="compare the INT8 exports")
+    parser.add_argument("--images", help="directory of test images")
+    parser.add_argument("--batch", type=int, default=8)
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--min-recall", type=float, default=0.95)
+    parser.add_argument("--min-vit-agreement", type=float, default=0.95)
+    args = parser.parse_args()
+    config.BACKEND_INT8 = args.int8
+
+    images = load_images(args.images)
+    if not images:
+        sys.exit("No test images found")
+    batch = [images[i % len(images)] for i in range(args.batch)]
+    models = {"person": config.PERSON_MODEL, "ppe": config.PPE_MODEL}
+
+    reference = {}
+    report = {"images": len(images), "int8": args.int8, "backends": {}}
+    failed = False
+
+    for backend in ["torch"] + args.backends:
+        entry = {"yolo": {}, "vit": None}
+        for role, name in models.items():
+            try:
+                model = load_yolo(name, backend)
+            except Exception as e:
+                entry["yolo"][role] = {"error": str(e)}
+                continue
+            predict = lambda source: model(source, conf=config.CONF_THRESHOLD, iou=config.IOU_THRESHOLD, verbose=False)
+            outputs = [as_arrays(predict(image)[0]) for image in images]
+            result = {
+                "single": timed(lambda: predict(images[0]), args.repeat),
+                "batch": timed(lambda: predict(batch), args.repeat),
+            }
+            if backend == "torch":
+                reference[role] = outputs
+            elif role in reference:
+                totals = [box_parity(ref, out) for ref, out in zip(reference[role], outputs)]
+                boxes = sum(t[0] for t in totals)
+                matched = sum(t[1] for t in totals)
+                ious = [v for t in totals for v in t[2]]
+                conf_diffs = [v for t in totals for v in t[3]]
+                recall = matched / boxes if boxes else 1.0
+                result["parity"] = {
+                    "torch_boxes": boxes,
+                    "matched": matched,
+                    "recall": round(recall, 4),
+                    "mean_iou": round(float(np.mean(ious)), 4) if ious else None,
+                    "max_conf_diff": round(float(np.max(conf_diffs)), 4) if conf_diffs else None,
+                }
+                failed |= recall < args.min_recall
+            entry["yolo"][role] = result
+
+        try:
+            processor, vit = load_vit() if backend == "torch" else load_runtime_vit(backend)
+            pixel_values = vit_inputs(processor, images, config.VIT_BATCH_SIZE)
+            with torch.no_grad():
+                logits = vit(pixel_values=pixel_values)[0].numpy()
+                vit_result = {"batch": timed(lambda: vit(pixel_values=pixel_values), args.repeat)}
+            if backend == "torch":
+                reference["vit"] = logits
+            elif "vit" in reference:
+                agreement = float((reference["vit"].argmax(-1) == logits.argmax(-1)).mean())
+                vit_result["parity"] = {
+                    "top1_agreement": round(agreement, 4),
+                    "max_logit_diff": round(float(np.abs(reference["vit"] - logits).max()), 4),
+                }
+                failed |= agreement < args.min_vit_agreement
+            entry["vit"] = vit_result
+        except Exception as e:
+            entry["vit"] = {"error": str(e)}
+
+        report["backends"][backend] = entry
+        summary = "  ".join(
+            f"{role} {r['single']['p50_ms']:.1f}/{r['batch']['p50_ms']:.1f} ms"
+            + (f" recall {r['parity']['recall']:.3f}" if "parity" in r else "")
+            for role, r in entry["yolo"].items() if "single" in r
+        )
+        print(f"{backend:<9} {summary}", file=sys.stderr)
+
+    print(json.dumps(report, indent=2))
+    if failed:
+        print("Parity check FAILED", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
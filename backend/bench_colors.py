@@ -0,0 +1,113 @@
+"""
+Benchmark: batched ColorEngine (colors.py) vs the former per-box detect_color
+(50x50 resize + cv2.kmeans with k=1 and 10 attempts per detection).
+
+Reports timings and how many boxes get the same color name from both.
+
+Usage (from the backend directory):
+    python bench_colors.py [--boxes 10 100 500] [--size 1920x1080] [--repeat 3]
+"""
+import argparse
+import json
+import time
+
+import cv2
+import numpy as np
+
+from colors import ColorEngine
+
+
+def legacy_detect_color(image_roi):
+    """The per-box implementation ColorEngine replaces, kept as the reference."""
+    try:
+        if image_roi.size == 0: return "Unknown"
+        data = np.float32(cv2.resize(image_roi, (50, 50)).reshape((-1, 3)))
+        criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 10, 1.0)
+        _, label, center = cv2.kmeans(data, 1, None, criteria, 10, cv2.KMEANS_RANDOM_CENTERS)
+        b, g, r = center[0].astype(np.int32)
+        avg_val = (int(r) + int(g) + int(b)) / 3
+        if avg_val > 190: return "White"
+        if avg_val < 50: return "Black"
+        if r > 150 and g < 100 and b < 100: return "Red"
+        if r < 100 and g > 150 and b < 100: return "Green"
+        if r < 100 and g < 100 and b > 150: return "Blue"
+        if r > 200 and g > 200 and b < 100: return "Yellow"
+        if r > 150 and g > 100 and b < 50: return "Orange"
+        if abs(r - g) < 20 and abs(r - b) < 20 and abs(g - b) < 20:
+            if avg_val > 140: return "White"
+            return "Grey"
+        if r > 150 and g < 50 and b > 150: return "Pink"
+        if r < 50 and g > 150 and b > 150: return "Cyan"
+        if r >= g and r >= b: return "Reddish"
+        if g >= r and g >= b: return "Greenish"
+        return "Blueish"
+    except Exception:
+        return "Unknown Color"
+
+
+def synthetic_scene(width, height, n, rng):
+    """Noisy background with n solid-ish colored boxes on it."""
+    image = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+    image = cv2.GaussianBlur(image, (15, 15), 0)
+    boxes = []
+    for _ in range(n):
+        w, h = int(rng.integers(20, 300)), int(rng.integers(20, 300))
+        x1, y1 = int(rng.integers(0, width - w)), int(rng.integers(0, height - h))
+        color = rng.integers(0, 256, 3).tolist()
+        cv2.rectangle(image, (x1, y1), (x1 + w, y1 + h), color, -1)
+        boxes.append([x1, y1, x1 + w, y1 + h])
+    noise = rng.normal(0, 12, image.shape)
+    image = np.clip(image + noise, 0, 255).astype(np.uint8)
+    return image, boxes
+
+
+def best_of(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--boxes", type=int, nargs="+", default=[10, 100, 500])
+    parser.add_argument("--size", default="1920x1080")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    width, height = (int(v) for v in args.size.lower().split("x"))
+    rng = np.random.default_rng(args.seed)
+    report = []
+    for n in args.boxes:
+        image, boxes = synthetic_scene(width, height, n, rng)
+
+        def legacy():
+            return [legacy_detect_color(image[y1:y2, x1:x2]) for x1, y1, x2, y2 in boxes]
+
+        legacy_time, legacy_names = best_of(legacy, args.repeat)
+        print(f"{n:>5} boxes  legacy   {legacy_time * 1000:9.2f} ms")
+        for method in ("sampled", "integral", "auto"):
+            # A fresh engine per run so the summed-area table cost is included
+            engine_time, engine_names = best_of(lambda: ColorEngine(image, method=method).names(boxes), args.repeat)
+            agreement = sum(a == b for a, b in zip(legacy_names, engine_names)) / n
+
+            report.append({
+                "boxes": n,
+                "image": f"{width}x{height}",
+                "method": method,
+                "legacy_ms": round(legacy_time * 1000, 3),
+                "engine_ms": round(engine_time * 1000, 3),
+                "speedup": round(legacy_time / engine_time, 1) if engine_time else None,
+                "name_agreement": round(agreement, 4),
+            })
+            print(f"{'':>11} {method:<8} {engine_time * 1000:9.2f} ms   speedup {legacy_time / engine_time:6.1f}x   "
+                  f"same name {agreement:.1%}")
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Benchmark: vectorized box geometry (geometry.py) vs the nested get_iou / compute_iou
+loops it replaced in main.py and detector.py.
+
+Usage (from the backend directory):
+    python bench_geometry.py [--sizes 10 100 1000] [--repeat 5]
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+from geometry import centers_inside, intersection_over_a, iou_matrix
+
+
+# --- Reference implementations (the former per-pair Python helpers) ---
+
+def get_iou(boxA, boxB):
+    xA = max(boxA[0], boxB[0])
+    yA = max(boxA[1], boxB[1])
+    xB = min(boxA[2], boxB[2])
+    yB = min(boxA[3], boxB[3])
+    interArea = max(0, xB - xA) * max(0, yB - yA)
+    boxAArea = (boxA[2] - boxA[0]) * (boxA[3] - boxA[1])
+    if boxAArea == 0: return 0
+    return interArea / boxAArea # intersection over object area
+
+
+def compute_iou(box1, box2):
+    x1 = max(box1[0], box2[0])
+    y1 = max(box1[1], box2[1])
+    x2 = min(box1[2], box2[2])
+    y2 = min(box1[3], box2[3])
+    inter_area = max(0, x2 - x1) * max(0, y2 - y1)
+    box1_area = (box1[2] - box1[0]) * (box1[3] - box1[1])
+    box2_area = (box2[2] - box2[0]) * (box2[3] - box2[1])
+    union_area = box1_area + box2_area - inter_area
+    if union_area == 0: return 0
+    return inter_area / union_area
+
+
+def center_inside(box, other):
+    cx = (other[0] + other[2]) / 2
+    cy = (other[1] + other[3]) / 2
+    return (box[0] < cx < box[2]) and (box[1] < cy < box[3])
+
+
+def loop_matrices(boxes_a, boxes_b):
+    ioa = [[get_iou(a, b) for b in boxes_b] for a in boxes_a]
+    iou = [[compute_iou(a, b) for b in boxes_b] for a in boxes_a]
+    inside = [[center_inside(a, b) for b in boxes_b] for a in boxes_a]
+    return ioa, iou, inside
+
+
+def vectorized_matrices(boxes_a, boxes_b):
+    return intersection_over_a(boxes_a, boxes_b), iou_matrix(boxes_a, boxes_b), centers_inside(boxes_a, boxes_b)
+
+
+def random_boxes(n, rng, width=1920, height=1080):
+    x1 = rng.integers(0, width - 10, n)
+    y1 = rng.integers(0, height - 10, n)
+    w = rng.integers(5, 300, n)
+    h = rng.integers(5, 300, n)
+    return [[int(a), int(b), int(min(width, a + c)), int(min(height, b + d))] for a, b, c, d in zip(x1, y1, w, h)]
+
+
+def best_of(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    report = []
+    for n in args.sizes:
+        boxes_a = random_boxes(n, rng)
+        boxes_b = random_boxes(n, rng)
+
+        # The 1000-box loop takes a while, one run is enough to make the point
+        loop_time, (ioa_ref, iou_ref, inside_ref) = best_of(
+            lambda: loop_matrices(boxes_a, boxes_b), 1 if n >= 1000 else args.repeat
+        )
+        vec_time, (ioa, iou, inside) = best_of(lambda: vectorized_matrices(boxes_a, boxes_b), args.repeat)
+
+        assert np.allclose(ioa, ioa_ref), "intersection_over_a mismatch"
+        assert np.allclose(iou, iou_ref), "iou_matrix mismatch"
+        assert np.array_equal(inside, np.array(inside_ref, dtype=bool).reshape(n, n)), "centers_inside mismatch"
+
+        report.append({
+            "boxes": n,
+            "pairs": n * n,
+            "loop_ms": round(loop_time * 1000, 3),
+            "vectorized_ms": round(vec_time * 1000, 3),
+            "speedup": round(loop_time / vec_time, 1) if vec_time else None,
+        })
+        print(f"{n:>5} x {n:<5} loop {loop_time * 1000:10.2f} ms   numpy {vec_time * 1000:8.2f} ms   "
+              f"speedup {loop_time / vec_time:7.1f}x")
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+"""
+Accuracy gate and benchmark for the OCR settings (OCR_PRECISION, OCR_CANVAS_SIZE,
+OCR_MAG_RATIO, OCR_BATCH_SIZE).
+
+Runs EasyOCR over a fixed image set twice: on the reference path (fp32 networks,
+Reader.readtext with its default arguments, recognizing box by box) and on the
+configured path (OCRProcessor.detect_text_full as served: detection with the
+configured canvas, batched recognition). Reports for the configured path:
+  - text agreement with the reference: character error rate of the page text (lines in
+    reading order), word F1, and the share of reference text boxes found again
+    (IoU >= 0.5) with identical text
+  - receipt fields: share of images where ReceiptParser reads the same total and items
+  - latency: mean / p50 / p95 per image of both paths
+
+Images: --images DIR (e.g. a folder of real receipts), else a fixed set of synthetic
+receipts rendered with OpenCV fonts (same --seed, same set).
+Exits with code 1 if the mean CER exceeds --max-cer or word F1 drops below --min-word-f1.
+
+Usage (from the backend directory):
+    python bench_ocr.py [--images receipts/] [--precision int8] [--canvas-size 1280]
+                        [--batch-size 16]
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from collections import Counter
+
+import cv2
+import numpy as np
+
+import config
+from geometry import iou_matrix
+from model_registry import ModelRegistry
+from ocr import OCR_PRECISIONS, OCRProcessor, load_reader
+from receipt_parser import ReceiptParser
+
+WORDS = ["MILK", "BREAD", "EGGS", "COFFEE", "TEA", "APPLES", "RICE", "PASTA", "SOAP", "WATER", "JUICE", "BUTTER"]
+
+
+def load_images(directory):
+    paths = sorted(p for p in glob.glob(os.path.join(directory, "*")) if p.lower().endswith((".jpg", ".jpeg", ".png")))
+    images = [cv2.imread(p) for p in paths]
+    return [image for image in images if image is not None]
+
+
+def synthetic_receipts(count, rng):
+    """Receipt-like pages: shop name, date, 5-25 priced items and a total, slightly noisy."""
+    images = []
+    for _ in range(count):
+        lines = ["CORNER MARKET", f"{rng.integers(1, 29):02d}/{rng.integers(1, 13):02d}/2024 12:30"]
+        total = 0.0
+        for _ in range(int(rng.integers(5, 26))):
+            price = float(rng.integers(50, 5000)) / 100
+            total += price
+            lines.append(f"{rng.choice(WORDS)} x{rng.integers(1, 4)}  {price:.2f}")
+        lines.append(f"TOTAL  {total:.2f}")
+
+        scale = float(rng.uniform(0.6, 1.0))
+        line_height = int(36 * scale)
+        image = np.full((40 + line_height * len(lines), int(620 * scale), 3), 245, dtype=np.uint8)
+        for i, text in enumerate(lines):
+            cv2.putText(image, text, (12, line_height * (i + 1)), cv2.FONT_HERSHEY_SIMPLEX, scale, (20, 20, 20), 2)
+        noise = rng.normal(0, 6, image.shape)
+        images.append(cv2.GaussianBlur(np.clip(image + noise, 0, 255).astype(np.uint8), (3, 3), 0))
+    return images
+
+
+def edit_distance(a, b):
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        previous = current
+    return previous[-1]
+
+
+def word_f1(reference, candidate):
+    ref, cand = Counter(reference.split()), Counter(candidate.split())
+    if not ref and not cand:
+        return 1.0
+    common = sum((ref & cand).values())
+    if not common:
+        return 0.0
+    precision, recall = common / sum(cand.values()), common / sum(ref.values())
+    return 2 * precision * recall / (precision + recall)
+
+
+def same_text_boxes(reference, candidate):
+    """Share of reference text boxes with a candidate box (IoU >= 0.5) reading the same text."""
+    if not reference:
+        return 1.0
+    if not candidate:
+        return 0.0
+    ious = iou_matrix([d['box'] for d in reference], [d['box'] for d in candidate])
+    best = ious.argmax(axis=1)
+    return float(np.mean([
+        ious[i, j] >= 0.5 and reference[i]['ocr_text'] == candidate[j]['ocr_text'] for i, j in enumerate(best)
+    ]))
+
+
+def latency(timings):
+    timings = np.asarray(timings) * 1000
+    return {
+        "mean_ms": round(float(timings.mean()), 2),
+        "p50_ms": round(float(np.percentile(timings, 50)), 2),
+        "p95_ms": round(float(np.percentile(timings, 95)), 2),
+    }
+
+
+def processor_for(precision):
+    registry = ModelRegistry(mode="eager")
+    registry.register("ocr", lambda: load_reader(precision))
+    registry.startup()
+    return OCRProcessor(registry)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", help="directory of test images")
+    parser.add_argument("--synthetic", type=int, default=20, help="synthetic receipts when no --images")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--precision", choices=OCR_PRECISIONS, default=config.OCR_PRECISION)
+    parser.add_argument("--canvas-size", type=int, default=config.OCR_CANVAS_SIZE)
+    parser.add_argument("--mag-ratio", type=float, default=config.OCR_MAG_RATIO)
+    parser.add_argument("--batch-size", type=int, default=config.OCR_BATCH_SIZE)
+    parser.add_argument("--max-cer", type=float, default=0.02)
+    parser.add_argument("--min-word-f1", type=float, default=0.97)
+    args = parser.parse_args()
+    config.OCR_PRECISION = args.precision
+    config.OCR_CANVAS_SIZE = args.canvas_size
+    config.OCR_MAG_RATIO = args.mag_ratio
+    config.OCR_BATCH_SIZE = args.batch_size
+
+    images = load_images(args.images) if args.images else synthetic_receipts(args.synthetic, np.random.default_rng(args.seed))
+    if not images:
+        sys.exit("No test images found")
+
+    reference_ocr = processor_for("fp32")
+    candidate_ocr = processor_for(args.precision)
+    receipts = ReceiptParser()
+
+    def run_reference(image):
+        # EasyOCR as it comes: default canvas, magnification and box-by-box recognition
+        return reference_ocr._to_detections(reference_ocr.reader.readtext(image))
+
+    # Warm-up (first calls allocate buffers, quantized kernels pack their weights)
+    run_reference(images[0])
+    candidate_ocr.detect_text_full(images[0])
+
+    rows = []
+    reference_times, candidate_times = [], []
+    for index, image in enumerate(images):
+        started = time.perf_counter()
+        reference = run_reference(image)
+        reference_times.append(time.perf_counter() - started)
+        started = time.perf_counter()
+        candidate = candidate_ocr.detect_text_full(image)
+        candidate_times.append(time.perf_counter() - started)
+
+        reference_text = "\n".join(receipts.line_texts(reference)) if reference else ""
+        candidate_text = "\n".join(receipts.line_texts(candidate)) if candidate else ""
+        reference_bill = receipts.parse(reference) or {}
+        candidate_bill = receipts.parse(candidate) or {}
+        row = {
+            "image": index,
+            "reference_boxes": len(reference),
+            "boxes": len(candidate),
+            "cer": edit_distance(reference_text, candidate_text) / max(1, len(reference_text)),
+            "word_f1": word_f1(reference_text, candidate_text),
+            "same_text_boxes": same_text_boxes(reference, candidate),
+            "same_total": reference_bill.get("total") == candidate_bill.get("total"),
+            "same_items": reference_bill.get("items") == candidate_bill.get("items"),
+        }
+        rows.append(row)
+        print(f"{index:>4}  boxes {len(reference):>3} -> {len(candidate):>3}  cer {row['cer']:.4f}  "
+              f"word f1 {row['word_f1']:.3f}  {reference_times[-1] * 1000:8.1f} -> {candidate_times[-1] * 1000:8.1f} ms",
+              file=sys.stderr)
+
+    mean = lambda key: round(float(np.mean([row[key] for row in rows])), 4)
+    report = {
+        "images": len(images),
+        "source": args.images or f"synthetic (seed {args.seed})",
+        "settings": {
+            "precision": args.precision, "canvas_size": args.canvas_size, "mag_ratio": args.mag_ratio,
+            "batch_size": args.batch_size,
+        },
+        "accuracy": {
+            "cer": mean("cer"),
+            "max_cer": round(max(row["cer"] for row in rows), 4),
+            "word_f1": mean("word_f1"),
+            "same_text_boxes": mean("same_text_boxes"),
+            "same_total": mean("same_total"),
+            "same_items": mean("same_items"),
+        },
+        "reference": latency(reference_times),
+        "configured": latency(candidate_times),
+        "speedup": round(sum(reference_times) / sum(candidate_times), 2) if sum(candidate_times) else None,
+    }
+    print(json.dumps(report, indent=2))
+    if report["accuracy"]["cer"] > args.max_cer or report["accuracy"]["word_f1"] < args.min_word_f1:
+        print("OCR accuracy gate FAILED", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,296 @@
+"""
+Offline benchmark of the detection pipeline.
+
+Drives ObjectDetector.detect, OCRProcessor.detect_text_full, ReceiptParser.parse and
+the full /detect handler (in-process through a test client) over a generated image
+corpus of varying resolution, object count and text density. Reports p50/p95/p99
+latency, throughput, peak RSS and the per-stage breakdown of /detect (see tracing.py)
+as JSON.
+
+Runs on a CPU-only machine without network access:
+  --models stub   deterministic stand-in models (stub_models.py), no weights needed;
+                  measures everything around the models (decode, colors, association,
+                  OCR planning, receipt parsing, response building).
+  --models small  the real pipeline with the small yolov8n.pt for both YOLO passes,
+                  offline; EasyOCR weights must be in EASYOCR_MODEL_DIR and the ViT in
+                  MODEL_DIR (ViT refinement is skipped if it is missing).
+
+A previous report can be passed with --baseline; the run fails (exit code 1) when a
+p95 latency regressed by more than --tolerance.
+
+Usage (from the backend directory):
+    python bench_pipeline.py [--models stub] [--sizes 640x480 1920x1080]
+                             [--objects 0 5 20] [--text 0 10 40] [--repeat 10]
+                             [--output report.json] [--baseline old.json]
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+
+def configure_environment(args):
+    # Must happen before config.py is imported by anything below
+    os.environ["MODELS_OFFLINE"] = "1"
+    os.environ["MODEL_LOAD_MODE"] = "eager"
+    # Every request has to run the pipeline, not come from the result cache
+    os.environ["CACHE_MAX_ENTRIES"] = "0"
+    os.environ["CACHE_DIR"] = ""
+    os.environ["TRACING"] = "1"
+    os.environ.setdefault("JOBS_DIR", os.path.join(tempfile.gettempdir(), "bench_pipeline_jobs"))
+    if args.models == "stub":
+        os.environ["MODEL_BACKEND"] = "stub"
+        os.environ["STUB_LATENCY_MS"] = str(args.stub_latency_ms)
+    else:
+        os.environ["MODEL_BACKEND"] = "torch"
+        os.environ["PERSON_MODEL"] = "yolov8n.pt"
+        os.environ["PPE_MODEL"] = args.ppe_model
+
+
+# --- Corpus ---
+
+def generate_image(width, height, objects, text_lines, rng):
+    """
+    Synthetic scene: textured grey background, `objects` saturated people / vehicle
+    shaped blocks and, if text_lines > 0, a white receipt panel with that many lines.
+    """
+    import cv2
+
+    image = rng.normal(110, 18, (height, width, 3)).clip(0, 255).astype(np.uint8)
+    image = cv2.GaussianBlur(image, (5, 5), 0)
+
+    panel_right = 0
+    if text_lines:
+        # Receipt panel on the left third; text scales with it, lines that do not fit are dropped
+        panel_right = max(200, width // 3)
+        scale = panel_right / 480.0
+        line_height = int(34 * scale)
+        lines = max(1, min(text_lines, (height - 40) // line_height))
+        cv2.rectangle(image, (10, 10), (panel_right, 30 + line_height * lines), (245, 245, 245), -1)
+        for i in range(lines):
+            text = "TOTAL 42.00" if i == lines - 1 else f"ITEM {i:03d} QTY 1 {i * 1.25:7.2f}"
+            cv2.putText(image, text, (18, 10 + line_height * (i + 1)), cv2.FONT_HERSHEY_SIMPLEX, scale,
+                        (20, 20, 20), max(1, int(scale * 2)))
+
+    for _ in range(objects):
+        person = rng.random() < 0.6
+        if person:
+            w = int(rng.integers(max(12, width // 40), max(13, width // 12)))
+            h = int(w * rng.uniform(2.0, 3.0))
+        else:
+            h = int(rng.integers(max(12, height // 20), max(13, height // 6)))
+            w = int(h * rng.uniform(1.8, 2.6))
+        w, h = min(w, width - panel_right - 30), min(h, height - 20)
+        if w < 8 or h < 8:
+            continue
+        x1 = int(rng.integers(panel_right + 20, max(panel_right + 21, width - w - 5)))
+        y1 = int(rng.integers(5, max(6, height - h - 5)))
+        hue = int(rng.integers(0, 180))
+        color = cv2.cvtColor(np.uint8([[[hue, 220, 200]]]), cv2.COLOR_HSV2BGR)[0, 0].tolist()
+        cv2.rectangle(image, (x1, y1), (x1 + w, y1 + h), color, -1)
+    return image
+
+
+def scenarios(args):
+    for size in args.sizes:
+        width, height = (int(v) for v in size.lower().split("x"))
+        for objects in args.objects:
+            for text_lines in args.text:
+                yield width, height, objects, text_lines
+
+
+# --- Measurement ---
+
+def peak_rss_mb():
+    # ru_maxrss is in KiB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def summarize(timings):
+    timings = np.asarray(timings, dtype=np.float64)
+    total = float(timings.sum())
+    return {
+        "n": int(timings.size),
+        "mean_ms": round(float(timings.mean()) * 1000, 3),
+        "p50_ms": round(float(np.percentile(timings, 50)) * 1000, 3),
+        "p95_ms": round(float(np.percentile(timings, 95)) * 1000, 3),
+        "p99_ms": round(float(np.percentile(timings, 99)) * 1000, 3),
+        "max_ms": round(float(timings.max()) * 1000, 3),
+        "throughput_per_s": round(timings.size / total, 2) if total else None,
+    }
+
+
+def measure(func, repeat, warmup):
+    for _ in range(warmup):
+        func()
+    timings = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return summarize(timings), result
+
+
+def average_stages(traces):
+    stages = {}
+    counts = {}
+    for trace in traces:
+        for name, ms in trace["stages_ms"].items():
+            stages.setdefault(name, []).append(ms)
+        for name, value in trace["counts"].items():
+            counts.setdefault(name, []).append(value)
+    return (
+        {name: round(float(np.mean(values)), 3) for name, values in sorted(stages.items())},
+        {name: round(float(np.mean(values)), 2) for name, values in sorted(counts.items())},
+    )
+
+
+def compare(report, baseline, tolerance):
+    """Returns the list of (scenario, component, old p95, new p95) that regressed."""
+    previous = {(s["scenario"], c): r["p95_ms"]
+                for s in baseline.get("scenarios", []) for c, r in s["components"].items()}
+    regressions = []
+    for scenario in report["scenarios"]:
+        for component, result in scenario["components"].items():
+            old = previous.get((scenario["scenario"], component))
+            if old and result["p95_ms"] > old * (1 + tolerance):
+                regressions.append((scenario["scenario"], component, old, result["p95_ms"]))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--models", choices=["stub", "small"], default="stub")
+    parser.add_argument("--ppe-model", default="yolov8n.pt", help="PPE weights for --models small")
+    parser.add_argument("--stub-latency-ms", type=int, default=0, help="simulated model cost per stub call")
+    parser.add_argument("--sizes", nargs="+", default=["640x480", "1280x720", "1920x1080"])
+    parser.add_argument("--objects", type=int, nargs="+", default=[0, 5, 20])
+    parser.add_argument("--text", type=int, nargs="+", default=[0, 10, 40])
+    parser.add_argument("--resolution", choices=["full", "fast", "tiled"], default="full",
+                        help="resolution policy for detect and /detect (see resolution.py)")
+    parser.add_argument("--cascade", choices=["off", "frame", "region"], default="off",
+                        help="cascade policy of the person pass (see cascade.py)")
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the JSON report here (default: stdout)")
+    parser.add_argument("--baseline", help="previous JSON report to compare p95 latencies against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed p95 regression (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    configure_environment(args)
+
+    import cv2
+    from fastapi.testclient import TestClient
+
+    import config
+
+    # MODEL_LOAD_MODE=eager: importing the app loads every model
+    print(f"Loading {args.models} models...", file=sys.stderr)
+    started = time.perf_counter()
+    import main as app_module
+    load_seconds = time.perf_counter() - started
+    client = TestClient(app_module.app)
+
+    detector = app_module.detector
+    ocr_processor = app_module.ocr_processor
+    receipt_parser = app_module.receipt_parser
+    rng = np.random.default_rng(args.seed)
+
+    report = {
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "models": args.models,
+            "person_model": config.PERSON_MODEL,
+            "ppe_model": config.PPE_MODEL,
+            "ocr_mode": config.OCR_MODE,
+            "resolution": args.resolution,
+            "cascade": args.cascade,
+            "model_load_s": round(load_seconds, 3),
+        },
+        "settings": {"repeat": args.repeat, "warmup": args.warmup, "seed": args.seed},
+        "scenarios": [],
+    }
+
+    for width, height, objects, text_lines in scenarios(args):
+        name = f"{width}x{height}_obj{objects}_text{text_lines}"
+        image = generate_image(width, height, objects, text_lines, rng)
+        payload = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, 90])[1].tobytes()
+
+        components = {}
+        components["detector.detect"], detections = measure(lambda: detector.detect(image, resolution=args.resolution, cascade=args.cascade), args.repeat, args.warmup)
+        components["ocr.detect_text_full"], text_detections = measure(
+            lambda: ocr_processor.detect_text_full(image), args.repeat, args.warmup
+        )
+        components["receipt_parser.parse"], _ = measure(
+            lambda: receipt_parser.parse(text_detections), args.repeat, args.warmup
+        )
+
+        traces = []
+
+        def post_detect():
+            response = client.post(
+                f"/detect?debug=true&resolution={args.resolution}&cascade={args.cascade}",
+                files={"file": ("bench.jpg", payload, "image/jpeg")},
+            )
+            response.raise_for_status()
+            body = response.json()
+            traces.append(body["trace"])
+            return body
+
+        components["/detect"], body = measure(post_detect, args.repeat, args.warmup)
+        stages, counts = average_stages(traces[args.warmup:])
+
+        scenario = {
+            "scenario": name,
+            "width": width,
+            "height": height,
+            "objects": objects,
+            "text_lines": text_lines,
+            "jpeg_bytes": len(payload),
+            "detections": len(detections),
+            "text_detections": len(text_detections),
+            "components": components,
+            "detect_stages_ms": stages,
+            "detect_counts": counts,
+            "peak_rss_mb": peak_rss_mb(),
+        }
+        report["scenarios"].append(scenario)
+        print(f"{name:<28} detect p50 {components['detector.detect']['p50_ms']:8.2f} ms   "
+              f"ocr p50 {components['ocr.detect_text_full']['p50_ms']:8.2f} ms   "
+              f"/detect p50 {components['/detect']['p50_ms']:8.2f} p95 {components['/detect']['p95_ms']:8.2f} ms   "
+              f"rss {scenario['peak_rss_mb']} MB", file=sys.stderr)
+
+    report["peak_rss_mb"] = peak_rss_mb()
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+        print(f"Wrote {args.output}", file=sys.stderr)
+    else:
+        print(output)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.tolerance)
+        for scenario, component, old, new in regressions:
+            print(f"REGRESSION {scenario} {component}: p95 {old:.2f} -> {new:.2f} ms", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+        print(f"No p95 regressions beyond {args.tolerance:.0%}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
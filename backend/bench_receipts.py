@@ -0,0 +1,190 @@
+"""
+Benchmark: ReceiptParser (receipt_parser.py) vs the former parser (sort by y1, group
+boxes whose y1 is within 10 px of the previous box, line text rebuilt by every
+heuristic, patterns compiled per call) on synthetic receipts.
+
+Reports per-receipt timings, parse_many throughput, how many lines each parser
+reconstructs correctly and how often both agree on shop name, items and total.
+
+Usage (from the backend directory):
+    python bench_receipts.py [--lines 50 100 250 500] [--receipts 20] [--scale 1.0 3.0]
+"""
+import argparse
+import json
+import re
+import time
+
+import numpy as np
+
+from receipt_parser import ReceiptParser
+
+
+class LegacyReceiptParser:
+    """The implementation ReceiptParser replaces, kept as the reference."""
+
+    def parse(self, text_detections):
+        if not text_detections:
+            return None
+        sorted_dets = sorted(text_detections, key=lambda d: (d['box'][1], d['box'][0]))
+        lines = self._group_into_lines(sorted_dets)
+        return {
+            "shop_name": self._extract_shop_name(lines),
+            "items": self._extract_items(lines),
+            "total": self._extract_total(lines),
+        }
+
+    def _group_into_lines(self, detections, y_threshold=10):
+        lines = []
+        current_line = []
+        for det in detections:
+            if not current_line:
+                current_line.append(det)
+                continue
+            last_det = current_line[-1]
+            if abs(det['box'][1] - last_det['box'][1]) <= y_threshold:
+                current_line.append(det)
+            else:
+                current_line.sort(key=lambda d: d['box'][0])
+                lines.append(current_line)
+                current_line = [det]
+        if current_line:
+            current_line.sort(key=lambda d: d['box'][0])
+            lines.append(current_line)
+        return lines
+
+    def _get_line_text(self, line):
+        return " ".join([d['ocr_text'] for d in line])
+
+    def _extract_shop_name(self, lines):
+        for line in lines[:3]:
+            text = self._get_line_text(line)
+            if len(text) > 3 and not re.search(r'\d{2}/\d{2}', text):
+                return text
+        return "Unknown Shop"
+
+    def _extract_total(self, lines):
+        for line in reversed(lines):
+            text = self._get_line_text(line).lower()
+            if "total" in text:
+                match = re.search(r'[\d,]+\.\d{2}', text)
+                if match:
+                    return match.group(0)
+                return self._get_line_text(line)
+        return None
+
+    def _extract_items(self, lines):
+        items = []
+        for line in lines:
+            text = self._get_line_text(line)
+            if re.search(r'\d+\.\d{2}$', text):
+                items.append(text)
+        return items
+
+
+WORDS = ["MILK", "BREAD", "EGGS", "Coffee", "Tea", "APPLES", "Rice", "Pasta", "SOAP", "Water", "Juice", "Butter"]
+
+
+def synthetic_receipt(n_lines, scale, rng):
+    """
+    OCR-like detections of a receipt with n_lines lines (header, dated line, items with
+    prices, total), 1-3 boxes per line with vertical jitter and varying text heights,
+    in shuffled order. Returns (detections, expected line texts).
+    """
+    detections, lines = [], []
+    y = 20.0 * scale
+    for i in range(n_lines):
+        if i == 0:
+            words = ["CORNER", "MARKET"]
+        elif i == 1:
+            words = [f"{rng.integers(1, 29):02d}/{rng.integers(1, 13):02d}/2024", "12:30"]
+        elif i == n_lines - 1:
+            words = ["TOTAL", f"{rng.integers(10, 5000)}.{rng.integers(0, 100):02d}"]
+        else:
+            count = int(rng.integers(0, 2))
+            words = list(rng.choice(WORDS, count + 1)) + [f"{rng.integers(1, 100)}.{rng.integers(0, 100):02d}"]
+            if rng.random() < 0.2:
+                # Lines without a price (notes, loyalty number, ...)
+                words = words[:-1] + ["x" + str(rng.integers(1, 9))]
+
+        height = rng.uniform(14, 22) * scale
+        x = 10.0 * scale
+        for word in words:
+            width = len(word) * height * 0.6
+            jitter = rng.uniform(-0.2, 0.2) * height
+            top = y + jitter
+            detections.append({"ocr_text": word, "box": [int(x), int(top), int(x + width), int(top + height)]})
+            x += width + rng.uniform(8, 40) * scale
+        lines.append(" ".join(words))
+        y += height * rng.uniform(1.4, 1.8)
+
+    order = rng.permutation(len(detections))
+    return [detections[i] for i in order], lines
+
+
+def legacy_line_texts(parser, detections):
+    sorted_dets = sorted(detections, key=lambda d: (d['box'][1], d['box'][0]))
+    return [parser._get_line_text(line) for line in parser._group_into_lines(sorted_dets)]
+
+
+def best_of(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lines", type=int, nargs="+", default=[50, 100, 250, 500])
+    parser.add_argument("--receipts", type=int, default=20, help="receipts per size (one parse_many job)")
+    parser.add_argument("--scale", type=float, nargs="+", default=[1.0, 3.0],
+                        help="text size factor (1.0 ~ phone photo, 3.0 ~ 300 dpi scan)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    legacy, engine = LegacyReceiptParser(), ReceiptParser()
+    report = []
+    for scale in args.scale:
+        for n in args.lines:
+            receipts = [synthetic_receipt(n, scale, rng) for _ in range(args.receipts)]
+            jobs = [detections for detections, _ in receipts]
+            boxes = sum(len(detections) for detections in jobs)
+
+            legacy_time, legacy_results = best_of(lambda: [legacy.parse(d) for d in jobs], args.repeat)
+            single_time, _ = best_of(lambda: [engine.parse(d) for d in jobs], args.repeat)
+            many_time, results = best_of(lambda: engine.parse_many(jobs), args.repeat)
+
+            legacy_lines = sum(legacy_line_texts(legacy, d) == lines for d, lines in receipts) / len(receipts)
+            engine_lines = sum(engine.line_texts(d) == lines for d, lines in receipts) / len(receipts)
+            same = {
+                field: sum(a[field] == b[field] for a, b in zip(legacy_results, results)) / len(receipts)
+                for field in ("shop_name", "items", "total")
+            }
+
+            report.append({
+                "lines": n,
+                "scale": scale,
+                "receipts": len(receipts),
+                "boxes_per_receipt": round(boxes / len(receipts), 1),
+                "legacy_ms": round(legacy_time * 1000 / len(receipts), 3),
+                "parse_ms": round(single_time * 1000 / len(receipts), 3),
+                "parse_many_ms": round(many_time * 1000 / len(receipts), 3),
+                "parse_many_us_per_box": round(many_time * 1e6 / boxes, 2),
+                "speedup": round(legacy_time / many_time, 1) if many_time else None,
+                "legacy_lines_exact": round(legacy_lines, 4),
+                "lines_exact": round(engine_lines, 4),
+                "same_as_legacy": {field: round(value, 4) for field, value in same.items()},
+            })
+            print(f"scale {scale:<4} {n:>4} lines  legacy {legacy_time * 1000 / len(receipts):8.3f} ms  "
+                  f"parse_many {many_time * 1000 / len(receipts):8.3f} ms  "
+                  f"lines exact {legacy_lines:.0%} -> {engine_lines:.0%}")
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import config
+from model_registry import model_path
+
+# Bump when the response format or post-processing changes so stale entries are ignored.
+# A new setting that changes /detect responses goes into model_fingerprint instead.
+CACHE_VERSION = 2
+
+
+def model_fingerprint():
+    """
+    Identifies everything besides the pixels that influences a /detect response:
+    model versions (weights file name, size and mtime), thresholds, the OCR, color,
+    resolution, cascade and PPE settings, and the cache version. The per-request
+    resolution / cascade modes are part of the key (see ResultCache.key_for).
+    """
+    parts = [f"v{CACHE_VERSION}"]
+    for name in (config.PERSON_MODEL, config.PPE_MODEL, config.CASCADE_MODEL):
+        path = model_path(name)
+        try:
+            stat = os.stat(path)
+            parts.append(f"{path}:{stat.st_size}:{int(stat.st_mtime)}")
+        except OSError:
+            parts.append(path)
+    parts.append(config.VIT_MODEL)
+    parts.append(f"backend={config.MODEL_BACKEND}:{config.INFERENCE_BACKEND}:int8={config.BACKEND_INT8}")
+    parts.append(f"conf={config.CONF_THRESHOLD}")
+    parts.append(f"iou={config.IOU_THRESHOLD}")
+    parts.append(f"vit={config.VIT_CONFIDENCE_THRESHOLD}")
+    parts.append(
+        f"ocr={config.OCR_MODE}:{config.OCR_SCAN_MAX_SIDE}:{config.OCR_FULL_SCAN_DENSITY}:{config.OCR_FULL_SCAN_LINES}"
+        f":{config.OCR_BATCH_SIZE}:{config.OCR_PRECISION}:{config.OCR_CANVAS_SIZE}:{config.OCR_MAG_RATIO}"
+    )
+    parts.append(f"colors={config.COLOR_METHOD}:{config.COLOR_INTEGRAL_MIN_BOXES}:{config.COLOR_CLUSTERS}")
+    parts.append(
+        f"resolution={config.COARSE_MAX_SIDE}:{config.TILE_SIZE}:{config.TILE_OVERLAP}:{config.TILE_MAX_TILES}"
+        f":{config.TILE_MATCH_THRESHOLD}"
+    )
+    parts.append(f"ppe={config.PPE_MODE}:{config.PPE_CROP_PADDING}:{config.PPE_CROP_MAX_AREA}")
+    parts.append(
+        f"cascade={config.CASCADE_MIN_CONF}:{config.CASCADE_ACCEPT_CONF}:{config.CASCADE_MAX_OBJECTS}"
+        f":{config.CASCADE_REGION_PADDING}:{config.CASCADE_MAX_REGIONS}:{config.CASCADE_MAX_REGION_AREA}"
+    )
+    return "|".join(parts)
+
+
+class ResultCache:
+    """
+    Content-addressed cache of full /detect responses (results, summary, bill_data).
+
+    Entries are keyed on a hash of the decoded image pixels plus the model
+    fingerprint. The in-memory tier is an LRU bounded by `max_entries` with a TTL;
+    the optional on-disk tier (one JSON file per key in `cache_dir`) survives restarts.
+    Its bound is kept with an in-memory index of the files, oldest first, so the
+    directory is only rescanned once the index grows past `disk_max_entries`.
+    """
+
+    def __init__(self, max_entries=None, ttl=None, cache_dir=None, disk_max_entries=None):
+        self.max_entries = config.CACHE_MAX_ENTRIES if max_entries is None else max_entries
+        self.ttl = config.CACHE_TTL_SECONDS if ttl is None else ttl
+        self.cache_dir = config.CACHE_DIR if cache_dir is None else cache_dir
+        self.disk_max_entries = config.CACHE_DISK_MAX_ENTRIES if disk_max_entries is None else disk_max_entries
+        self.fingerprint = model_fingerprint()
+
+        self._entries = OrderedDict()  # key -> (stored_at, response)
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._disk_hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._disk_index = OrderedDict()  # key -> None, oldest file first
+
+        if self.cache_dir:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            self._disk_index = self._disk_scan()
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0
+
+    def key_for(self, image, extra=""):
+        """Hashes the decoded image bytes (and shape) together with the model config."""
+        digest = hashlib.blake2b(digest_size=20)
+        digest.update(self.fingerprint.encode())
+        digest.update(str(image.shape).encode())
+        digest.update(str(extra).encode())
+        digest.update(image if image.flags['C_CONTIGUOUS'] else image.tobytes())
+        return digest.hexdigest()
+
+    def get(self, key):
+        """Returns the cached response or None."""
+        if not self.enabled:
+            return None
+
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                stored_at, response = entry
+                if now - stored_at <= self.ttl:
+                    self._entries.move_to_end(key)
+                    self._hits += 1
+                    return response
+                del self._entries[key]
+
+        response = self._disk_get(key, now)
+        with self._lock:
+            if response is None:
+                self._misses += 1
+                return None
+            self._disk_hits += 1
+        # Promote into the memory tier
+        self._memory_put(key, response, now)
+        return response
+
+    def put(self, key, response):
+        if not self.enabled:
+            return
+        now = time.time()
+        self._memory_put(key, response, now)
+        self._disk_put(key, response, now)
+
+    def _memory_put(self, key, response, stored_at):
+        with self._lock:
+            self._entries[key] = (stored_at, response)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+    def _disk_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def _disk_get(self, key, now):
+        if not self.cache_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if now - entry.get("stored_at", 0) > self.ttl:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            with self._lock:
+                self._disk_index.pop(key, None)
+            return None
+        return entry.get("response")
+
+    def _disk_put(self, key, response, stored_at):
+        if not self.cache_dir:
+            return
+        path = self._disk_path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"stored_at": stored_at, "response": response}, f)
+            os.replace(tmp_path, path)
+            with self._lock:
+                self._disk_index[key] = None
+                self._disk_index.move_to_end(key)
+                full = len(self._disk_index) > self.disk_max_entries
+            if full:
+                self._disk_evict()
+        except (OSError, TypeError, ValueError) as e:
+            print(f"Result cache write error: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def _disk_scan(self):
+        """The cache files on disk, oldest first."""
+        def mtime(entry):
+            try:
+                return entry.stat().st_mtime
+            except OSError:
+                return 0
+
+        entries = [e for e in os.scandir(self.cache_dir) if e.name.endswith(".json")]
+        entries.sort(key=mtime)
+        return OrderedDict((e.name[:-len(".json")], None) for e in entries)
+
+    def _disk_evict(self):
+        # Rescan (other processes may share the directory), then drop the oldest files
+        # down to a tenth below the bound so the next scan is that many writes away
+        index = self._disk_scan()
+        keep = self.disk_max_entries - self.disk_max_entries // 10
+        victims = set(list(index)[:max(0, len(index) - keep)])
+        for key in victims:
+            del index[key]
+            try:
+                os.remove(self._disk_path(key))
+                with self._lock:
+                    self._evictions += 1
+            except OSError:
+                pass
+        with self._lock:
+            # Keep entries written while this scanned
+            for key in self._disk_index:
+                if key not in index and key not in victims:
+                    index[key] = None
+            self._disk_index = index
+
+    def stats(self):
+        with self._lock:
+            lookups = self._hits + self._disk_hits + self._misses
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "disk_enabled": bool(self.cache_dir),
+                "hits": self._hits,
+                "disk_hits": self._disk_hits,
+                "misses": self._misses,
+                "evictions": self._evictions,
+                "hit_rate": (self._hits + self._disk_hits) / lookups if lookups else 0.0,
+            }
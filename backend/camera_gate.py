@@ -0,0 +1,264 @@
+import threading
+import time
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+import config
+import tracing
+from detections import DetectionSet, size_ids
+from resolution import cut_by_tile, downscale, region_windows, window_area
+
+# Paths a /detect?camera_id=... frame can take, reported in the response's 'camera'
+# block and as per-request counts 'camera_<path>':
+#   reuse  - nothing changed since the last analysed frame; its response is returned
+#   region - the full pipeline runs only on crops around the changed areas, the rest of
+#            the previous detections are kept
+#   full   - unknown camera, large change or periodic refresh: the whole frame is analysed
+REUSE = "reuse"
+REGION = "region"
+FULL = "full"
+
+
+def thumbnail(image, side=None):
+    """The change detector's view of a frame: small, blurred, grayscale, mean-centred."""
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    small, _ = downscale(gray, side or config.CAMERA_THUMBNAIL_SIDE)
+    small = cv2.GaussianBlur(small, (5, 5), 0).astype(np.int16)
+    # Centring on the mean ignores uniform exposure changes (clouds, auto gain)
+    return small - int(small.mean())
+
+
+def changed_mask(thumb, reference):
+    """Pixels that differ by more than CAMERA_PIXEL_THRESHOLD, with speckle noise removed."""
+    mask = (np.abs(thumb - reference) > config.CAMERA_PIXEL_THRESHOLD).astype(np.uint8)
+    kernel = np.ones((3, 3), dtype=np.uint8)
+    mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, kernel)
+    return cv2.dilate(mask, kernel)
+
+
+class CameraState:
+    """What is remembered per camera: the reference thumbnail and the last analysis."""
+
+    __slots__ = ("key", "shape", "reference", "detections", "text_detections", "response",
+                 "seen_at", "refreshed_at")
+
+    def __init__(self, key, shape, reference, detections, text_detections, response, now):
+        self.key = key
+        self.shape = shape
+        self.reference = reference
+        self.detections = detections
+        self.text_detections = text_detections
+        self.response = response
+        self.seen_at = now
+        self.refreshed_at = now
+
+
+class ChangePlan:
+    """
+    Decision for one frame of a camera, made by comparing its thumbnail with the
+    camera's reference. `inputs` are the images the pipeline still has to analyse: none
+    (reuse), the whole frame (full) or crops around the changed areas (region).
+    `combine(per_input_results)` takes one (detections, text_detections) pair per
+    input and returns the pair for the whole frame.
+    """
+
+    def __init__(self, image, state, key, now=None):
+        now = time.time() if now is None else now
+        self.shape = image.shape[:2]
+        self.state = state
+        self.key = key
+        self.thumb = thumbnail(image)
+        self.change = 0.0
+        self.windows = []
+        self.inputs = []
+        self.reason = None
+
+        if state is None:
+            self.reason = "new"
+        elif state.shape != self.shape or state.key != key or state.reference.shape != self.thumb.shape:
+            self.reason = "settings"
+        elif now - state.refreshed_at > config.CAMERA_REFRESH_SECONDS:
+            self.reason = "refresh"
+        else:
+            mask = changed_mask(self.thumb, state.reference)
+            self.change = float(mask.mean())
+            if not mask.any():
+                self.path = REUSE
+            elif self.change > config.CAMERA_FULL_CHANGE:
+                self.reason = "change"
+            else:
+                self.windows = self._windows(mask)
+                height, width = self.shape
+                if (len(self.windows) > config.CAMERA_MAX_REGIONS
+                        or window_area(self.windows) > config.CAMERA_MAX_REGION_AREA * height * width):
+                    self.reason = "change"
+                    self.windows = []
+                else:
+                    self.path = REGION
+        if self.reason is not None:
+            self.path = FULL
+
+        if self.path == FULL:
+            self.inputs = [image]
+        elif self.path == REGION:
+            self.inputs = [np.ascontiguousarray(image[y1:y2, x1:x2]) for x1, y1, x2, y2 in self.windows]
+
+        tracing.count(f"camera_{self.path}")
+        tracing.count("camera_regions", len(self.windows))
+
+    def _windows(self, mask):
+        """Frame crops around the changed blobs, grown over the previous detections they touch."""
+        height, width = self.shape
+        count, _, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=8)
+        scale_x = width / float(mask.shape[1])
+        scale_y = height / float(mask.shape[0])
+        blobs = [
+            [x * scale_x, y * scale_y, (x + w) * scale_x, (y + h) * scale_y]
+            for x, y, w, h, _ in stats[1:count].tolist()
+        ]
+        windows = region_windows(blobs, height, width, config.CAMERA_REGION_PADDING)
+
+        # An object that moved (or left) must be replaced as a whole, so every previous
+        # box touching a crop pulls the crop over itself
+        previous = [self.state.detections.boxes, [d['box'] for d in self.state.text_detections]]
+        boxes = np.concatenate([np.asarray(b, dtype=np.float64).reshape(-1, 4) for b in previous])
+        while windows:
+            touched = self._touching(boxes, windows)
+            grown = [
+                [min([w[0]] + [b[0] for b in hits]), min([w[1]] + [b[1] for b in hits]),
+                 max([w[2]] + [b[2] for b in hits]), max([w[3]] + [b[3] for b in hits])]
+                for w, hits in ((w, boxes[touched[:, i]].tolist()) for i, w in enumerate(windows))
+            ]
+            grown = region_windows(grown, height, width, min_side=0)
+            if grown == windows:
+                break
+            windows = grown
+        return windows
+
+    @staticmethod
+    def _touching(boxes, windows):
+        """boxes x windows mask of overlap."""
+        windows = np.asarray(windows, dtype=np.float64).reshape(-1, 4)
+        return ((boxes[:, None, 0] < windows[None, :, 2]) & (windows[None, :, 0] < boxes[:, None, 2])
+                & (boxes[:, None, 1] < windows[None, :, 3]) & (windows[None, :, 1] < boxes[:, None, 3]))
+
+    def escalate(self, image, reason="cut"):
+        """Switches a 'region' plan to the whole frame (see combine)."""
+        self.path = FULL
+        self.reason = reason
+        self.windows = []
+        self.inputs = [image]
+        tracing.count("camera_escalated")
+
+    def combine(self, per_input_results):
+        """
+        Returns None for a 'region' plan when a new box reaches the edge of its crop
+        (an object extending into the unchanged area, seen only in part); escalate()
+        and analyse the whole frame then.
+        """
+        if self.path == REUSE:
+            return self.state.detections, self.state.text_detections
+        if self.path == FULL:
+            return per_input_results[0]
+
+        height, width = self.shape
+        previous = self.state.detections
+        touched = self._touching(previous.boxes.astype(np.float64), self.windows).any(axis=1)
+        sets = [previous.select(~touched)]
+        text_boxes = np.asarray([d['box'] for d in self.state.text_detections], dtype=np.float64).reshape(-1, 4)
+        text_touched = self._touching(text_boxes, self.windows).any(axis=1)
+        text_detections = [dict(d) for d, hit in zip(self.state.text_detections, text_touched.tolist()) if not hit]
+
+        for (detections, crop_texts), window in zip(per_input_results, self.windows):
+            x1, y1 = window[0], window[1]
+            detections.boxes += np.array([x1, y1, x1, y1], dtype=np.int64)
+            crop_boxes = np.asarray([d['box'] for d in crop_texts], dtype=np.float64).reshape(-1, 4)
+            crop_boxes += [x1, y1, x1, y1]
+            if (cut_by_tile(detections.boxes, window, height, width).any()
+                    or cut_by_tile(crop_boxes, window, height, width).any()):
+                return None
+            # Size labels are relative to the frame, not the crop
+            detections.size_ids = size_ids(detections.boxes, height * width)
+            sets.append(detections)
+            for d in crop_texts:
+                bx1, by1, bx2, by2 = d['box']
+                text_detections.append({**d, 'box': [bx1 + x1, by1 + y1, bx2 + x1, by2 + y1]})
+        return DetectionSet.concat(sets), text_detections
+
+    def reference(self):
+        """The camera's new reference: the whole thumbnail, or only the re-analysed areas."""
+        if self.path != REGION:
+            return self.thumb
+        reference = self.state.reference.copy()
+        scale_y = reference.shape[0] / float(self.shape[0])
+        scale_x = reference.shape[1] / float(self.shape[1])
+        for x1, y1, x2, y2 in self.windows:
+            tx1, ty1 = int(x1 * scale_x), int(y1 * scale_y)
+            tx2, ty2 = int(np.ceil(x2 * scale_x)), int(np.ceil(y2 * scale_y))
+            reference[ty1:ty2, tx1:tx2] = self.thumb[ty1:ty2, tx1:tx2]
+        return reference
+
+
+class CameraGate:
+    """
+    Per-camera state for fixed cameras posting snapshots to /detect?camera_id=...,
+    used to skip or narrow down the analysis of frames that barely changed.
+
+    The reference of a camera is the thumbnail of the frame last analysed (for the
+    'region' path, only the re-analysed areas are refreshed), so slow drift adds up
+    until it crosses the thresholds. States are kept in an LRU bounded by `max_cameras`
+    and dropped after `ttl` seconds without a frame.
+    """
+
+    def __init__(self, max_cameras=None, ttl=None):
+        self.max_cameras = config.CAMERA_MAX_CAMERAS if max_cameras is None else max_cameras
+        self.ttl = config.CAMERA_STATE_TTL if ttl is None else ttl
+        self._states = OrderedDict()  # camera_id -> CameraState
+        self._lock = threading.Lock()
+        self._evictions = 0
+
+    @property
+    def enabled(self):
+        return self.max_cameras > 0
+
+    def plan(self, camera_id, image, key=None):
+        """A ChangePlan for this frame of camera_id (`key`: the request settings)."""
+        now = time.time()
+        with self._lock:
+            self._expire(now)
+            state = self._states.get(camera_id)
+            if state is not None:
+                state.seen_at = now
+                self._states.move_to_end(camera_id)
+        return ChangePlan(image, state, key, now)
+
+    def update(self, camera_id, plan, detections, text_detections, response):
+        """Stores the analysis of a frame that went through the full or region path."""
+        if plan.path == REUSE or not self.enabled:
+            return
+        now = time.time()
+        state = CameraState(plan.key, plan.shape, plan.reference(), detections, text_detections, response, now)
+        if plan.path == REGION:
+            state.refreshed_at = plan.state.refreshed_at
+        with self._lock:
+            self._states[camera_id] = state
+            self._states.move_to_end(camera_id)
+            while len(self._states) > self.max_cameras:
+                self._states.popitem(last=False)
+                self._evictions += 1
+
+    def _expire(self, now):
+        # Least recently seen first, so expired states are at the front
+        while self._states:
+            camera_id, state = next(iter(self._states.items()))
+            if now - state.seen_at <= self.ttl:
+                break
+            del self._states[camera_id]
+            self._evictions += 1
+
+    def stats(self):
+        with self._lock:
+            self._expire(time.time())
+            return {"cameras": len(self._states), "max_cameras": self.max_cameras, "evictions": self._evictions}
@@ -0,0 +1,105 @@
+import numpy as np
+
+import config
+import tracing
+from resolution import BoxArrays, box_arrays, cut_by_tile, merge_boxes, region_windows, window_area
+
+# Cascade policies for the person pass, selectable per request (?cascade=...):
+#   off    - PERSON_MODEL (yolov8x) on every frame
+#   frame  - CASCADE_MODEL (a small YOLO) first; its boxes are used as they are when it
+#            is confident, otherwise PERSON_MODEL runs on the whole frame
+#   region - like 'frame', but PERSON_MODEL only sees padded crops around the ambiguous
+#            boxes; crowded frames and large ambiguous areas still escalate the frame
+CASCADE_MODES = ("off", "frame", "region")
+
+# Paths a frame can take, reported as per-request counts 'cascade_<path>'
+ACCEPTED = "accepted"
+REGION = "region"
+FRAME = "frame"
+
+
+def small_conf(conf=config.CONF_THRESHOLD):
+    """Confidence threshold for the small model: low enough to see the ambiguous boxes."""
+    return min(conf, config.CASCADE_MIN_CONF)
+
+
+class CascadePlan:
+    """
+    Escalation decision for one image, made from the small model's results. `inputs`
+    are the images PERSON_MODEL still has to see: none (the small model's boxes are
+    kept), the whole frame, or crops around the ambiguous boxes. `combine(per_input_results)`
+    takes one results list per input, in order, and returns a results list for
+    ObjectDetector.merge_results in image coordinates.
+
+    A frame escalates when the small model reports more than CASCADE_MAX_OBJECTS
+    candidate boxes (crowded scenes are where small models miss most) or any box whose
+    confidence lies between CASCADE_MIN_CONF and CASCADE_ACCEPT_CONF.
+    """
+
+    def __init__(self, image, small_results, mode=None, conf=config.CONF_THRESHOLD):
+        self.mode = mode or config.CASCADE_MODE
+        if self.mode not in CASCADE_MODES or self.mode == "off":
+            raise ValueError(f"Not a cascade mode: '{self.mode}'")
+        self.shape = image.shape[:2]
+        self.conf = conf
+        self.inputs = []
+        self.windows = []
+
+        arrays = [box_arrays(result) for result in small_results]
+        self.small = BoxArrays(
+            np.concatenate([a.xyxy for a in arrays]) if arrays else np.zeros((0, 4)),
+            np.concatenate([a.conf for a in arrays]) if arrays else np.zeros(0),
+            np.concatenate([a.cls for a in arrays]) if arrays else np.zeros(0, dtype=int),
+        )
+        candidates = self.small.conf >= config.CASCADE_MIN_CONF
+        ambiguous = candidates & (self.small.conf < config.CASCADE_ACCEPT_CONF)
+        self.ambiguous = int(ambiguous.sum())
+
+        height, width = self.shape
+        if candidates.sum() > config.CASCADE_MAX_OBJECTS:
+            self.path = FRAME
+        elif not self.ambiguous:
+            self.path = ACCEPTED
+        elif self.mode == "frame":
+            self.path = FRAME
+        else:
+            self.windows = region_windows(self.small.xyxy[ambiguous], height, width, config.CASCADE_REGION_PADDING)
+            covered = window_area(self.windows)
+            if len(self.windows) > config.CASCADE_MAX_REGIONS or covered > config.CASCADE_MAX_REGION_AREA * height * width:
+                self.path = FRAME
+                self.windows = []
+            else:
+                self.path = REGION
+
+        if self.path == FRAME:
+            self.inputs = [image]
+        elif self.path == REGION:
+            self.inputs = [np.ascontiguousarray(image[y1:y2, x1:x2]) for x1, y1, x2, y2 in self.windows]
+
+        tracing.count(f"cascade_{self.path}")
+        tracing.count("cascade_ambiguous", self.ambiguous)
+        tracing.count("cascade_regions", len(self.windows))
+
+    def _kept_small_boxes(self, keep):
+        return BoxArrays(self.small.xyxy[keep], self.small.conf[keep], self.small.cls[keep])
+
+    def combine(self, per_input_results):
+        if self.path == FRAME:
+            return per_input_results[0]
+        # Confident small-model boxes stand; ambiguous ones are replaced by the heavy verdict
+        accepted = self._kept_small_boxes(
+            (self.small.conf >= self.conf) & (self.small.conf >= config.CASCADE_ACCEPT_CONF)
+        )
+        if self.path == ACCEPTED:
+            return [accepted]
+
+        height, width = self.shape
+        arrays = [accepted]
+        cut = [np.zeros(len(accepted.conf), dtype=bool)]
+        for results, window in zip(per_input_results, self.windows):
+            for result in results:
+                array = box_arrays(result, offset=(window[0], window[1]))
+                arrays.append(array)
+                cut.append(cut_by_tile(array.xyxy, window, height, width))
+        # Heavy boxes duplicating an accepted one (or cut by a crop edge) fold into it
+        return [merge_boxes(arrays, cut)]
@@ -0,0 +1,142 @@
+import cv2
+import numpy as np
+
+import config
+
+# Color names in rule order; the index of a name is its color id
+COLOR_NAMES = [
+    "White", "Black", "Red", "Green", "Blue", "Yellow", "Orange", "White", "Grey",
+    "Pink", "Cyan", "Reddish", "Greenish", "Blueish",
+]
+UNKNOWN = "Unknown"
+
+
+def name_colors(bgr):
+    """
+    Vectorized form of the detect_color naming rules: maps an (N, 3) array of BGR
+    colors to color names in one np.select over the rule table below.
+    Colors are truncated to integers first, like the scalar version did.
+    """
+    bgr = np.asarray(bgr, dtype=np.float64).reshape(-1, 3).astype(np.int64)
+    b, g, r = bgr[:, 0], bgr[:, 1], bgr[:, 2]
+    avg_val = (r + g + b) / 3
+    greyish = (np.abs(r - g) < 20) & (np.abs(r - b) < 20) & (np.abs(g - b) < 20)
+
+    # Same order as the if-chain: the first matching rule wins
+    rules = [
+        avg_val > 190,                                  # White
+        avg_val < 50,                                   # Black
+        (r > 150) & (g < 100) & (b < 100),              # Red
+        (r < 100) & (g > 150) & (b < 100),              # Green
+        (r < 100) & (g < 100) & (b > 150),              # Blue
+        (r > 200) & (g > 200) & (b < 100),              # Yellow
+        (r > 150) & (g > 100) & (b < 50),               # Orange
+        greyish & (avg_val > 140),                      # White
+        greyish,                                        # Grey
+        (r > 150) & (g < 50) & (b > 150),               # Pink
+        (r < 50) & (g > 150) & (b > 150),               # Cyan
+        (r >= g) & (r >= b),                            # Reddish
+        (g >= r) & (g >= b),                            # Greenish
+    ]
+    ids = np.select(rules, np.arange(len(rules)), default=len(rules))  # Blueish
+    return [COLOR_NAMES[i] for i in ids]
+
+
+def clip_boxes(boxes, height, width):
+    """Clips [x1, y1, x2, y2] boxes to the frame the same way the ROI slicing does."""
+    boxes = np.asarray(boxes, dtype=np.int64).reshape(-1, 4)
+    x1 = np.clip(boxes[:, 0], 0, width)
+    y1 = np.clip(boxes[:, 1], 0, height)
+    x2 = np.clip(boxes[:, 2], 0, width)
+    y2 = np.clip(boxes[:, 3], 0, height)
+    return x1, y1, x2, y2
+
+
+class ColorEngine:
+    """
+    Dominant colors for all boxes of one image at once.
+
+    Methods (COLOR_METHOD):
+      'sampled'  - mean of the 50x50 resample of each box: the exact value the former
+                   k=1 k-means converged to, without the 10 k-means attempts per box.
+      'integral' - true mean of each box read in O(1) from a summed-area table of the
+                   frame built once per image; no per-box copies. Best for crowded scenes.
+      'auto'     - 'integral' once there are COLOR_INTEGRAL_MIN_BOXES boxes, else 'sampled'.
+      'kmeans'   - center of the largest of COLOR_CLUSTERS k-means clusters per box
+                   (true multi-cluster dominant color).
+    """
+
+    def __init__(self, image, method=None, clusters=None):
+        self.image = image
+        self.method = method or config.COLOR_METHOD
+        self.clusters = config.COLOR_CLUSTERS if clusters is None else clusters
+        self._integral = None
+
+    @property
+    def integral(self):
+        if self._integral is None:
+            height, width = self.image.shape[:2]
+            # int32 sums are exact up to ~8 MP and much cheaper to build than float64
+            depth = cv2.CV_32S if height * width * 255 < 2 ** 31 else cv2.CV_64F
+            self._integral = cv2.integral(self.image, sdepth=depth)
+        return self._integral
+
+    def _boxes(self, boxes):
+        height, width = self.image.shape[:2]
+        x1, y1, x2, y2 = clip_boxes(boxes, height, width)
+        return x1, y1, np.maximum(x2, x1), np.maximum(y2, y1)
+
+    def integral_colors(self, boxes):
+        """(N, 3) mean BGR color per box from the summed-area table; NaN rows for empty boxes."""
+        x1, y1, x2, y2 = self._boxes(boxes)
+        s = self.integral
+        sums = (s[y2, x2].astype(np.float64) - s[y1, x2] - s[y2, x1] + s[y1, x1])
+        areas = ((x2 - x1) * (y2 - y1)).astype(np.float64)[:, None]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return sums / areas
+
+    def sampled_colors(self, boxes):
+        """(N, 3) mean BGR color of each box's 50x50 resample; NaN rows for empty boxes."""
+        x1, y1, x2, y2 = self._boxes(boxes)
+        output = np.full((len(x1), 3), np.nan)
+        for i in range(len(x1)):
+            roi = self.image[y1[i]:y2[i], x1[i]:x2[i]]
+            if roi.size:
+                output[i] = cv2.mean(cv2.resize(roi, (50, 50)))[:3]
+        return output
+
+    def kmeans_colors(self, boxes):
+        """(N, 3) dominant BGR color per box using k-means with `clusters` centers."""
+        x1, y1, x2, y2 = self._boxes(boxes)
+        output = np.full((len(x1), 3), np.nan)
+        criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 10, 1.0)
+        for i in range(len(x1)):
+            roi = self.image[y1[i]:y2[i], x1[i]:x2[i]]
+            if roi.size == 0:
+                continue
+            data = np.float32(cv2.resize(roi, (50, 50)).reshape(-1, 3))
+            k = max(1, self.clusters)
+            _, labels, centers = cv2.kmeans(data, k, None, criteria, 3, cv2.KMEANS_PP_CENTERS)
+            output[i] = centers[np.bincount(labels.ravel(), minlength=k).argmax()]
+        return output
+
+    def colors(self, boxes):
+        method = self.method
+        if method == "auto":
+            method = "integral" if len(boxes) >= config.COLOR_INTEGRAL_MIN_BOXES else "sampled"
+        if method == "integral":
+            return self.integral_colors(boxes)
+        if method == "kmeans":
+            return self.kmeans_colors(boxes)
+        return self.sampled_colors(boxes)
+
+    def names(self, boxes):
+        """Color name for every box ("Unknown" for empty boxes)."""
+        if len(boxes) == 0:
+            return []
+        colors = self.colors(boxes)
+        valid = ~np.isnan(colors).any(axis=1)
+        names = [UNKNOWN] * len(colors)
+        for i, name in zip(np.flatnonzero(valid), name_colors(colors[valid])):
+            names[i] = name
+        return names
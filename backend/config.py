@@ -0,0 +1,264 @@
+import os
+
+# Runtime configuration. Every setting can be overridden through an environment
+# variable of the same name, which is how the Dockerfile / Cloud Run / HF Spaces
+# deployments tune the service without code changes.
+
+
+def _env_int(name, default):
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        print(f"Warning: invalid value for {name}, using {default}")
+        return default
+
+
+# --- Models ---
+# Directory that model files are resolved against (defaults to the backend directory,
+# where the Dockerfile copies the YOLO weights).
+MODEL_DIR = os.environ.get("MODEL_DIR", os.path.dirname(os.path.abspath(__file__)))
+# Load models only from local files (MODEL_DIR / EASYOCR_MODEL_DIR), never download.
+MODELS_OFFLINE = os.environ.get("MODELS_OFFLINE", "0") == "1"
+# 'background': load all models concurrently while the server starts accepting requests,
+# 'lazy': load each model on first use, 'eager': block startup until everything is loaded.
+MODEL_LOAD_MODE = os.environ.get("MODEL_LOAD_MODE", "background")
+# Where EasyOCR keeps its detector / recognizer weights (EasyOCR default when empty).
+EASYOCR_MODEL_DIR = os.environ.get("EASYOCR_MODEL_DIR", "")
+
+# 'torch': the real YOLO / ViT / EasyOCR models. 'stub': deterministic stand-ins that
+# need no weights or network (stub_models.py), for offline benchmarks and smoke tests.
+MODEL_BACKEND = os.environ.get("MODEL_BACKEND", "torch")
+# Per-image delay added by the stub models to mimic model cost.
+STUB_LATENCY_MS = _env_int("STUB_LATENCY_MS", 0)
+# Runtime for the YOLO and ViT models with MODEL_BACKEND=torch (see backends.py):
+# 'torch' (PyTorch eager), 'onnx' (ONNX Runtime) or 'openvino'.
+INFERENCE_BACKEND = os.environ.get("INFERENCE_BACKEND", "torch")
+# Use INT8-quantized exports for the onnx / openvino backends.
+BACKEND_INT8 = os.environ.get("BACKEND_INT8", "0") == "1"
+# Where exported models are kept (default: <MODEL_DIR>/exported).
+BACKEND_DIR = os.environ.get("BACKEND_DIR", "")
+# Export missing models on first load (otherwise loading fails until they are exported).
+BACKEND_AUTO_EXPORT = os.environ.get("BACKEND_AUTO_EXPORT", "1") == "1"
+# Calibration dataset yaml for OpenVINO INT8 post-training quantization of YOLO.
+BACKEND_CALIBRATION_DATA = os.environ.get("BACKEND_CALIBRATION_DATA", "")
+
+PERSON_MODEL = os.environ.get("PERSON_MODEL", "yolov8x.pt")
+PPE_MODEL = os.environ.get("PPE_MODEL", "yolov8m_hardhat.pt")
+VIT_MODEL = os.environ.get("VIT_MODEL", "google/vit-base-patch16-224")
+
+# YOLO confidence and NMS IoU thresholds used for both passes
+CONF_THRESHOLD = float(os.environ.get("CONF_THRESHOLD", 0.45))
+IOU_THRESHOLD = float(os.environ.get("IOU_THRESHOLD", 0.5))
+
+# --- Inference executor ---
+# Number of worker threads used to run the YOLO, hard-hat YOLO and EasyOCR
+# passes concurrently. Torch and EasyOCR release the GIL inside their kernels,
+# so threads are enough to overlap the three heavy passes.
+INFERENCE_WORKERS = _env_int("INFERENCE_WORKERS", 3)
+
+# --- Micro-batching ---
+# YOLO calls from concurrent requests are coalesced into one batched forward pass.
+# A batch is flushed when BATCH_MAX_SIZE images are waiting or the oldest image
+# has waited BATCH_MAX_WAIT_MS. Set BATCH_MAX_SIZE=1 to disable batching.
+BATCH_MAX_SIZE = _env_int("BATCH_MAX_SIZE", 8)
+BATCH_MAX_WAIT_MS = _env_int("BATCH_MAX_WAIT_MS", 10)
+
+# --- ViT refinement ---
+# Refinement candidates (vehicles, 'No Helmet') are classified in batches of this size.
+VIT_BATCH_SIZE = _env_int("VIT_BATCH_SIZE", 16)
+# Minimum ViT confidence before a vehicle class is overridden.
+VIT_CONFIDENCE_THRESHOLD = float(os.environ.get("VIT_CONFIDENCE_THRESHOLD", 0.4))
+
+# --- Uploads ---
+# Maximum accepted request body size in bytes, enforced while the upload streams in.
+MAX_UPLOAD_BYTES = _env_int("MAX_UPLOAD_BYTES", 20 * 1024 * 1024)
+# If > 0, JPEGs whose longest side is at least 2x this value are decoded at a reduced
+# resolution (1/2, 1/4 or 1/8) that keeps the longest side >= DECODE_MAX_SIDE.
+DECODE_MAX_SIDE = _env_int("DECODE_MAX_SIDE", 0)
+
+# --- Result cache ---
+# In-memory LRU of full /detect responses keyed on the decoded image and model config.
+# Set CACHE_MAX_ENTRIES=0 to disable caching.
+CACHE_MAX_ENTRIES = _env_int("CACHE_MAX_ENTRIES", 256)
+CACHE_TTL_SECONDS = _env_int("CACHE_TTL_SECONDS", 3600)
+# Optional on-disk tier that survives restarts (disabled when empty).
+CACHE_DIR = os.environ.get("CACHE_DIR", "")
+CACHE_DISK_MAX_ENTRIES = _env_int("CACHE_DISK_MAX_ENTRIES", 10000)
+
+# --- Replica pool ---
+# Number of independent model replicas. With REPLICAS > 1 each replica gets its own
+# models and a slice of the CPU cores, and requests are routed to an idle replica.
+# REPLICA_MODE is 'thread' (replicas share the process) or 'process' (one worker
+# process per replica).
+REPLICAS = _env_int("REPLICAS", 1)
+REPLICA_MODE = os.environ.get("REPLICA_MODE", "thread")
+# Torch intra-op threads per replica (0: the size of its core slice). Thread replicas
+# share one process-wide setting, but each runs its own pool of that size.
+REPLICA_THREADS = _env_int("REPLICA_THREADS", 0)
+
+# --- Video / frame streams ---
+# Run the detector on every Nth frame; boxes on the frames in between are propagated
+# by a lightweight IoU tracker.
+VIDEO_STRIDE = _env_int("VIDEO_STRIDE", 5)
+# Upload limit for /detect/video (the clip is spooled to a temporary file for decoding).
+MAX_VIDEO_UPLOAD_BYTES = _env_int("MAX_VIDEO_UPLOAD_BYTES", 500 * 1024 * 1024)
+# Hard cap on frames processed per request (0: no cap).
+VIDEO_MAX_FRAMES = _env_int("VIDEO_MAX_FRAMES", 0)
+# Tracks not re-detected for this many keyframes are dropped.
+VIDEO_TRACK_MAX_MISSES = _env_int("VIDEO_TRACK_MAX_MISSES", 2)
+# Allow rtsp:// / http(s):// stream URLs as the video source (off by default).
+VIDEO_ALLOW_STREAM_URLS = os.environ.get("VIDEO_ALLOW_STREAM_URLS", "0") == "1"
+
+# --- OCR ---
+# 'gated': OCR only the regions where text is likely (vehicle plate areas, text-bearing
+# objects, cheap text-scan hits), falling back to a full scan for text-dense images
+# such as receipts. 'full': always run EasyOCR on the whole frame.
+OCR_MODE = os.environ.get("OCR_MODE", "gated")
+# The cheap text scan runs on a frame downscaled to this longest side.
+OCR_SCAN_MAX_SIDE = _env_int("OCR_SCAN_MAX_SIDE", 800)
+# Full-scan fallback: fraction of the frame covered by text lines, or number of lines.
+OCR_FULL_SCAN_DENSITY = float(os.environ.get("OCR_FULL_SCAN_DENSITY", 0.08))
+OCR_FULL_SCAN_LINES = _env_int("OCR_FULL_SCAN_LINES", 12)
+# Text boxes recognized per recognizer forward pass (full scan and gated path).
+OCR_BATCH_SIZE = _env_int("OCR_BATCH_SIZE", 16)
+# 'int8' keeps EasyOCR's CPU default (quantize=True: the recognizer's LSTM / Linear
+# layers run dynamically quantized), the same as before this setting existed; 'fp32'
+# turns quantization off. Check a change with bench_ocr.py.
+OCR_PRECISION = os.environ.get("OCR_PRECISION", "int8")
+# Text detector (CRAFT) input: the image is resized by OCR_MAG_RATIO, capped at
+# OCR_CANVAS_SIZE on the longest side. Smaller canvases are faster but miss small text.
+OCR_CANVAS_SIZE = _env_int("OCR_CANVAS_SIZE", 2560)
+OCR_MAG_RATIO = float(os.environ.get("OCR_MAG_RATIO", 1.0))
+
+# --- Colors ---
+# How box colors are computed (see colors.ColorEngine): 'sampled', 'integral', 'auto'
+# (integral from COLOR_INTEGRAL_MIN_BOXES boxes per image on) or 'kmeans'.
+COLOR_METHOD = os.environ.get("COLOR_METHOD", "auto")
+COLOR_INTEGRAL_MIN_BOXES = _env_int("COLOR_INTEGRAL_MIN_BOXES", 200)
+# Clusters per box for COLOR_METHOD=kmeans; the largest cluster is the dominant color.
+COLOR_CLUSTERS = _env_int("COLOR_CLUSTERS", 3)
+
+# --- Batch endpoint & bulk jobs ---
+# Maximum number of files in one /detect/batch request and its total upload size.
+BATCH_MAX_FILES = _env_int("BATCH_MAX_FILES", 64)
+MAX_BATCH_UPLOAD_BYTES = _env_int("MAX_BATCH_UPLOAD_BYTES", 200 * 1024 * 1024)
+# Images of one batch request / job in inference at the same time.
+BATCH_CONCURRENCY = _env_int("BATCH_CONCURRENCY", 4)
+# Where job state, extracted archives and results.jsonl files are kept; unfinished
+# jobs found here are resumed on startup.
+JOBS_DIR = os.environ.get("JOBS_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "jobs"))
+# Root directory that manifest / directory jobs may read from (disabled when empty).
+JOBS_INPUT_ROOT = os.environ.get("JOBS_INPUT_ROOT", "")
+# Jobs processed at the same time; further jobs wait in 'queued'.
+JOBS_MAX_RUNNING = _env_int("JOBS_MAX_RUNNING", 1)
+# Decoded images buffered ahead of inference per job (bounds memory, gives backpressure).
+JOBS_QUEUE_SIZE = _env_int("JOBS_QUEUE_SIZE", 8)
+# Upload limit for zip archives posted to /jobs.
+MAX_JOB_UPLOAD_BYTES = _env_int("MAX_JOB_UPLOAD_BYTES", 2 * 1024 * 1024 * 1024)
+
+# --- Tracing / metrics ---
+# Per-stage timers and counters for /detect (exported on /metrics). When disabled the
+# stage timers are shared no-op objects.
+TRACING = os.environ.get("TRACING", "1") == "1"
+# Always send a Server-Timing header with the stage breakdown (otherwise only for
+# requests carrying 'X-Trace: 1').
+TRACE_HEADER = os.environ.get("TRACE_HEADER", "0") == "1"
+
+# --- Resolution policy / tiling ---
+# Default per-request resolution mode (see resolution.py): 'full', 'fast' or 'tiled'.
+# Requests can override it with ?resolution=...
+RESOLUTION_MODE = os.environ.get("RESOLUTION_MODE", "full")
+# 'fast' / 'tiled': the coarse YOLO passes run on one copy downscaled to this longest side.
+COARSE_MAX_SIDE = _env_int("COARSE_MAX_SIDE", 1280)
+# 'tiled': tile side in pixels of the full-resolution frame and overlap between tiles.
+TILE_SIZE = _env_int("TILE_SIZE", 640)
+TILE_OVERLAP = float(os.environ.get("TILE_OVERLAP", 0.2))
+# Upper bound on tiles per frame; larger frames get proportionally larger tiles.
+TILE_MAX_TILES = _env_int("TILE_MAX_TILES", 16)
+# Boxes of the same class overlapping by more than this (intersection over the smaller
+# box) across tiles are merged into one.
+TILE_MATCH_THRESHOLD = float(os.environ.get("TILE_MATCH_THRESHOLD", 0.5))
+
+# --- Cascade ---
+# Default per-request cascade policy for the person pass (see cascade.py): 'off'
+# (PERSON_MODEL on every frame), 'frame' (CASCADE_MODEL first, PERSON_MODEL on the whole
+# frame only when needed) or 'region' (PERSON_MODEL only on crops around ambiguous
+# boxes). Requests can override it with ?cascade=...
+CASCADE_MODE = os.environ.get("CASCADE_MODE", "off")
+# The small first-stage model; must use the same class list as PERSON_MODEL (COCO).
+CASCADE_MODEL = os.environ.get("CASCADE_MODEL", "yolov8n.pt")
+# Small-model boxes at or above CASCADE_ACCEPT_CONF are trusted; boxes between
+# CASCADE_MIN_CONF and CASCADE_ACCEPT_CONF are ambiguous and escalate.
+CASCADE_MIN_CONF = float(os.environ.get("CASCADE_MIN_CONF", 0.2))
+CASCADE_ACCEPT_CONF = float(os.environ.get("CASCADE_ACCEPT_CONF", 0.6))
+# More candidate boxes than this (a crowded frame) escalate the whole frame.
+CASCADE_MAX_OBJECTS = _env_int("CASCADE_MAX_OBJECTS", 8)
+# 'region': crops are the ambiguous boxes grown by this fraction of their size; more
+# than CASCADE_MAX_REGIONS crops, or crops covering more than CASCADE_MAX_REGION_AREA
+# of the frame, escalate the whole frame instead.
+CASCADE_REGION_PADDING = float(os.environ.get("CASCADE_REGION_PADDING", 0.25))
+CASCADE_MAX_REGIONS = _env_int("CASCADE_MAX_REGIONS", 4)
+CASCADE_MAX_REGION_AREA = float(os.environ.get("CASCADE_MAX_REGION_AREA", 0.4))
+
+# --- Person-conditional PPE ---
+# Hard-hat detections only survive when they lie inside a person box, so the PPE model
+# can be skipped or narrowed down once the person pass is done:
+# 'always' (run it on every frame, concurrently with the person pass), 'conditional'
+# (only on frames with at least one person) or 'crops' (only on crops around the persons).
+PPE_MODE = os.environ.get("PPE_MODE", "conditional")
+# 'crops': person boxes are grown by this fraction of their size; if the crops cover more
+# than PPE_CROP_MAX_AREA of the frame, the PPE model runs on the frame instead.
+PPE_CROP_PADDING = float(os.environ.get("PPE_CROP_PADDING", 0.1))
+PPE_CROP_MAX_AREA = float(os.environ.get("PPE_CROP_MAX_AREA", 0.5))
+
+# --- Response format ---
+# Default output of /detect and /detect/batch (see responses.py): 'json' (one object
+# per detection), 'compact' (columnar, dictionary-encoded strings) or 'msgpack'.
+# Requests can override it with ?output=... or 'Accept: application/msgpack'.
+RESPONSE_FORMAT = os.environ.get("RESPONSE_FORMAT", "json")
+
+# --- Fixed cameras (change-detection gate) ---
+# /detect?camera_id=... keeps a small state per camera (reference thumbnail, last
+# analysis) and skips or narrows down frames that barely changed (see camera_gate.py).
+# At most CAMERA_MAX_CAMERAS states are kept (least recently seen evicted first); a
+# state is dropped after CAMERA_STATE_TTL seconds without a frame. 0 disables the gate.
+CAMERA_MAX_CAMERAS = _env_int("CAMERA_MAX_CAMERAS", 256)
+CAMERA_STATE_TTL = _env_int("CAMERA_STATE_TTL", 600)
+# Frames are compared as grayscale thumbnails with this longest side; a thumbnail pixel
+# changed when it differs by more than CAMERA_PIXEL_THRESHOLD grey levels.
+CAMERA_THUMBNAIL_SIDE = _env_int("CAMERA_THUMBNAIL_SIDE", 160)
+CAMERA_PIXEL_THRESHOLD = _env_int("CAMERA_PIXEL_THRESHOLD", 25)
+# More than this fraction of changed pixels re-analyses the whole frame; smaller changes
+# re-analyse crops around them (grown by CAMERA_REGION_PADDING of their size), unless
+# there are more than CAMERA_MAX_REGIONS crops or they cover more than
+# CAMERA_MAX_REGION_AREA of the frame.
+CAMERA_FULL_CHANGE = float(os.environ.get("CAMERA_FULL_CHANGE", 0.25))
+CAMERA_REGION_PADDING = float(os.environ.get("CAMERA_REGION_PADDING", 0.25))
+CAMERA_MAX_REGIONS = _env_int("CAMERA_MAX_REGIONS", 4)
+CAMERA_MAX_REGION_AREA = float(os.environ.get("CAMERA_MAX_REGION_AREA", 0.5))
+# A full pass at least this often per camera, whatever the change.
+CAMERA_REFRESH_SECONDS = _env_int("CAMERA_REFRESH_SECONDS", 300)
+
+# --- Prefork serving (prefork.py) ---
+# Worker processes forked from one parent that has loaded every model; they share the
+# weights copy-on-write instead of each loading its own copy.
+PREFORK_WORKERS = _env_int("PREFORK_WORKERS", 2)
+# Run the YOLO and OCR passes once in the parent (single-threaded) before forking, so
+# first-call work such as YOLO's conv/batch-norm fusion happens once, in shared pages.
+PREFORK_WARMUP = os.environ.get("PREFORK_WARMUP", "1") == "1"
+
+# --- Admission control (/detect) ---
+# At most ADMISSION_MAX_CONCURRENT requests run the pipeline at once and at most
+# ADMISSION_MAX_QUEUE wait for a slot; further requests get 429 with Retry-After
+# (see admission.py). ADMISSION_MAX_CONCURRENT=0 disables the limit (deadlines and
+# disconnect cancellation still apply).
+ADMISSION_MAX_CONCURRENT = _env_int("ADMISSION_MAX_CONCURRENT", 4)
+ADMISSION_MAX_QUEUE = _env_int("ADMISSION_MAX_QUEUE", 16)
+# Request deadline in seconds unless the request sets one (?timeout=... or the
+# 'X-Request-Timeout' header), and the largest deadline a request may ask for.
+ADMISSION_DEFAULT_TIMEOUT = float(os.environ.get("ADMISSION_DEFAULT_TIMEOUT", 30.0))
+ADMISSION_MAX_TIMEOUT = float(os.environ.get("ADMISSION_MAX_TIMEOUT", 120.0))
+# Service time assumed before the first request completes (queue wait estimates).
+ADMISSION_INITIAL_SERVICE_S = float(os.environ.get("ADMISSION_INITIAL_SERVICE_S", 1.0))
+# How often a running request checks whether its client is still connected.
+ADMISSION_DISCONNECT_POLL_S = float(os.environ.get("ADMISSION_DISCONNECT_POLL_S", 0.25))
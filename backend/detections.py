@@ -0,0 +1,175 @@
+import threading
+
+import numpy as np
+
+# Size buckets by box area relative to the frame (see size_ids)
+SIZE_LABELS = ("Small", "Medium", "Large")
+SIZE_BOUNDS = (0.05, 0.20)
+
+# DetectionSet.flags bits
+FROM_PPE = 1        # detected by the hard-hat model (RUN 2)
+
+
+class Vocabulary:
+    """
+    Append-only string <-> id table shared by all DetectionSets, so id columns from
+    different images and passes can be compared and concatenated directly.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ids = {}
+        self.names = []
+
+    def id(self, name):
+        index = self._ids.get(name)
+        if index is None:
+            with self._lock:
+                index = self._ids.get(name)
+                if index is None:
+                    index = self._ids[name] = len(self.names)
+                    self.names.append(name)
+        return index
+
+    def ids(self, names):
+        return np.fromiter((self.id(name) for name in names), dtype=np.int32, count=len(names))
+
+    def lookup(self, ids):
+        names = self.names
+        return [names[i] for i in np.asarray(ids).tolist()]
+
+
+CLASSES = Vocabulary()
+COLORS = Vocabulary()
+# Id 0, the default of empty columns
+CLASSES.id("Unknown")
+COLORS.id("Unknown")
+
+
+def size_ids(boxes, total_area):
+    """Index into SIZE_LABELS per box, by its area relative to total_area."""
+    boxes = np.asarray(boxes).reshape(-1, 4)
+    ratio = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1]) / float(total_area)
+    return np.digitize(ratio, SIZE_BOUNDS).astype(np.int8)
+
+
+class DetectionSet:
+    """
+    The detections of one image as columns instead of a list of dicts:
+
+        boxes         (N, 4) int64 [x1, y1, x2, y2]
+        scores        (N,) float64 confidence
+        class_ids     (N,) ids into CLASSES (after ViT refinement)
+        original_ids  (N,) ids into CLASSES (as detected)
+        color_ids     (N,) ids into COLORS
+        size_ids      (N,) index into SIZE_LABELS
+        flags         (N,) bit mask (FROM_PPE)
+
+    plus the text columns filled by pipeline.associate_results (ocr_text, number_plate,
+    description; object arrays, None until set). Filtering is mask based (`select`),
+    and to_dicts() converts to the /detect JSON shape once, at the end.
+    """
+
+    __slots__ = ("boxes", "scores", "class_ids", "original_ids", "color_ids", "size_ids", "flags",
+                 "ocr_text", "number_plate", "description")
+
+    COLUMNS = ("boxes", "scores", "class_ids", "original_ids", "color_ids", "size_ids", "flags")
+    TEXT_COLUMNS = ("ocr_text", "number_plate", "description")
+    # Id columns and the vocabulary they index
+    CATEGORICAL = (("class_ids", CLASSES), ("original_ids", CLASSES), ("color_ids", COLORS))
+
+    def __init__(self, boxes=None, scores=None, class_ids=None, original_ids=None, color_ids=None,
+                 size_ids=None, flags=None):
+        self.boxes = np.zeros((0, 4), dtype=np.int64) if boxes is None else np.asarray(boxes, dtype=np.int64).reshape(-1, 4)
+        n = len(self.boxes)
+        self.scores = np.zeros(n) if scores is None else np.asarray(scores, dtype=np.float64)
+        self.class_ids = np.zeros(n, dtype=np.int32) if class_ids is None else np.asarray(class_ids, dtype=np.int32)
+        self.original_ids = self.class_ids.copy() if original_ids is None else np.asarray(original_ids, dtype=np.int32)
+        self.color_ids = np.zeros(n, dtype=np.int32) if color_ids is None else np.asarray(color_ids, dtype=np.int32)
+        self.size_ids = np.zeros(n, dtype=np.int8) if size_ids is None else np.asarray(size_ids, dtype=np.int8)
+        if flags is None or np.isscalar(flags):
+            self.flags = np.full(n, flags or 0, dtype=np.uint8)
+        else:
+            self.flags = np.asarray(flags, dtype=np.uint8)
+        self.ocr_text = self.number_plate = self.description = None
+
+    def __len__(self):
+        return len(self.boxes)
+
+    @classmethod
+    def concat(cls, sets):
+        sets = list(sets)
+        if not sets:
+            return cls()
+        merged = cls(*(np.concatenate([getattr(s, name) for s in sets]) for name in cls.COLUMNS))
+        for name in cls.TEXT_COLUMNS:
+            if all(getattr(s, name) is not None for s in sets):
+                setattr(merged, name, np.concatenate([getattr(s, name) for s in sets]))
+        return merged
+
+    def select(self, index):
+        """Subset by boolean mask or index array (keeps the order of `index`)."""
+        subset = DetectionSet(*(getattr(self, name)[index] for name in self.COLUMNS))
+        for name in self.TEXT_COLUMNS:
+            column = getattr(self, name)
+            if column is not None:
+                setattr(subset, name, column[index])
+        return subset
+
+    def __getstate__(self):
+        # Ids are only meaningful within one process (process replicas pickle results),
+        # so the categorical columns travel as names
+        state = {name: getattr(self, name) for name in self.__slots__}
+        for name, vocabulary in self.CATEGORICAL:
+            state[name] = vocabulary.lookup(state[name])
+        return state
+
+    def __setstate__(self, state):
+        for name, vocabulary in self.CATEGORICAL:
+            state[name] = vocabulary.ids(state[name])
+        for name in self.__slots__:
+            setattr(self, name, state[name])
+
+    def class_names(self):
+        return CLASSES.lookup(self.class_ids)
+
+    def original_names(self):
+        return CLASSES.lookup(self.original_ids)
+
+    def color_names(self):
+        return COLORS.lookup(self.color_ids)
+
+    def is_class(self, *names):
+        """Mask of detections whose (refined) class is one of `names`."""
+        return np.isin(self.class_ids, [CLASSES.id(name) for name in names])
+
+    def is_original(self, *names):
+        """Mask of detections whose original class is one of `names`."""
+        return np.isin(self.original_ids, [CLASSES.id(name) for name in names])
+
+    def set_classes(self, index, names):
+        self.class_ids[index] = CLASSES.ids(names)
+
+    def to_dicts(self):
+        """The detections in the /detect JSON shape (one dict per detection)."""
+        columns = [
+            ("box", self.boxes.tolist()),
+            ("confidence", self.scores.tolist()),
+            ("class", self.class_names()),
+            ("original_class", self.original_names()),
+            ("color", self.color_names()),
+            ("size", [SIZE_LABELS[i] for i in self.size_ids.tolist()]),
+        ]
+        if self.ocr_text is not None:
+            columns.append(("ocr_text", self.ocr_text.tolist()))
+        keys = [key for key, _ in columns]
+        output = [dict(zip(keys, row)) for row in zip(*(values for _, values in columns))]
+
+        if self.number_plate is not None:
+            for det, plate in zip(output, self.number_plate.tolist()):
+                if plate:
+                    det['number_plate'] = plate
+        if self.description is not None:
+            for det, description in zip(output, self.description.tolist()):
+                det['description'] = description
+        return output
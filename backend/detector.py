@@ -1,76 +1,106 @@
-from ultralytics import YOLO
 import numpy as np
-import cv2
 from transformers import ViTImageProcessor, ViTForImageClassification
-from PIL import Image
 import torch
 
+import config
+import tracing
+from backends import load_runtime_vit, load_yolo
+from cascade import CASCADE_MODES, CascadePlan, small_conf
+from colors import ColorEngine
+from detections import CLASSES, COLORS, FROM_PPE, DetectionSet, size_ids
+from geometry import centers_inside, iou_matrix
+from model_registry import ModelRegistry, model_path
+from resolution import CropPlan, ResolutionPlan, box_arrays, region_windows, window_area
+
+# Hard-hat pass policies (PPE_MODE, see config.py)
+PPE_MODES = ("always", "conditional", "crops")
+# Hard-hat model class names as reported in the results
+PPE_CLASS_NAMES = {'Hardhat': 'Helmet', 'NO-Hardhat': 'No Helmet'}
+
+
+def load_vit():
+    path = model_path(config.VIT_MODEL)
+    processor = ViTImageProcessor.from_pretrained(path, local_files_only=config.MODELS_OFFLINE)
+    vit_model = ViTForImageClassification.from_pretrained(path, local_files_only=config.MODELS_OFFLINE)
+    vit_model.eval()
+    return processor, vit_model
+
+
+def vit_pixel_values(processor, image_rois):
+    """
+    ViTImageProcessor preprocessing for a batch of ROIs in one processor call, so resize
+    and normalization are exactly those of processor(images=roi) per box. Returns NCHW
+    pixel_values.
+    """
+    return processor(images=list(image_rois), return_tensors="pt", input_data_format="channels_last").pixel_values
+
+
+def register_models(registry):
+    """Registers the detector's models with a ModelRegistry."""
+    # Models run on INFERENCE_BACKEND: torch, or an exported ONNX Runtime / OpenVINO model (see backends.py)
+    # 1. Base Model for People (and other objects if desired, filtering for Person)
+    registry.register("person", lambda: load_yolo(config.PERSON_MODEL))
+    # 1b. Small model run ahead of it in cascade mode (optional, see cascade.py)
+    registry.register("person_fast", lambda: load_yolo(config.CASCADE_MODEL), required=False)
+    # 2. PPE Model for Helmets (optional, detection works without it)
+    registry.register("ppe", lambda: load_yolo(config.PPE_MODEL), required=False)
+    # 3. Vision Transformer (ViT) for class refinement (optional)
+    registry.register("vit", load_vit if config.INFERENCE_BACKEND == "torch" else load_runtime_vit, required=False)
+
+
 class ObjectDetector:
-    def __init__(self):
-        print("Loading models...")
-        # 1. Base Model for People (and other objects if desired, filtering for Person)
-        self.person_model = YOLO('yolov8x.pt') 
-        
-        # 2. PPE Model for Helmets
-        try:
-            self.helmet_model = YOLO('yolov8m_hardhat.pt')
-        except Exception as e:
-            print(f"Warning: Could not load Helmet model: {e}")
-            self.helmet_model = None
-        
-        print("Loading Vision Transformer (ViT)...")
-        try:
-            self.processor = ViTImageProcessor.from_pretrained('google/vit-base-patch16-224')
-            self.vit_model = ViTForImageClassification.from_pretrained('google/vit-base-patch16-224')
-        except Exception as e:
-            print(f"Warning: Could not load ViT model: {e}")
-            self.processor = None
-            self.vit_model = None
+    def __init__(self, registry=None):
+        # Models come from a shared ModelRegistry; without one, load everything now
+        if registry is None:
+            registry = ModelRegistry(mode="eager")
+            register_models(registry)
+            registry.startup()
+        self.registry = registry
+
+    @property
+    def person_model(self):
+        return self.registry.get("person")
+
+    @property
+    def fast_model(self):
+        return self.registry.get("person_fast")
+
+    @property
+    def person_names(self):
+        """
+        Class names of the person pass. CASCADE_MODEL shares PERSON_MODEL's (COCO)
+        classes, so whichever is loaded answers: when the cascade keeps the small
+        model's boxes, the person model is never loaded just for its names.
+        """
+        for name in ("person", "person_fast"):
+            model = self.registry.peek(name)
+            if model is not None:
+                return model.names
+        return self.person_model.names
+
+    @property
+    def helmet_model(self):
+        return self.registry.get("ppe")
+
+    @property
+    def processor(self):
+        vit = self.registry.get("vit")
+        return vit[0] if vit else None
+
+    @property
+    def vit_model(self):
+        vit = self.registry.get("vit")
+        return vit[1] if vit else None
 
     def detect_color(self, image_roi):
         """
-        Detects the dominant color in the region of interest using K-Means clustering.
+        Detects the dominant color in the region of interest.
+        Single-ROI wrapper around ColorEngine, which handles all boxes of an image at once.
         """
         try:
             if image_roi.size == 0: return "Unknown"
-            
-            # Resize for speed
-            data = cv2.resize(image_roi, (50, 50))
-            data = data.reshape((-1, 3))
-            data = np.float32(data)
-
-            # K-Means
-            criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 10, 1.0)
-            k = 1
-            _, label, center = cv2.kmeans(data, k, None, criteria, 10, cv2.KMEANS_RANDOM_CENTERS)
-            
-            # Dominant color (BGR)
-            color_bgr = center[0].astype(np.int32)
-            
-            # Simple color naming logic (reusing existing logic)
-            b, g, r = color_bgr
-            avg_val = (int(r) + int(g) + int(b)) / 3
-            if avg_val > 190: return "White" 
-            if avg_val < 50: return "Black"
-            
-            if r > 150 and g < 100 and b < 100: return "Red"
-            if r < 100 and g > 150 and b < 100: return "Green"
-            if r < 100 and g < 100 and b > 150: return "Blue"
-            if r > 200 and g > 200 and b < 100: return "Yellow"
-            if r > 150 and g > 100 and b < 50: return "Orange"
-            
-            if abs(r - g) < 20 and abs(r - b) < 20 and abs(g - b) < 20: 
-                if avg_val > 140: return "White"
-                return "Grey"
-            
-            if r > 150 and g < 50 and b > 150: return "Pink"
-            if r < 50 and g > 150 and b > 150: return "Cyan"
-            
-            # Fallback
-            if r >= g and r >= b: return "Reddish"
-            if g >= r and g >= b: return "Greenish"
-            return "Blueish"
-            
+            height, width = image_roi.shape[:2]
+            return ColorEngine(image_roi).names([[0, 0, width, height]])[0]
         except Exception:
             return "Unknown Color"
 
@@ -80,205 +110,304 @@ class ObjectDetector:
         elif ratio < 0.20: return "Medium"
         else: return "Large"
 
-    def refine_class(self, image_roi, original_class):
+    def refine_class(self, image_roi, original_class, color=None):
         """
         Uses ViT to refine generic vehicle classes (Car, Truck, Bus) into specific types
         like Ambulance, Police Car, Fire Engine.
+        Single-box convenience wrapper around refine_classes.
+        """
+        return self.refine_classes([image_roi], [original_class], [color])[0]
+
+    def refine_classes(self, image_rois, original_classes, colors=None):
         """
-        if not self.vit_model or image_roi.size == 0:
-            return original_class
-            
+        Batched version of refine_class: all candidate boxes of an image are classified
+        by ViT in chunks of VIT_BATCH_SIZE, so the cost scales with batches, not boxes.
+        Returns the refined class name for every ROI, in order.
+        """
+        refined = list(original_classes)
+        if colors is None:
+            colors = [None] * len(image_rois)
+        if not self.vit_model:
+            return refined
+
+        candidates = [i for i, roi in enumerate(image_rois) if roi.size > 0]
+        if not candidates:
+            return refined
+
+        tracing.count("vit_rois", len(candidates))
         try:
-            # Preprocess
-            inputs = self.processor(images=image_roi, return_tensors="pt")
-            
-            # Inference
-            with torch.no_grad():
-                outputs = self.vit_model(**inputs)
-            
-            # Get Top Prediction
-            logits = outputs.logits
-            predicted_class_idx = logits.argmax(-1).item()
-            predicted_label = self.vit_model.config.id2label[predicted_class_idx].lower()
-            confidence = torch.softmax(logits, dim=-1)[0][predicted_class_idx].item()
-            
-            # Debug
-            # print(f"ViT Prediction for {original_class}: {predicted_label} ({confidence:.2f})")
-
-            # Refinement Logic
-            # Only override if confidence is high enough and label is relevant
-            if confidence > 0.4: # Adjustable threshold
-                if 'ambulance' in predicted_label:
-                    return "Ambulance"
-                if 'police' in predicted_label:
-                    return "Police Car"
-                if 'fire engine' in predicted_label or 'fire truck' in predicted_label:
-                    return "Fire Engine"
-                if 'taxicab' in predicted_label or 'taxi' in predicted_label:
-                    return "Taxi"
-                if 'school bus' in predicted_label:
-                    return "School Bus"
-                if 'convertible' in predicted_label:
-                    return "Convertible"
-                if 'sports car' in predicted_label:
-                    return "Sports Car"
-                if 'minivan' in predicted_label:
-                    return "Minivan"
-                if 'pickup' in predicted_label:
-                    return "Pickup Truck"
-
-            # Refine 'No Helmet' false positives
-            if original_class == 'No Helmet':
-                 # Strategy 1: Color Heuristic
-                 # Construction helmets are often White, Yellow, Blue, Red, Orange.
-                 # Human heads/hair are usually Black, Brown, Grey, Blonde (Yellowish?).
-                 # If we detect a strong non-hair color, assume it's a helmet.
-                 safety_colors = ['Blue', 'Red', 'Yellow', 'Orange', 'Green', 'Cyan', 'Pink', 'Blueish', 'Reddish', 'Greenish']
-                 if color in safety_colors:
-                     # Strong indicator of a helmet
-                     return "Helmet"
-                 
-                 # Strategy 2: ViT Confirmation (for White/Grey/Black helmets)
-                 if confidence > 0.3:
-                     # Check for helmet/hat related terms in ViT
-                     helmet_terms = ['helmet', 'crash_helmet', 'hard_hat', 'hat', 'cap', 'head_covering']
-                     if any(term in predicted_label for term in helmet_terms):
-                         return "Helmet"
+            for start in range(0, len(candidates), config.VIT_BATCH_SIZE):
+                chunk = candidates[start:start + config.VIT_BATCH_SIZE]
+                tracing.count("vit_calls")
 
+                # Preprocess the whole chunk at once
+                pixel_values = self._preprocess_rois([image_rois[i] for i in chunk])
+
+                # Inference
+                with torch.no_grad():
+                    logits = self.vit_model(pixel_values=pixel_values).logits
+
+                # Get Top Predictions
+                probs = torch.softmax(logits, dim=-1)
+                confidences, predicted_idxs = probs.max(dim=-1)
+
+                for i, idx, confidence in zip(chunk, predicted_idxs.tolist(), confidences.tolist()):
+                    predicted_label = self.vit_model.config.id2label[idx].lower()
+                    refined[i] = self._refine_label(original_classes[i], predicted_label, confidence, colors[i])
         except Exception as e:
             print(f"ViT Refinement Error: {e}")
-            
+
+        return refined
+
+    def _preprocess_rois(self, image_rois):
+        return vit_pixel_values(self.processor, image_rois)
+
+    def _refine_label(self, original_class, predicted_label, confidence, color):
+        # Debug
+        # print(f"ViT Prediction for {original_class}: {predicted_label} ({confidence:.2f})")
+
+        # Refinement Logic
+        # Only override if confidence is high enough and label is relevant
+        if confidence > config.VIT_CONFIDENCE_THRESHOLD:
+            if 'ambulance' in predicted_label:
+                return "Ambulance"
+            if 'police' in predicted_label:
+                return "Police Car"
+            if 'fire engine' in predicted_label or 'fire truck' in predicted_label:
+                return "Fire Engine"
+            if 'taxicab' in predicted_label or 'taxi' in predicted_label:
+                return "Taxi"
+            if 'school bus' in predicted_label:
+                return "School Bus"
+            if 'convertible' in predicted_label:
+                return "Convertible"
+            if 'sports car' in predicted_label:
+                return "Sports Car"
+            if 'minivan' in predicted_label:
+                return "Minivan"
+            if 'pickup' in predicted_label:
+                return "Pickup Truck"
+
+        # Refine 'No Helmet' false positives
+        if original_class == 'No Helmet':
+             # Strategy 1: Color Heuristic
+             # Construction helmets are often White, Yellow, Blue, Red, Orange.
+             # Human heads/hair are usually Black, Brown, Grey, Blonde (Yellowish?).
+             # If we detect a strong non-hair color, assume it's a helmet.
+             safety_colors = ['Blue', 'Red', 'Yellow', 'Orange', 'Green', 'Cyan', 'Pink', 'Blueish', 'Reddish', 'Greenish']
+             if color in safety_colors:
+                 # Strong indicator of a helmet
+                 return "Helmet"
+             
+             # Strategy 2: ViT Confirmation (for White/Grey/Black helmets)
+             if confidence > 0.3:
+                 # Check for helmet/hat related terms in ViT
+                 helmet_terms = ['helmet', 'crash_helmet', 'hard_hat', 'hat', 'cap', 'head_covering']
+                 if any(term in predicted_label for term in helmet_terms):
+                     return "Helmet"
+
         return original_class
 
-    def detect(self, image, conf=0.45):
-        output = []
-        total_area = image.shape[0] * image.shape[1]
+    def predict_persons(self, image, conf=config.CONF_THRESHOLD):
+        """
+        RUN 1: Person Detection (YOLOv8x). We allow all classes.
+        Returns the raw YOLO results so they can be merged later.
+        """
+        return self.person_model(image, conf=conf, iou=config.IOU_THRESHOLD)
+
+    def cascade_mode(self, cascade=None):
+        """The cascade policy for a request; 'off' when the small model is unavailable."""
+        mode = cascade or config.CASCADE_MODE
+        if mode not in CASCADE_MODES:
+            raise ValueError(f"Unknown cascade mode '{mode}'")
+        if mode != "off" and self.fast_model is None:
+            return "off"
+        return mode
+
+    def predict_persons_fast(self, image, conf=config.CONF_THRESHOLD):
+        """
+        Cascade stage 1: the small model, at a lower threshold so that the ambiguous
+        boxes deciding the escalation are visible (see cascade.py).
+        """
+        return self.fast_model(image, conf=small_conf(conf), iou=config.IOU_THRESHOLD)
+
+    def predict_persons_cascade(self, image, conf=config.CONF_THRESHOLD, cascade=None):
+        """
+        RUN 1 through the cascade: the small model first, the person model only on the
+        frames or regions the small model is unsure about. Same return shape as predict_persons.
+        """
+        mode = self.cascade_mode(cascade)
+        if mode == "off":
+            return self.predict_persons(image, conf=conf)
+        plan = CascadePlan(image, self.predict_persons_fast(image, conf=conf), mode, conf)
+        if not plan.inputs:
+            return plan.combine([])
+        return plan.combine(self.predict_persons_batch(plan.inputs, conf=conf))
 
-        # --- RUN 1: Person Detection (YOLOv8x) ---
-        # We allow all classes
-        results_person = self.person_model(image, conf=conf, iou=0.5)
-        
-        # --- RUN 2: Helmet Detection (Specialized) ---
+    def predict_ppe(self, image, conf=config.CONF_THRESHOLD):
+        """
+        RUN 2: Helmet Detection (Specialized). Returns [] if the model is unavailable.
+        """
         if self.helmet_model:
-            results_helmet = self.helmet_model(image, conf=conf, iou=0.5)
+            return self.helmet_model(image, conf=conf, iou=config.IOU_THRESHOLD)
+        return []
+
+    def person_boxes(self, results_person):
+        """[N, 4] boxes of class 'person' in person-pass results (ultralytics Results or BoxArrays)."""
+        names = self.person_names
+        boxes = [np.zeros((0, 4))]
+        for result in results_person or []:
+            arrays = box_arrays(result)
+            keep = np.array([names[c].lower() == 'person' for c in arrays.cls.tolist()], dtype=bool)
+            boxes.append(arrays.xyxy[keep])
+        return np.concatenate(boxes)
+
+    def plan_ppe(self, image, results_person, plan, ppe=None):
+        """
+        Which images the hard-hat pass has to see once the person pass is done
+        (PPE_MODE). Its detections are only kept inside person boxes, so frames without
+        persons skip it (returns None), and in 'crops' mode it only sees crops around
+        the persons. Otherwise returns `plan` unchanged.
+        """
+        mode = ppe or config.PPE_MODE
+        if mode not in PPE_MODES:
+            raise ValueError(f"Unknown PPE mode '{mode}'")
+        if mode == "always" or not self.helmet_model:
+            return plan
+        persons = self.person_boxes(results_person)
+        if not len(persons):
+            tracing.count("ppe_skipped")
+            return None
+        if mode == "conditional":
+            return plan
+
+        height, width = image.shape[:2]
+        windows = region_windows(persons, height, width, config.PPE_CROP_PADDING, min_side=64)
+        # Crops covering most of the frame cost more than one full-frame pass
+        if window_area(windows) > config.PPE_CROP_MAX_AREA * height * width:
+            return plan
+        tracing.count("ppe_crops", len(windows))
+        return CropPlan(image, windows)
+
+    def predict_persons_batch(self, images, conf=config.CONF_THRESHOLD):
+        """
+        Batched RUN 1: one forward pass over several images.
+        Returns one results list per image, in the same shape predict_persons returns.
+        """
+        results = self.person_model(images, conf=conf, iou=config.IOU_THRESHOLD)
+        return [[r] for r in results]
+
+    def predict_persons_fast_batch(self, images, conf=config.CONF_THRESHOLD):
+        """Batched cascade stage 1, see predict_persons_batch."""
+        results = self.fast_model(images, conf=small_conf(conf), iou=config.IOU_THRESHOLD)
+        return [[r] for r in results]
+
+    def predict_ppe_batch(self, images, conf=config.CONF_THRESHOLD):
+        """Batched RUN 2, see predict_persons_batch."""
+        if not self.helmet_model:
+            return [[] for _ in images]
+        results = self.helmet_model(images, conf=conf, iou=config.IOU_THRESHOLD)
+        return [[r] for r in results]
+
+    def detect(self, image, conf=config.CONF_THRESHOLD, resolution=None, cascade=None):
+        # The resolution policy decides which images the YOLO passes see (see resolution.py),
+        # the cascade policy which of them the person model has to see (see cascade.py)
+        plan = ResolutionPlan(image, resolution)
+        cascade = self.cascade_mode(cascade)
+        if len(plan.inputs) == 1:
+            results_person = [self.predict_persons_cascade(plan.inputs[0], conf=conf, cascade=cascade)]
+        elif cascade == "off":
+            results_person = self.predict_persons_batch(plan.inputs, conf=conf)
         else:
+            results_person = [self.predict_persons_cascade(i, conf=conf, cascade=cascade) for i in plan.inputs]
+        results_person = plan.combine(results_person)
+
+        # The hard-hat pass only where its detections can survive person association
+        ppe_plan = self.plan_ppe(image, results_person, plan)
+        if ppe_plan is None:
             results_helmet = []
+        elif len(ppe_plan.inputs) == 1:
+            results_helmet = ppe_plan.combine([self.predict_ppe(ppe_plan.inputs[0], conf=conf)])
+        else:
+            results_helmet = ppe_plan.combine(self.predict_ppe_batch(ppe_plan.inputs, conf=conf))
+        return self.merge_results(image, results_person, results_helmet)
+
+    def merge_results(self, image, results_person, results_helmet):
+        """
+        Turns the raw results of both YOLO passes into a DetectionSet (see detections.py)
+        and applies the Helmet / No Helmet conflict resolution and person association.
+        The two passes are independent, so callers may run them concurrently
+        (see InferenceExecutor) and hand both results in here.
+        """
+        height, width = image.shape[:2]
+        # Shared by both passes, so a summed-area table (integral mode) is built once per image
+        color_engine = ColorEngine(image)
 
         # Helper to process results
         def process_results(results, model_names, is_ppe=False):
-            detections = []
-            if not results: return []
-            
-            for result in results:
-                boxes = result.boxes
-                for box in boxes:
-                    x1, y1, x2, y2 = box.xyxy[0].tolist()
-                    x1, y1, x2, y2 = int(x1), int(y1), int(x2), int(y2)
-                    conf_score = box.conf[0].item()
-                    cls = int(box.cls[0].item())
-                    class_name = model_names[cls]
-                    
-                    if is_ppe:
-                        if class_name == 'Hardhat':
-                            class_name = 'Helmet'
-                        elif class_name == 'NO-Hardhat':
-                            class_name = 'No Helmet'
-
-                    roi = image[max(0, y1):min(image.shape[0], y2), max(0, x1):min(image.shape[1], x2)]
-                    color = self.detect_color(roi)
-                    size_label = self.classify_size((x2-x1)*(y2-y1), total_area)
-                    
-                    refined_name = class_name
-                    # Attempt Refinement for Vehicles
-                    if not is_ppe and class_name.lower() in ['car', 'truck', 'bus', 'train']:
-                        refined_name = self.refine_class(roi, class_name)
-                    
-                    # Attempt Refinement for No Helmet
-                    if is_ppe and class_name == 'No Helmet':
-                        # Pass 'refined_name' which is currently 'No Helmet'
-                        # refine_class expects (roi, original_class)
-                        refined_name = self.refine_class(roi, class_name)
-
-                    detections.append({
-                        'box': [x1, y1, x2, y2],
-                        'confidence': conf_score,
-                        'class': refined_name, # Use refined name as primary class? Or separate? 
-                                               # Let's use refined as primary for display simple.
-                        'original_class': class_name,
-                        'color': color,
-                        'size': size_label
-                    })
-            return detections
+            sets = []
+            for result in results or []:
+                # Pull the whole result out of torch at once instead of box by box
+                # (results may also be BoxArrays from a scaled / tiled resolution plan)
+                arrays = box_arrays(result)
+                boxes = arrays.xyxy.astype(int)
+
+                tracing.count("ppe_boxes" if is_ppe else "yolo_boxes", len(boxes))
+
+                # Colors of all boxes in one go (see colors.py)
+                try:
+                    with tracing.stage("color"):
+                        colors = color_engine.names(boxes)
+                except Exception:
+                    colors = ["Unknown Color"] * len(boxes)
+
+                names = [model_names[cls] for cls in arrays.cls.tolist()]
+                if is_ppe:
+                    names = [PPE_CLASS_NAMES.get(name, name) for name in names]
+                sets.append(DetectionSet(
+                    boxes, arrays.conf, CLASSES.ids(names), None, COLORS.ids(colors),
+                    size_ids(boxes, height * width), FROM_PPE if is_ppe else 0,
+                ))
+            return DetectionSet.concat(sets)
 
         # Process and Merge
-        start_dets = process_results(results_person, self.person_model.names)
-        
+        person_dets = process_results(results_person, self.person_names)
         if self.helmet_model:
             ppe_dets = process_results(results_helmet, self.helmet_model.names, is_ppe=True)
         else:
-            ppe_dets = []
-        
+            ppe_dets = DetectionSet()
+
+        # Batched ViT refinement across both passes: vehicles and 'No Helmet'
+        refine_person = np.flatnonzero(person_dets.is_original('car', 'truck', 'bus', 'train'))
+        refine_ppe = np.flatnonzero(ppe_dets.is_original('No Helmet'))
+        if len(refine_person) or len(refine_ppe):
+            candidates = [(person_dets, i) for i in refine_person] + [(ppe_dets, i) for i in refine_ppe]
+            rois = []
+            for dets, i in candidates:
+                x1, y1, x2, y2 = dets.boxes[i].tolist()
+                rois.append(image[max(0, y1):min(height, y2), max(0, x1):min(width, x2)])
+            with tracing.stage("vit_refine"):
+                refined_names = self.refine_classes(
+                    rois,
+                    CLASSES.lookup([dets.original_ids[i] for dets, i in candidates]),
+                    COLORS.lookup([dets.color_ids[i] for dets, i in candidates]),
+                )
+            person_dets.set_classes(refine_person, refined_names[:len(refine_person)])
+            ppe_dets.set_classes(refine_ppe, refined_names[len(refine_person):])
+
         # --- FILTERING LOGIC ---
-        
-        # 0. Helper to compute IoU
-        def compute_iou(box1, box2):
-            x1 = max(box1[0], box2[0])
-            y1 = max(box1[1], box2[1])
-            x2 = min(box1[2], box2[2])
-            y2 = min(box1[3], box2[3])
-            
-            inter_area = max(0, x2 - x1) * max(0, y2 - y1)
-            box1_area = (box1[2] - box1[0]) * (box1[3] - box1[1])
-            box2_area = (box2[2] - box2[0]) * (box2[3] - box2[1])
-            
-            union_area = box1_area + box2_area - inter_area
-            if union_area == 0: return 0
-            return inter_area / union_area
+        # Pairwise checks use the vectorized helpers from geometry.py
 
         # 1. Conflict Resolution: Remove 'No Helmet' if overlapping with 'Helmet'
-        helmet_boxes = [d for d in ppe_dets if d['class'] == 'Helmet']
-        indices_to_remove = set()
-        
-        for i, d in enumerate(ppe_dets):
-            if d['class'] == 'No Helmet':
-                for helmet in helmet_boxes:
-                    # If it's the exact same object (from my refinement), IoU will be 1.0
-                    # If it's a different box but same area, IoU will be distinct.
-                    # We want to remove 'No Helmet' if there is a 'Helmet' nearby.
-                    if compute_iou(d['box'], helmet['box']) > 0.3:
-                        # Caveat: if the 'Helmet' box IS this box (from refinement),
-                        # we shouldn't have 'No Helmet' class anymore because I updated 'class' in place.
-                        # Wait, in process_results I append to 'detections'.
-                        # If I updated 'refined_name', d['class'] IS 'Helmet'.
-                        # So this logic only applies if there is a SEPARATE 'No Helmet' detection.
-                        # However, if I refined it, d['class'] is ALREADY Helmet.
-                        # So this loop only catches cases where one detection remained 'No Helmet'
-                        # while ANOTHER detection (maybe from the model directly) says 'Helmet'.
-                        indices_to_remove.add(i)
-                        break
-        
-        filtered_ppe_dets = [d for i, d in enumerate(ppe_dets) if i not in indices_to_remove]
-
-        # 2. Person Association
-        valid_ppe_dets = []
-        if len(start_dets) > 0: 
-            for ppe in filtered_ppe_dets:
-                is_valid = False
-                px1, py1, px2, py2 = ppe['box']
-                ppe_center_x = (px1 + px2) / 2
-                ppe_center_y = (py1 + py2) / 2
-                
-                for person in start_dets:
-                    if person['original_class'].lower() == 'person': # Check original class for Person
-                        bx1, by1, bx2, by2 = person['box']
-                        if (bx1 < ppe_center_x < bx2) and (by1 < ppe_center_y < by2):
-                            is_valid = True
-                            break # Found the person
-                            
-                if is_valid:
-                    valid_ppe_dets.append(ppe)
-        
-        output.extend(start_dets)
-        output.extend(valid_ppe_dets)
-        
-        return output
+        # Refined boxes already carry class 'Helmet', so this only catches a 'No Helmet'
+        # detection that overlaps a SEPARATE 'Helmet' detection.
+        helmet = ppe_dets.is_class('Helmet')
+        overlaps_helmet = (iou_matrix(ppe_dets.boxes, ppe_dets.boxes[helmet]) > 0.3).any(axis=1)
+        ppe_dets = ppe_dets.select(~(ppe_dets.is_class('No Helmet') & overlaps_helmet))
+
+        # 2. Person Association: keep PPE whose center lies inside a person box
+        # (check original class for Person)
+        person_boxes = person_dets.boxes[person_dets.is_original('person')]
+        inside_person = centers_inside(person_boxes, ppe_dets.boxes).any(axis=0)
+
+        return DetectionSet.concat([person_dets, ppe_dets.select(inside_person)])
@@ -0,0 +1,155 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import config
+import tracing
+from batcher import MicroBatcher
+from cascade import CascadePlan
+from ocr_planner import plan_regions, scan_text
+from resolution import ResolutionPlan
+
+
+class InferenceExecutor:
+    """
+    Runs the three independent inference passes of /detect (YOLOv8x, hard-hat YOLO
+    and EasyOCR) concurrently on a worker pool and joins the results.
+
+    Everything heavy happens off the event loop, so a long-running request no longer
+    blocks other requests (including /api-health).
+    """
+
+    def __init__(self, detector, ocr_processor, max_workers=None, batching=True, initializer=None, initargs=()):
+        self.detector = detector
+        self.ocr_processor = ocr_processor
+        self.max_workers = max_workers or config.INFERENCE_WORKERS
+        # initializer lets replicas pin their worker threads (see replicas.py)
+        self.pool = ThreadPoolExecutor(
+            max_workers=self.max_workers, thread_name_prefix="inference", initializer=initializer, initargs=initargs
+        )
+
+        # Coalesce YOLO calls from concurrent requests (see batcher.py)
+        self.batchers = {}
+        if batching and config.BATCH_MAX_SIZE > 1:
+            self.batchers["person"] = MicroBatcher(
+                "person", detector.predict_persons_batch, config.BATCH_MAX_SIZE, config.BATCH_MAX_WAIT_MS
+            )
+            self.batchers["person_fast"] = MicroBatcher(
+                "person_fast", detector.predict_persons_fast_batch, config.BATCH_MAX_SIZE, config.BATCH_MAX_WAIT_MS
+            )
+            self.batchers["ppe"] = MicroBatcher(
+                "ppe", detector.predict_ppe_batch, config.BATCH_MAX_SIZE, config.BATCH_MAX_WAIT_MS
+            )
+
+    async def call(self, func, *args):
+        """Runs a blocking function on the inference pool without blocking the event loop."""
+        loop = asyncio.get_running_loop()
+        # Carry the request context (its trace) into the worker thread
+        return await loop.run_in_executor(self.pool, tracing.run_in_context(func, *args))
+
+    async def timed(self, stage, awaitable):
+        """Awaits `awaitable`, timing it as pipeline stage `stage` (see tracing.py)."""
+        with tracing.stage(stage):
+            return await awaitable
+
+    async def predict(self, name, func, image):
+        """Runs a YOLO pass through its batcher if batching is enabled, else directly."""
+        batcher = self.batchers.get(name)
+        if batcher:
+            return await asyncio.wrap_future(batcher.submit(image))
+        return await self.call(func, image)
+
+    async def predict_cascade(self, image, cascade):
+        """
+        The person pass through the cascade (see cascade.py): the small model first, then
+        the person model on the whole frame, on crops or not at all. Both stages are
+        micro-batched like the plain passes.
+        """
+        if cascade == "off":
+            return await self.predict("person", self.detector.predict_persons, image)
+        small = await self.timed(
+            "yolo_fast", self.predict("person_fast", self.detector.predict_persons_fast, image)
+        )
+        plan = CascadePlan(image, small, cascade)
+        results = await asyncio.gather(
+            *(self.predict("person", self.detector.predict_persons, crop) for crop in plan.inputs)
+        )
+        return plan.combine(results)
+
+    async def predict_ppe(self, image, plan, person):
+        """
+        The hard-hat pass. With PPE_MODE 'always' it runs concurrently with the person
+        pass; otherwise it waits for the `person` future and runs only on frames with
+        persons, or on crops around them (see ObjectDetector.plan_ppe).
+        """
+        if config.PPE_MODE != "always":
+            plan = await self.call(self.detector.plan_ppe, image, await person, plan)
+            if plan is None:
+                return []
+        return await self.timed(
+            "yolo_ppe", self.predict_plan(lambda i: self.predict("ppe", self.detector.predict_ppe, i), plan)
+        )
+
+    async def predict_plan(self, predict, plan):
+        """Runs the coroutine `predict(image)` on every input of a ResolutionPlan / CropPlan (tiles share micro-batches)."""
+        results = await asyncio.gather(*(predict(image) for image in plan.inputs))
+        return plan.combine(results)
+
+    async def run(self, image, resolution=None, cascade=None):
+        """
+        Returns (detections, text_detections) for the image.
+        Total latency is roughly max(YOLO, hard-hat YOLO, OCR) instead of their sum
+        (the hard-hat pass follows the person pass unless PPE_MODE is 'always').
+        `resolution` selects the resolution policy of the YOLO passes (see resolution.py),
+        `cascade` the cascade policy of the person pass (see cascade.py).
+        """
+        plan = ResolutionPlan(image, resolution)
+        tracing.count("tiles", plan.tiles)
+        # Resolved up front: waits for the small model and raises on an unknown mode
+        cascade = await self.call(self.detector.cascade_mode, cascade)
+        person = asyncio.ensure_future(
+            self.timed("yolo_person", self.predict_plan(lambda i: self.predict_cascade(i, cascade), plan))
+        )
+        ppe = asyncio.ensure_future(self.predict_ppe(image, plan, person))
+        tasks = [person, ppe]
+        try:
+            # OCR planning (see ocr_planner.py): text-dense frames get the full scan right
+            # away, in parallel with YOLO; otherwise OCR waits for the YOLO boxes and only
+            # reads the regions where text is likely
+            text_map = None
+            full_scan = None
+            if config.OCR_MODE == "gated":
+                text_map = await self.timed("ocr_scan", self.call(scan_text, image))
+            if text_map is None or text_map.full_scan:
+                full_scan = asyncio.ensure_future(
+                    self.timed("ocr_full", self.call(self.ocr_processor.detect_text_full, image))
+                )
+                tasks.append(full_scan)
+
+            results_person, results_helmet = await asyncio.gather(person, ppe)
+
+            # Post-processing (colour, ViT refinement, filtering) needs both YOLO passes
+            detections = await self.timed(
+                "postprocess", self.call(self.detector.merge_results, image, results_person, results_helmet)
+            )
+
+            if full_scan:
+                text_detections = await full_scan
+            else:
+                regions = plan_regions(image.shape, detections, text_map)
+                text_detections = await self.timed(
+                    "ocr_regions", self.call(self.ocr_processor.detect_text_regions, image, regions)
+                )
+        finally:
+            # On an error, a deadline or a disconnect, passes not started yet never queue
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+        tracing.count("detections", len(detections))
+        tracing.count("ocr_boxes", len(text_detections))
+        return detections, text_detections
+
+    def batching_stats(self):
+        return {name: batcher.stats() for name, batcher in self.batchers.items()}
+
+    def shutdown(self):
+        self.pool.shutdown(wait=False)
@@ -0,0 +1,71 @@
+import numpy as np
+
+# Vectorized box geometry shared by detector.py and pipeline.py.
+# Boxes are [x1, y1, x2, y2]; every function takes two box sets A (N boxes) and
+# B (M boxes) and returns an N x M matrix in one shot instead of nested Python loops.
+
+
+def as_boxes(boxes):
+    """Converts a list of [x1, y1, x2, y2] (or an array) into an (N, 4) float array."""
+    arr = np.asarray(boxes, dtype=np.float64)
+    return arr.reshape(-1, 4)
+
+
+def box_areas(boxes):
+    boxes = as_boxes(boxes)
+    return (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+
+
+def intersection_areas(boxes_a, boxes_b):
+    """N x M matrix of intersection areas."""
+    a = as_boxes(boxes_a)
+    b = as_boxes(boxes_b)
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    return np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+
+
+def _safe_divide(numerator, denominator):
+    # Zero-area denominators give 0, like the scalar helpers they replace
+    out = np.zeros_like(numerator)
+    np.divide(numerator, denominator, out=out, where=denominator != 0)
+    return out
+
+
+def iou_matrix(boxes_a, boxes_b):
+    """N x M matrix of intersection over union."""
+    inter = intersection_areas(boxes_a, boxes_b)
+    union = box_areas(boxes_a)[:, None] + box_areas(boxes_b)[None, :] - inter
+    return _safe_divide(inter, union)
+
+
+def intersection_over_a(boxes_a, boxes_b):
+    """N x M matrix of intersection area divided by the area of the box from A."""
+    inter = intersection_areas(boxes_a, boxes_b)
+    areas = np.broadcast_to(box_areas(boxes_a)[:, None], inter.shape)
+    return _safe_divide(inter, areas)
+
+
+def intersection_over_smaller(boxes_a, boxes_b):
+    """N x M matrix of intersection area divided by the smaller of the two box areas."""
+    inter = intersection_areas(boxes_a, boxes_b)
+    smaller = np.minimum(box_areas(boxes_a)[:, None], box_areas(boxes_b)[None, :])
+    return _safe_divide(inter, smaller)
+
+
+def box_centers(boxes):
+    boxes = as_boxes(boxes)
+    return np.stack([(boxes[:, 0] + boxes[:, 2]) / 2, (boxes[:, 1] + boxes[:, 3]) / 2], axis=1)
+
+
+def centers_inside(boxes_a, boxes_b):
+    """
+    N x M boolean matrix: True where the center of B[j] lies strictly inside A[i].
+    """
+    a = as_boxes(boxes_a)
+    centers = box_centers(boxes_b)
+    cx = centers[None, :, 0]
+    cy = centers[None, :, 1]
+    return (a[:, None, 0] < cx) & (cx < a[:, None, 2]) & (a[:, None, 1] < cy) & (cy < a[:, None, 3])
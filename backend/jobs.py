@@ -0,0 +1,427 @@
+import asyncio
+import json
+import os
+import shutil
+import time
+import uuid
+import zipfile
+
+import config
+from uploads import decode_image
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".bmp", ".webp", ".tif", ".tiff"}
+
+# Job lifecycle: queued -> running -> completed | failed | cancelled
+ACTIVE_STATES = ("queued", "running")
+
+
+def is_image_name(name):
+    return os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS
+
+
+def resolve_input_path(path):
+    """
+    Resolves a manifest / directory path against JOBS_INPUT_ROOT and refuses anything
+    outside it. Server-side paths are disabled unless JOBS_INPUT_ROOT is set.
+    """
+    if not config.JOBS_INPUT_ROOT:
+        raise ValueError("Server-side paths are disabled (JOBS_INPUT_ROOT is not set)")
+    root = os.path.realpath(config.JOBS_INPUT_ROOT)
+    resolved = os.path.realpath(os.path.join(root, path))
+    if resolved != root and not resolved.startswith(root + os.sep):
+        raise ValueError(f"Path is outside JOBS_INPUT_ROOT: {path}")
+    return resolved
+
+
+def list_images(directory):
+    """All image files below `directory`, in a stable order."""
+    paths = []
+    for parent, _, names in os.walk(directory):
+        paths.extend(os.path.join(parent, name) for name in names if is_image_name(name))
+    return sorted(paths)
+
+
+def read_manifest(data):
+    """
+    Parses a manifest: a JSON list of paths or one path per line. Paths are relative to
+    (or inside) JOBS_INPUT_ROOT; directories expand to the images they contain.
+    """
+    text = data.decode("utf-8-sig") if isinstance(data, bytes) else data
+    stripped = text.strip()
+    if stripped.startswith("["):
+        entries = json.loads(stripped)
+    else:
+        entries = [line.strip() for line in stripped.splitlines()]
+    paths = []
+    for entry in entries:
+        if not entry or str(entry).startswith("#"):
+            continue
+        resolved = resolve_input_path(str(entry))
+        paths.extend(list_images(resolved) if os.path.isdir(resolved) else [resolved])
+    return paths
+
+
+def extract_zip(fileobj, destination, max_member_bytes=None):
+    """
+    Extracts the images of a zip archive into `destination` and returns their paths.
+    Members escaping the destination (zip slip) and oversized members are skipped.
+    """
+    max_member_bytes = max_member_bytes or config.MAX_UPLOAD_BYTES
+    os.makedirs(destination, exist_ok=True)
+    root = os.path.realpath(destination)
+    paths = []
+    with zipfile.ZipFile(fileobj) as archive:
+        for member in archive.infolist():
+            if member.is_dir() or not is_image_name(member.filename):
+                continue
+            if member.file_size > max_member_bytes:
+                print(f"Warning: Skipping {member.filename}, larger than {max_member_bytes} bytes")
+                continue
+            target = os.path.realpath(os.path.join(root, member.filename))
+            if not target.startswith(root + os.sep):
+                print(f"Warning: Skipping {member.filename}, path escapes the archive")
+                continue
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with archive.open(member) as src, open(target, "wb") as dst:
+                shutil.copyfileobj(src, dst, 1024 * 1024)
+            paths.append(target)
+    return sorted(paths)
+
+
+def _read_file(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def _write_json(path, payload):
+    # Write-then-rename so a crash never leaves a half-written status file
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(payload, f)
+    os.replace(tmp, path)
+
+
+class Job:
+    """
+    One bulk run, persisted in `<JOBS_DIR>/<id>/`:
+      items.json    - the image paths, written once at submission
+      job.json      - state and counters, rewritten as the job progresses
+      results.jsonl - one line per finished image ({"index", "filename", ...response}
+                      or {"index", "filename", "error"}), in completion order
+    """
+
+    def __init__(self, job_id, directory, items, source, base=None):
+        self.id = job_id
+        self.dir = directory
+        self.items = items
+        self.source = source
+        # Filenames in results are reported relative to this directory
+        self.base = base
+        self.state = "queued"
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.processed = 0
+        self.failed = 0
+        self.error = None
+        self.task = None
+
+    @property
+    def results_path(self):
+        return os.path.join(self.dir, "results.jsonl")
+
+    def filename(self, index):
+        path = self.items[index]
+        return os.path.relpath(path, self.base) if self.base else path
+
+    def status(self):
+        total = len(self.items)
+        elapsed = None
+        if self.started_at:
+            elapsed = (self.finished_at or time.time()) - self.started_at
+        return {
+            "id": self.id,
+            "state": self.state,
+            "source": self.source,
+            "total": total,
+            "processed": self.processed,
+            "failed": self.failed,
+            "progress": round(self.processed / total, 4) if total else 1.0,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "images_per_s": round(self.processed / elapsed, 2) if elapsed else None,
+            "error": self.error,
+        }
+
+    def save(self):
+        state = self.status()
+        state["base"] = self.base
+        _write_json(os.path.join(self.dir, "job.json"), state)
+
+    @classmethod
+    def create(cls, root, items, source, base=None):
+        job_id = uuid.uuid4().hex[:12]
+        directory = os.path.join(root, job_id)
+        os.makedirs(directory, exist_ok=True)
+        job = cls(job_id, directory, items, source, base)
+        _write_json(os.path.join(directory, "items.json"), items)
+        job.save()
+        return job
+
+    @classmethod
+    def load(cls, directory):
+        with open(os.path.join(directory, "job.json")) as f:
+            state = json.load(f)
+        with open(os.path.join(directory, "items.json")) as f:
+            items = json.load(f)
+        job = cls(state["id"], directory, items, state.get("source"), state.get("base"))
+        for field in ("state", "created_at", "started_at", "finished_at", "processed", "failed", "error"):
+            setattr(job, field, state.get(field, getattr(job, field)))
+        return job
+
+    def results_snapshot(self):
+        """
+        results.jsonl up to its last complete line. The writer may be appending while this
+        reads, so the size is only known once read and a trailing partial line is left out.
+        """
+        if not os.path.exists(self.results_path):
+            return b""
+        data = _read_file(self.results_path)
+        return data[:data.rfind(b"\n") + 1]
+
+    def completed_indices(self):
+        """
+        Indices already in results.jsonl. A torn last line from a crash is dropped and
+        the file rewritten without it, so the job resumes exactly where it stopped.
+        """
+        done = set()
+        failed = 0
+        if not os.path.exists(self.results_path):
+            return done, failed
+        valid = []
+        with open(self.results_path) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if record.get("index") in done:
+                    continue
+                done.add(record["index"])
+                failed += "error" in record
+                valid.append(line if line.endswith("\n") else line + "\n")
+        with open(self.results_path, "w") as f:
+            f.writelines(valid)
+        return done, failed
+
+
+class JobManager:
+    """
+    Runs bulk jobs through the same pipeline as /detect, as three overlapping stages:
+
+      read + decode (thread pool) -> inference workers -> JSONL writer
+
+    The stages are connected by bounded queues (JOBS_QUEUE_SIZE), so decoding runs
+    ahead of inference by at most that many images and a slow disk or model applies
+    backpressure instead of filling memory. BATCH_CONCURRENCY images are in inference
+    at once, which keeps the YOLO micro-batchers (or replicas) fed. At most
+    JOBS_MAX_RUNNING jobs run at a time; the others wait in 'queued'.
+
+    `analyze(image, scale)` is the /detect pipeline coroutine; `call(func, *args)` runs
+    blocking work off the event loop.
+    """
+
+    def __init__(self, analyze, call, root=None, concurrency=None, queue_size=None, max_running=None):
+        self.analyze = analyze
+        self.call = call
+        self.root = root or config.JOBS_DIR
+        self.concurrency = concurrency or config.BATCH_CONCURRENCY
+        self.queue_size = queue_size or config.JOBS_QUEUE_SIZE
+        self.max_running = max_running or config.JOBS_MAX_RUNNING
+        self.jobs = {}
+        self._slots = None
+        os.makedirs(self.root, exist_ok=True)
+
+    def _running_slots(self):
+        # Created lazily so it binds to the server's event loop
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_running)
+        return self._slots
+
+    # --- Submission ---
+
+    def create(self, items, source, base=None):
+        if not items:
+            raise ValueError("No images found")
+        job = Job.create(self.root, items, source, base)
+        self.jobs[job.id] = job
+        return job
+
+    def create_from_zip(self, fileobj):
+        job_id = uuid.uuid4().hex[:12]
+        input_dir = os.path.join(self.root, "uploads", job_id)
+        try:
+            items = extract_zip(fileobj, input_dir)
+            return self.create(items, "zip", base=input_dir)
+        except Exception:
+            shutil.rmtree(input_dir, ignore_errors=True)
+            raise
+
+    def create_from_manifest(self, data):
+        return self.create(read_manifest(data), "manifest", base=config.JOBS_INPUT_ROOT)
+
+    def create_from_directory(self, directory):
+        return self.create(list_images(resolve_input_path(directory)), "directory", base=config.JOBS_INPUT_ROOT)
+
+    def start(self, job):
+        job.state = "queued"
+        job.error = None
+        job.task = asyncio.ensure_future(self._run(job))
+        return job
+
+    def resume_all(self):
+        """Restarts jobs that were queued or running when the server stopped."""
+        for name in sorted(os.listdir(self.root)):
+            directory = os.path.join(self.root, name)
+            if not os.path.isfile(os.path.join(directory, "job.json")):
+                continue
+            try:
+                job = Job.load(directory)
+            except (OSError, ValueError) as e:
+                print(f"Warning: Could not load job {name}: {e}")
+                continue
+            self.jobs[job.id] = job
+            if job.state in ACTIVE_STATES:
+                print(f"Resuming job {job.id} ({job.processed}/{len(job.items)} done)")
+                self.start(job)
+
+    # --- Queries / control ---
+
+    def get(self, job_id):
+        return self.jobs.get(job_id)
+
+    def statuses(self):
+        return [job.status() for job in sorted(self.jobs.values(), key=lambda j: j.created_at)]
+
+    def cancel(self, job_id):
+        job = self.jobs.get(job_id)
+        if job and job.task and not job.task.done():
+            job.task.cancel()
+        return job
+
+    def resume(self, job_id):
+        job = self.jobs.get(job_id)
+        if job and job.state in ("cancelled", "failed"):
+            self.start(job)
+        return job
+
+    async def delete(self, job_id):
+        """Cancels a job and removes its state, results and extracted archive."""
+        job = self.jobs.pop(job_id, None)
+        if job is None:
+            return None
+        if job.task and not job.task.done():
+            job.task.cancel()
+            # Let the job record its final state before the directory goes away
+            await asyncio.wait([job.task])
+        await self.call(shutil.rmtree, job.dir, True)
+        if job.source == "zip" and job.base:
+            await self.call(shutil.rmtree, job.base, True)
+        return job
+
+    # --- Execution ---
+
+    async def _run(self, job):
+        # Cancellation while waiting for a slot counts too: the job is saved as cancelled
+        # (and can be resumed) instead of staying queued
+        try:
+            async with self._running_slots():
+                job.state = "running"
+                job.started_at = job.started_at or time.time()
+                job.finished_at = None
+                await self._process(job)
+                job.state = "completed"
+        except asyncio.CancelledError:
+            job.state = "cancelled"
+        except Exception as e:
+            job.state = "failed"
+            job.error = str(e)
+            print(f"Error: Job {job.id} failed: {e}")
+        finally:
+            job.finished_at = time.time()
+            await self.call(job.save)
+
+    async def _process(self, job):
+        done, failed = await self.call(job.completed_indices)
+        job.processed = len(done)
+        job.failed = failed
+        pending = [i for i in range(len(job.items)) if i not in done]
+        await self.call(job.save)
+
+        decoded = asyncio.Queue(maxsize=self.queue_size)
+        finished = asyncio.Queue(maxsize=self.queue_size)
+
+        async def reader():
+            for index in pending:
+                try:
+                    data = await self.call(_read_file, job.items[index])
+                    image, scale = await self.call(decode_image, data)
+                    error = None if image is not None else "Invalid image file"
+                except OSError as e:
+                    image, scale, error = None, None, str(e)
+                await decoded.put((index, image, scale, error))
+            for _ in range(self.concurrency):
+                await decoded.put(None)
+
+        async def worker():
+            while True:
+                item = await decoded.get()
+                if item is None:
+                    return
+                index, image, scale, error = item
+                record = {"index": index, "filename": job.filename(index)}
+                if error is None:
+                    try:
+                        record.update(await self.analyze(image, scale))
+                    except Exception as e:
+                        error = str(e)
+                if error is not None:
+                    record["error"] = error
+                await finished.put(record)
+
+        async def writer():
+            last_save = time.monotonic()
+            with open(job.results_path, "a") as results:
+                while True:
+                    record = await finished.get()
+                    if record is None:
+                        return
+                    await self.call(_append_line, results, json.dumps(record))
+                    job.processed += 1
+                    job.failed += "error" in record
+                    # Persist progress about once a second, not once per image
+                    if time.monotonic() - last_save >= 1.0:
+                        await self.call(job.save)
+                        last_save = time.monotonic()
+
+        writer_task = asyncio.ensure_future(writer())
+        stages = [asyncio.ensure_future(reader())] + [asyncio.ensure_future(worker()) for _ in range(self.concurrency)]
+        try:
+            # The writer is watched with the other stages: if it fails, nothing drains
+            # `finished` and the workers would block on it forever
+            running = set(stages) | {writer_task}
+            while not all(task.done() for task in stages):
+                done, running = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    task.result()
+            await finished.put(None)
+            await writer_task
+        finally:
+            for task in stages + [writer_task]:
+                task.cancel()
+
+
+def _append_line(handle, line):
+    handle.write(line + "\n")
+    handle.flush()
@@ -1,14 +1,35 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException
+from fastapi import FastAPI, UploadFile, File, Form, Header, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 import uvicorn
-import shutil
+import asyncio
 import os
-import cv2
+import time
+import weakref
+from functools import partial
+from typing import List
 import numpy as np
-from detector import ObjectDetector
-from ocr import OCRProcessor
+import config
+import tracing
+from detector import ObjectDetector, register_models as register_detector_models
+from ocr import OCRProcessor, register_models as register_ocr_models
+from model_registry import ModelRegistry
 from receipt_parser import ReceiptParser
+from executor import InferenceExecutor
+from replicas import create_replica_pool
+from admission import AdmissionController, PRIORITIES
+from cache import ResultCache
+from camera_gate import CameraGate, REUSE
+from pipeline import build_response
+from resolution import RESOLUTION_MODES
+from cascade import CASCADE_MODES
+from jobs import JobManager
+from memstats import process_memory
+from responses import OUTPUT_FORMATS, compact_response, negotiate, render, supported
+from tracing import TracingMiddleware
+from uploads import UPLOAD_REQUEST_BODY, UploadLimitMiddleware, decode_image, read_upload, rescale_results
+from video import STREAM_URL_SCHEMES, open_capture, remove_file, save_upload, stream_detections
 
 app = FastAPI()
 
@@ -21,12 +42,42 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Reject oversized uploads while they stream in (MAX_UPLOAD_BYTES)
+app.add_middleware(UploadLimitMiddleware, path_limits={
+    "/detect/video": config.MAX_VIDEO_UPLOAD_BYTES,
+    "/detect/batch": config.MAX_BATCH_UPLOAD_BYTES,
+    "/jobs": config.MAX_JOB_UPLOAD_BYTES,
+})
+# Per-stage timings of /detect requests (see tracing.py), exported on /metrics
+app.add_middleware(TracingMiddleware, paths=["/detect", "/detect/batch"])
 
 # Initialize engines
-# Initialize engines
-detector = ObjectDetector()
-ocr_processor = OCRProcessor()
+# Models are loaded by the registry according to MODEL_LOAD_MODE: by default
+# concurrently in the background, so uvicorn can bind (and /api-health answer) right away
+model_registry = ModelRegistry()
+if config.MODEL_BACKEND == "stub":
+    # Weight-free stand-ins for offline benchmarks (see stub_models.py)
+    from stub_models import StubOCRProcessor as OCRProcessor, register_models as register_stub_models
+    register_stub_models(model_registry)
+else:
+    register_detector_models(model_registry)
+    register_ocr_models(model_registry)
+# Process replicas load their own models; the app process then only loads on demand
+if not (config.REPLICAS > 1 and config.REPLICA_MODE == "process"):
+    model_registry.startup()
+
+detector = ObjectDetector(model_registry)
+ocr_processor = OCRProcessor(model_registry)
 receipt_parser = ReceiptParser()
+inference_executor = InferenceExecutor(detector, ocr_processor)
+result_cache = ResultCache()
+camera_gate = CameraGate()
+# Bounded concurrency, deadlines and load shedding for /detect (see admission.py)
+admission = AdmissionController()
+
+# With REPLICAS > 1, inference is dispatched to a pool of pinned model replicas
+replica_pool = create_replica_pool(model_registry) if config.REPLICAS > 1 else None
+inference = replica_pool or inference_executor
 # detector = None
 # ocr_processor = None
 
@@ -34,215 +85,397 @@ receipt_parser = ReceiptParser()
 def read_root():
     return {"message": "Object Detection & OCR API is running"}
 
+@app.get("/ready")
+def readiness():
+    """
+    Readiness probe, distinct from the /api-health liveness check: 200 once every
+    required model is loaded, 503 before that. Reports per-model state and load time.
+    """
+    status = replica_pool.status() if replica_pool else model_registry.status()
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
 
+def _service_metrics():
+    # Cache, batcher and replica gauges for /metrics, next to the stage histograms
+    cache = result_cache.stats()
+    for name in ("hits", "disk_hits", "misses", "evictions"):
+        yield f"cache_{name}_total", {}, cache[name], "counter"
+    yield "cache_entries", {}, cache["entries"], "gauge"
+    stats = admission.stats()
+    yield "admission_active", {}, stats["active"], "gauge"
+    yield "admission_queue_depth", {}, stats["queue_depth"], "gauge"
+    for name in ("admitted", "queued", "shed", "queue_timeouts", "deadline_exceeded", "disconnects"):
+        yield f"admission_{name}_total", {}, stats[name], "counter"
+    for reason in ("full", "deadline"):
+        yield "admission_rejected_total", {"reason": reason}, stats[f"rejected_{reason}"], "counter"
+    cameras = camera_gate.stats()
+    yield "camera_states", {}, cameras["cameras"], "gauge"
+    yield "camera_evictions_total", {}, cameras["evictions"], "counter"
+    for batcher, stats in inference_executor.batching_stats().items():
+        yield "batcher_queue_depth", {"batcher": batcher}, stats["queue_depth"], "gauge"
+        yield "batcher_batches_total", {"batcher": batcher}, stats["batches"], "counter"
+        yield "batcher_images_total", {"batcher": batcher}, stats["images"], "counter"
+    status = replica_pool.status() if replica_pool else model_registry.status()
+    yield "models_ready", {}, int(bool(status["ready"])), "gauge"
+    # Unique vs shared memory of this process (workers forked by prefork.py share the weights)
+    memory = process_memory()
+    for kind, value in (memory or {}).items():
+        yield "process_memory_bytes", {"kind": kind}, value, "gauge"
 
-@app.post("/detect")
-async def detect_objects(file: UploadFile = File(...)):
-    try:
-        # Save uploaded file temporarily
-        temp_file = f"temp_{file.filename}"
-        with open(temp_file, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+tracing.metrics.add_collector(_service_metrics)
+
+@app.get("/metrics")
+def prometheus_metrics():
+    """Prometheus text format: per-stage latency histograms, per-request counts, cache and batcher stats."""
+    return PlainTextResponse(tracing.metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/metrics/batching")
+def batching_metrics():
+    """Queue depth, batch size and wait time of the YOLO micro-batchers."""
+    return inference_executor.batching_stats()
+
+@app.get("/metrics/cache")
+def cache_metrics():
+    """Hit / miss counters of the /detect result cache."""
+    return result_cache.stats()
+
+@app.get("/metrics/admission")
+def admission_metrics():
+    """Running / queued requests, service time estimate and rejection counters of /detect."""
+    return admission.stats()
+
+@app.get("/metrics/memory")
+def memory_metrics():
+    """Resident, unique (uss) and shared memory of the worker serving this request, in bytes."""
+    return {"worker": worker_index, "pid": os.getpid(), **(process_memory() or {})}
+
+
+
+async def analyze_image(image, scale, resolution=None, cascade=None):
+    """
+    The /detect pipeline for a decoded image: result cache, concurrent YOLO / OCR
+    passes, post-processing. Shared by /detect, /detect/batch and bulk jobs.
+    `resolution` picks the resolution policy (see resolution.py), `cascade` the
+    cascade policy of the person pass (see cascade.py).
+    """
+    resolution = resolution or config.RESOLUTION_MODE
+    cascade = cascade or config.CASCADE_MODE
+    # Serve resubmitted images from the result cache (keyed on pixels + model config)
+    cache_key = None
+    if result_cache.enabled:
+        with tracing.stage("cache_lookup"):
+            cache_key = await inference_executor.call(result_cache.key_for, image, (scale, resolution, cascade))
+            cached = await inference_executor.call(result_cache.get, cache_key)
+        if cached is not None:
+            tracing.count("cache_hits")
+            return cached
+
+    # Object Detection (YOLO + hard-hat YOLO) and Text Detection (EasyOCR Full Scan)
+    # run concurrently on the inference pool (or an idle replica), keeping the event loop free
+    detections, text_detections = await inference.run(image, resolution, cascade)
+
+    # Bill detection, text association and scene summary (see pipeline.py)
+    response = build_response(detections, text_detections, receipt_parser)
+
+    # Map boxes back to the original resolution if the image was decoded reduced
+    response["results"] = rescale_results(response["results"], scale)
+
+    if cache_key:
+        await inference_executor.call(result_cache.put, cache_key, response)
+
+    return response
+
+async def analyze_camera_frame(image, scale, camera_id, resolution=None, cascade=None):
+    """
+    analyze_image for a frame of a fixed camera: compared with the camera's previous
+    frame (see camera_gate.py), it reuses the last response, re-analyses only the
+    changed areas or runs the whole pipeline. The response's 'camera' block reports
+    the path taken. Camera frames bypass the result cache.
+    """
+    resolution = resolution or config.RESOLUTION_MODE
+    cascade = cascade or config.CASCADE_MODE
+    with tracing.stage("change_gate"):
+        plan = await inference_executor.call(camera_gate.plan, camera_id, image, (scale, resolution, cascade))
+
+    if plan.path == REUSE:
+        response = plan.state.response
+    else:
+        per_input = await asyncio.gather(*(inference.run(crop, resolution, cascade) for crop in plan.inputs))
+        combined = plan.combine(per_input)
+        if combined is None:
+            # An object reaches past the re-analysed crops: analyse the whole frame after all
+            plan.escalate(image)
+            combined = plan.combine([await inference.run(image, resolution, cascade)])
+        detections, text_detections = combined
+        # rescale_results rewrites the boxes of the standalone text dicts; keep copies
+        stored_text = [dict(d) for d in text_detections]
+        response = build_response(detections, text_detections, receipt_parser)
+        response["results"] = rescale_results(response["results"], scale)
+        await inference_executor.call(camera_gate.update, camera_id, plan, detections, stored_text, response)
+
+    camera = {"id": camera_id, "path": plan.path, "change": round(plan.change, 4), "regions": len(plan.windows)}
+    if plan.reason:
+        camera["reason"] = plan.reason
+    return {**response, "camera": camera}
+
+# Bulk jobs run through the same pipeline; unfinished jobs resume on startup
+job_manager = JobManager(analyze_image, inference_executor.call)
+
+# Set by prefork.py in the worker processes it forks; only the first one resumes jobs
+worker_index = 0
+
+@app.on_event("startup")
+async def resume_jobs():
+    if worker_index == 0:
+        job_manager.resume_all()
+
+def _check_resolution(resolution):
+    if resolution is not None and resolution not in RESOLUTION_MODES:
+        raise HTTPException(status_code=400, detail=f"resolution must be one of {', '.join(RESOLUTION_MODES)}")
+
+def _check_cascade(cascade):
+    if cascade is not None and cascade not in CASCADE_MODES:
+        raise HTTPException(status_code=400, detail=f"cascade must be one of {', '.join(CASCADE_MODES)}")
+
+def _check_camera_id(camera_id):
+    if camera_id is not None and not 0 < len(camera_id) <= 128:
+        raise HTTPException(status_code=400, detail="camera_id must be 1 to 128 characters")
 
-        # Read image
-        image = cv2.imread(temp_file)
+def _check_admission(request, timeout, priority):
+    """Deadline and priority class of a request, from the query or the X-Request-Timeout / X-Priority headers."""
+    if timeout is None and request.headers.get("x-request-timeout"):
+        try:
+            timeout = float(request.headers["x-request-timeout"])
+        except ValueError:
+            raise HTTPException(status_code=400, detail="X-Request-Timeout must be a number of seconds")
+    if timeout is not None and not timeout > 0:
+        raise HTTPException(status_code=400, detail="timeout must be a positive number of seconds")
+    priority = priority or request.headers.get("x-priority") or "normal"
+    if priority not in PRIORITIES:
+        raise HTTPException(status_code=400, detail=f"priority must be one of {', '.join(PRIORITIES)}")
+    return admission.deadline(timeout), priority
+
+def _check_output(output, accept):
+    output = negotiate(output, accept)
+    if output not in OUTPUT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"output must be one of {', '.join(OUTPUT_FORMATS)}")
+    if not supported(output):
+        raise HTTPException(status_code=406, detail="MessagePack output is not available on this server")
+    return output
+
+@app.post("/detect", openapi_extra={"requestBody": UPLOAD_REQUEST_BODY})
+async def detect_objects(
+    request: Request, debug: bool = False, resolution: str = None,
+    cascade: str = None, output: str = None, accept: str = Header(None), camera_id: str = None,
+    timeout: float = None, priority: str = None,
+):
+    """
+    ?resolution=full|fast|tiled trades latency against recall of small objects:
+    'fast' runs YOLO on one downscaled copy, 'tiled' adds overlapping full-resolution tiles.
+    ?cascade=off|frame|region runs a small model first and the large person model only
+    where it is unsure; ?debug=true reports the path taken (counts 'cascade_*').
+    ?output=json|compact|msgpack selects the response encoding (see responses.py).
+    ?camera_id=... (fixed cameras posting snapshots) compares the frame with the camera's
+    previous one and skips or narrows down the analysis when little changed; the
+    response's 'camera' block reports the path taken (see camera_gate.py).
+    ?timeout=seconds (or 'X-Request-Timeout') sets the request deadline and
+    ?priority=high|normal|low (or 'X-Priority') its admission class; busy servers answer
+    429 / 503 with Retry-After, a missed deadline 504 (see admission.py).
+    """
+    _check_resolution(resolution)
+    _check_cascade(cascade)
+    _check_camera_id(camera_id)
+    output = _check_output(output, accept)
+    deadline, priority = _check_admission(request, timeout, priority)
+    # Read before admission starts watching the request for a disconnect
+    with tracing.stage("upload_read"):
+        file = await read_upload(request)
+        data = await file.read()
+
+    async def work():
+        # Decode the image straight from the upload bytes; nothing touches the disk
+        with tracing.stage("decode"):
+            image, scale = decode_image(data)
         if image is None:
-            os.remove(temp_file)
             raise HTTPException(status_code=400, detail="Invalid image file")
 
-        # Object Detection (YOLO)
-        detections = detector.detect(image)
-        
-        # Text Detection (EasyOCR Full Scan)
-        text_detections = ocr_processor.detect_text_full(image)
-
-        # --- BILL / RECEIPT DETECTION LOGIC ---
-        bill_data = None
-        # Heuristic: If there are many text detections (e.g. > 10) and few/no natural objects
-        # or if specific keywords like "Total", "Subtotal" are found.
-        
-        # For a robust check, let's look for "Total" or high text count
-        has_total = any("total" in d['ocr_text'].lower() for d in text_detections)
-        if len(text_detections) > 10 or has_total:
-            parsed_bill = receipt_parser.parse(text_detections)
-            if parsed_bill and (parsed_bill['total'] or len(parsed_bill['items']) > 0):
-                bill_data = parsed_bill
-
-        # Merge results
-        # We want to associate text with objects if they overlap significantly, 
-        # otherwise treat text as a separate object.
-        
-        final_results = []
-        
-        # helper to check intersection
-        def get_iou(boxA, boxB):
-            xA = max(boxA[0], boxB[0])
-            yA = max(boxA[1], boxB[1])
-            xB = min(boxA[2], boxB[2])
-            yB = min(boxA[3], boxB[3])
-            interArea = max(0, xB - xA) * max(0, yB - yA)
-            boxAArea = (boxA[2] - boxA[0]) * (boxA[3] - boxA[1])
-            if boxAArea == 0: return 0
-            return interArea / boxAArea # intersection over object area
-
-        # 1. Add YOLO detections
-        for det in detections:
-            # Check if any text box overlaps this object
-            associated_text = []
-            for text_det in text_detections:
-                if get_iou(det['box'], text_det['box']) > 0.3: # 30% overlap
-                    associated_text.append(text_det['ocr_text'])
-            
-            ocr_text_combined = " ".join(associated_text)
-            det['ocr_text'] = ocr_text_combined
-            
-            # STRICTLY use the detected class name.
-            main_obj = det['class'] # This might be "Ambulance" now thanks to ViT
-            
-            # --- VEHICLE NUMBER PLATE LOGIC ---
-            # If it's a vehicle, let's try to find a number plate specifically
-            # Even if we didn't find one in the full scan, we might find one by cropping?
-            # For now, let's check if we ALREADY found text that looks like a plate patterns,
-            # OR we can execute a specific crop OCR here if we want to be very thorough.
-            # To be efficient, let's rely on the full text scan first, but if we need more accuracy,
-            # we should crop.
-            # User requirement: "give at the side detected number plate is xyz626"
-            
-            number_plate_text = ""
-            if main_obj.lower() in ['car', 'truck', 'bus', 'motorcycle', 'vehicle', 'ambulance', 'police car', 'taxi', 'van']:
-                # Strategy: Look at associated text. If it matches a plate pattern, use it.
-                # Regex for general plates: alphanumeric, 5-10 chars?
-                # or just take the most prominent text associated with the bumper area?
-                # Simple approach: If associated text is short and alphanumeric, assume it's a plate.
-                
-                # Let's try to refine by cropping the bottom half of the vehicle?
-                # Actually, main OCR scan is usually good enough if resolution is high.
-                # Let's look for text that was associated.
-                if associated_text:
-                    # Filter for plate-like text
-                    for t in associated_text:
-                        if len(t) > 4 and sum(c.isdigit() for c in t) > 0 and sum(c.isalpha() for c in t) > 0:
-                             number_plate_text = t
-                             break
-                    if not number_plate_text and len(associated_text) > 0:
-                        # Fallback: just use the text
-                        number_plate_text = associated_text[0]
-                
-                if number_plate_text:
-                    det['number_plate'] = number_plate_text
-
-            
-            # --- HELMET ASSOCIATION LOGIC ---
-            helmet_status = ""
-            if main_obj.lower() == 'person':
-                # Check for overlapping 'Hardhat' or 'NO-Hardhat'
-                for other_det in detections:
-                    if other_det == det: continue
-                    other_obj = other_det['class']
-                    # Check intersection
-                    oh_x1, oh_y1, oh_x2, oh_y2 = other_det['box']
-                    oh_center_x = (oh_x1 + oh_x2) / 2
-                    oh_center_y = (oh_y1 + oh_y2) / 2
-                    
-                    p_x1, p_y1, p_x2, p_y2 = det['box']
-                    
-                    if (p_x1 < oh_center_x < p_x2) and (p_y1 < oh_center_y < p_y2):
-                         if other_obj == 'Helmet':
-                             helmet_status = "wearing a helmet"
-                         elif other_obj == 'No Helmet':
-                             helmet_status = "not wearing a helmet"
-            
-            if main_obj.lower() == 'helmet':
-                base_desc = f"detected a {main_obj}"
-            else:
-                base_desc = f"detected a {det['color'].lower()} {main_obj}"
-            
-            if helmet_status:
-                base_desc += f" {helmet_status}"
-            
-            if det.get('number_plate'):
-                base_desc += f", Number Plate: {det['number_plate']}"
-
-            if not det.get('number_plate') and ocr_text_combined:
-                det['description'] = f"{base_desc} containing text '{ocr_text_combined}'"
-            else:
-                det['description'] = base_desc
-            
-            final_results.append(det)
-
-        # 2. Add Standalone Text
-        # We might want to HIDE text if it was used for a receipt/bill to avoid clutter?
-        # If bill_data is found, maybe suppress individual text nodes in the UI, or keep them?
-        # Let's keep them for now, but maybe the UI can filter them.
-        
-        for text_det in text_detections:
-            is_inside_object = False
-            
-            for det in detections:
-                if get_iou(det['box'], text_det['box']) > 0.5:
-                    is_inside_object = True
-                    break
-            
-            if not is_inside_object:
-                final_results.append(text_det)
-        
-        results = final_results
-
-        # Cleanup
-        os.remove(temp_file)
-        
-        # IMPROVEMENT: Generate Overall Scene Summary
-        summary_items = []
-        detected_text = []
-
-        for det in results:
-            if det['class'] == 'Text':
-                if det.get('ocr_text'):
-                    detected_text.append(det['ocr_text'])
-                continue
-            
-            is_auxiliary = det['class'] in ['Helmet', 'No Helmet']
-            
-            item_desc = det['class']
-            
-            if det['class'].lower() == 'person':
-                if "wearing a helmet" in det.get('description', ''):
-                    item_desc = "Person (with Helmet)"
-                elif "not wearing a helmet" in det.get('description', ''):
-                    item_desc = "Person (No Helmet)"
-            
-            if det.get('color') and det['color'] != "Unknown Color":
-                item_desc = f"{det['color']} {item_desc}"
-            
-            if not is_auxiliary:
-                summary_items.append(item_desc) 
-
-        # Count items
-        from collections import Counter
-        item_counts = Counter(summary_items)
-        
-        summary_parts = []
-        for item, count in item_counts.items():
-            summary_parts.append(f"{count} {item}{'s' if count > 1 else ''}")
-        
-        if summary_parts:
-            summary_text = "This image contains " + ", ".join(summary_parts) + "."
-        else:
-            summary_text = "No objects were clearly detected."
+        if camera_id and camera_gate.enabled:
+            return await analyze_camera_frame(image, scale, camera_id, resolution, cascade)
+        return await analyze_image(image, scale, resolution, cascade)
 
-        if bill_data:
-            summary_text += f" It appears to be a Shop Bill from '{bill_data['shop_name']}' with {len(bill_data['items'])} items totaling {bill_data['total'] or 'Unknown'}."
-        elif detected_text: # Only show random text if not a bill, to avoid spam
-            unique_text = list(set(detected_text))[:3]
-            summary_text += f" It also features text: '{', '.join(unique_text)}'."
+    try:
+        response = await admission.run(work, request, priority, deadline)
+        body = {**response, "filename": file.filename}
+        # ?debug=true adds this request's stage timings and counts to the body
+        trace = tracing.current()
+        if debug and trace is not None:
+            body["trace"] = trace.to_dict()
+        if output != "json":
+            body = compact_response(body)
+        return render(body, output)
 
-        return {"results": results, "summary": summary_text, "bill_data": bill_data, "filename": file.filename}
 
+    except HTTPException:
+        raise
     except Exception as e:
-        if os.path.exists(f"temp_{file.filename}"):
-             os.remove(f"temp_{file.filename}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/detect/batch")
+async def detect_batch(
+    files: List[UploadFile] = File(...), resolution: str = None, cascade: str = None,
+    output: str = None, accept: str = Header(None),
+):
+    """
+    Runs several images through the /detect pipeline in one request. Up to
+    BATCH_CONCURRENCY images are in flight at once, so decoding of one image overlaps
+    inference of the others and the YOLO passes get micro-batched. Results come back
+    in upload order; a bad image yields an 'error' entry instead of failing the batch.
+    """
+    _check_resolution(resolution)
+    _check_cascade(cascade)
+    output = _check_output(output, accept)
+    if len(files) > config.BATCH_MAX_FILES:
+        raise HTTPException(status_code=400, detail=f"At most {config.BATCH_MAX_FILES} files per batch")
+
+    started = time.perf_counter()
+    slots = asyncio.Semaphore(config.BATCH_CONCURRENCY)
+
+    async def process(upload):
+        async with slots:
+            try:
+                data = await upload.read()
+                image, scale = await inference_executor.call(decode_image, data)
+                if image is None:
+                    return {"filename": upload.filename, "error": "Invalid image file"}
+                response = await analyze_image(image, scale, resolution, cascade)
+                return {**response, "filename": upload.filename}
+            except Exception as e:
+                return {"filename": upload.filename, "error": str(e)}
+
+    results = await asyncio.gather(*(process(upload) for upload in files))
+    elapsed = time.perf_counter() - started
+    body = {
+        "results": results if output == "json" else [compact_response(r) for r in results],
+        "count": len(results),
+        "failed": sum("error" in r for r in results),
+        "elapsed_s": round(elapsed, 3),
+    }
+    return render(body, output)
+
+@app.post("/jobs", status_code=202)
+async def submit_job(
+    file: UploadFile = File(None),
+    manifest: UploadFile = File(None),
+    directory: str = Form(None),
+):
+    """
+    Submits an asynchronous bulk job. The images come from a zip archive ('file'),
+    a manifest of server-side paths ('manifest': JSON list or one path per line) or a
+    server-side 'directory'; server-side paths must lie inside JOBS_INPUT_ROOT.
+    Poll GET /jobs/{id} and fetch GET /jobs/{id}/results (JSONL).
+    """
+    try:
+        if file is not None:
+            job = await inference_executor.call(job_manager.create_from_zip, file.file)
+        elif manifest is not None:
+            job = await inference_executor.call(job_manager.create_from_manifest, await manifest.read())
+        elif directory:
+            job = await inference_executor.call(job_manager.create_from_directory, directory)
+        else:
+            raise HTTPException(status_code=400, detail="Provide a zip 'file', a 'manifest' or a 'directory'")
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    job_manager.start(job)
+    return job.status()
+
+@app.get("/jobs")
+def list_jobs():
+    return job_manager.statuses()
+
+def _get_job(job_id):
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.get("/jobs/{job_id}")
+def job_status(job_id: str):
+    return _get_job(job_id).status()
+
+@app.get("/jobs/{job_id}/results")
+def job_results(job_id: str):
+    """Results so far, one JSON object per line (in completion order, see 'index')."""
+    job = _get_job(job_id)
+    # A snapshot rather than FileResponse: a running job keeps appending to the file
+    return Response(job.results_snapshot(), media_type="application/x-ndjson",
+                    headers={"Content-Disposition": f'attachment; filename="{job.id}.jsonl"'})
+
+@app.post("/jobs/{job_id}/cancel")
+async def cancel_job(job_id: str):
+    job_manager.cancel(_get_job(job_id).id)
+    return job_manager.get(job_id).status()
+
+@app.post("/jobs/{job_id}/resume")
+async def resume_job(job_id: str):
+    """Restarts a cancelled or failed job; images already in results.jsonl are skipped."""
+    return job_manager.resume(_get_job(job_id).id).status()
+
+@app.delete("/jobs/{job_id}")
+async def delete_job(job_id: str):
+    await job_manager.delete(_get_job(job_id).id)
+    return {"deleted": job_id}
+
+@app.post("/detect/video")
+async def detect_video(
+    file: UploadFile = File(None),
+    source: str = Form(None),
+    stride: int = None,
+    format: str = "ndjson",
+    max_frames: int = None,
+):
+    """
+    Streams per-frame detections for a video clip (multipart 'file') or, if enabled,
+    an rtsp:// / http(s):// stream URL ('source'). The detector runs on every
+    `stride`-th frame and a tracker propagates boxes in between. Results are streamed
+    as NDJSON (format=ndjson) or server-sent events (format=sse); the last message
+    reports the achieved FPS.
+    """
+    if format not in ("ndjson", "sse"):
+        raise HTTPException(status_code=400, detail="format must be 'ndjson' or 'sse'")
+
+    cleanup = None
+    if file is not None:
+        suffix = os.path.splitext(file.filename or "")[1] or ".mp4"
+        video_source = await inference_executor.call(save_upload, file.file, suffix)
+        cleanup = partial(remove_file, video_source)
+    elif source:
+        if not config.VIDEO_ALLOW_STREAM_URLS or not source.lower().startswith(STREAM_URL_SCHEMES):
+            raise HTTPException(status_code=400, detail="Stream URL sources are not allowed")
+        video_source = source
+    else:
+        raise HTTPException(status_code=400, detail="Provide a video 'file' or a stream 'source'")
+
+    try:
+        capture = await inference_executor.call(open_capture, video_source)
+        if capture is None:
+            raise HTTPException(status_code=400, detail="Could not open video")
+        stream = stream_detections(
+            capture, detector.detect, inference_executor.call,
+            stride=stride, fmt=format, max_frames=max_frames, on_close=cleanup,
+        )
+    except BaseException:
+        if cleanup:
+            cleanup()
+        raise
+    if cleanup:
+        # The stream removes the upload when it ends or is closed; a stream that is never
+        # iterated (client gone before the response started) does so when collected
+        weakref.finalize(stream, cleanup)
+    media_type = "text/event-stream" if format == "sse" else "application/x-ndjson"
+    return StreamingResponse(stream, media_type=media_type)
+
 from pathlib import Path
 
 # ... (imports)
@@ -0,0 +1,57 @@
+# smaps fields, in kB, and the name they are reported under
+_FIELDS = {
+    "Rss": "rss",
+    "Pss": "pss",
+    "Shared_Clean": "shared",
+    "Shared_Dirty": "shared",
+    "Private_Clean": "uss",
+    "Private_Dirty": "uss",
+    "Swap": "swap",
+}
+
+
+def process_memory(pid="self"):
+    """
+    Memory of a process in bytes, from /proc/<pid>/smaps_rollup (Linux):
+      rss     resident set
+      uss     unique: pages only this process maps (what it costs to add it)
+      shared  pages also mapped by other processes (e.g. forked model weights)
+      pss     proportional: uss plus its share of the shared pages
+      swap
+    Returns None where /proc is not available.
+    """
+    memory = dict.fromkeys(("rss", "pss", "uss", "shared", "swap"), 0)
+    for name in ("smaps_rollup", "smaps"):
+        try:
+            with open(f"/proc/{pid}/{name}") as f:
+                for line in f:
+                    key, _, value = line.partition(":")
+                    field = _FIELDS.get(key)
+                    if field and value.endswith("kB\n"):
+                        memory[field] += int(value.split()[0]) * 1024
+            return memory
+        except (OSError, ValueError):
+            continue
+    return None
+
+
+def memory_report(pids):
+    """
+    Per-process memory for {label: pid} plus totals: 'total_pss' is the real footprint
+    of the group, 'worker_uss' the average unique memory of the processes labelled
+    'worker-*', i.e. the marginal cost of one more worker.
+    """
+    mb = 1024.0 * 1024.0
+    processes = {}
+    for label, pid in pids.items():
+        memory = process_memory(pid)
+        if memory is not None:
+            processes[label] = {key: round(value / mb, 1) for key, value in memory.items()}
+    workers = [m for label, m in processes.items() if label.startswith("worker-")]
+    return {
+        "processes": processes,
+        "total_rss_mb": round(sum(m["rss"] for m in processes.values()), 1),
+        "total_pss_mb": round(sum(m["pss"] for m in processes.values()), 1),
+        "worker_uss_mb": round(sum(m["uss"] for m in workers) / len(workers), 1) if workers else None,
+        "worker_shared_mb": round(sum(m["shared"] for m in workers) / len(workers), 1) if workers else None,
+    }
@@ -0,0 +1,147 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import config
+
+if config.MODELS_OFFLINE:
+    # Never reach out to the Hugging Face hub; everything must come from local files
+    os.environ.setdefault("HF_HUB_OFFLINE", "1")
+    os.environ.setdefault("TRANSFORMERS_OFFLINE", "1")
+
+
+def model_path(name):
+    """
+    Resolves a model file / directory name against MODEL_DIR.
+    Falls back to the bare name (e.g. a hub id or an ultralytics auto-download name)
+    unless MODELS_OFFLINE is set, in which case the local path is always used.
+    """
+    if os.path.isabs(name):
+        return name
+    local = os.path.join(config.MODEL_DIR, name)
+    if os.path.exists(local) or config.MODELS_OFFLINE:
+        return local
+    return name
+
+
+class ModelRegistry:
+    """
+    Owns model loading for the whole process.
+
+    Models are registered with a loader callable and loaded either in the background
+    at startup (all loaders run concurrently), lazily on first use, or eagerly before
+    the app starts serving (MODEL_LOAD_MODE). `get` blocks until a model is available.
+    Required models raise on failure; optional ones return None, mirroring the old
+    "Warning: Could not load ..." behaviour.
+    """
+
+    PENDING = "pending"
+    LOADING = "loading"
+    LOADED = "loaded"
+    FAILED = "failed"
+
+    def __init__(self, mode=None):
+        self.mode = mode or config.MODEL_LOAD_MODE
+        self._specs = {}
+        self._futures = {}
+        self._states = {}
+        self._lock = threading.Lock()
+        self._pool = None
+
+    def register(self, name, loader, required=True):
+        with self._lock:
+            self._specs[name] = (loader, required)
+            self._states[name] = {"state": self.PENDING, "required": required, "load_seconds": None, "error": None}
+
+    def _load(self, name):
+        loader, required = self._specs[name]
+        self._set_state(name, state=self.LOADING)
+        print(f"Loading model '{name}'...")
+        started = time.perf_counter()
+        try:
+            model = loader()
+        except Exception as e:
+            print(f"Warning: Could not load model '{name}': {e}")
+            self._set_state(name, state=self.FAILED, load_seconds=time.perf_counter() - started, error=str(e))
+            if required:
+                raise
+            return None
+        elapsed = time.perf_counter() - started
+        print(f"Loaded model '{name}' in {elapsed:.1f}s")
+        self._set_state(name, state=self.LOADED, load_seconds=elapsed)
+        return model
+
+    def _set_state(self, name, **fields):
+        with self._lock:
+            self._states[name].update(fields)
+
+    def _submit(self, name):
+        # Must hold self._lock
+        if name not in self._futures:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=max(1, len(self._specs)), thread_name_prefix="model-load")
+            self._futures[name] = self._pool.submit(self._load, name)
+        return self._futures[name]
+
+    def start(self):
+        """Starts loading every registered model concurrently in the background."""
+        with self._lock:
+            for name in self._specs:
+                self._submit(name)
+
+    def load_all(self):
+        """Loads everything concurrently and blocks until done."""
+        self.start()
+        for future in list(self._futures.values()):
+            future.exception()
+
+    def stop_loader(self):
+        """
+        Waits for the models already submitted and stops the loader threads, leaving the
+        process single-threaded (prefork.py loads everything, then forks).
+        """
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True)
+
+    def startup(self):
+        """Applies MODEL_LOAD_MODE: 'eager' blocks, 'background' starts loading, 'lazy' waits for first use."""
+        if self.mode == "eager":
+            self.load_all()
+        elif self.mode == "background":
+            self.start()
+
+    def get(self, name):
+        """Returns the loaded model, loading it now if needed (blocks until available)."""
+        with self._lock:
+            if name not in self._specs:
+                raise KeyError(f"Unknown model '{name}'")
+            future = self._submit(name)
+        try:
+            return future.result()
+        except Exception as e:
+            raise RuntimeError(f"Model '{name}' is not available: {e}") from e
+
+    def peek(self, name):
+        """Returns the model if it has finished loading, else None; never starts a load."""
+        with self._lock:
+            future = self._futures.get(name)
+        if future is None or not future.done() or future.exception() is not None:
+            return None
+        return future.result()
+
+    def is_ready(self):
+        with self._lock:
+            return all(s["state"] == self.LOADED for s in self._states.values() if s["required"])
+
+    def status(self):
+        """Per-model load state and load time for the /ready endpoint."""
+        with self._lock:
+            return {
+                "ready": all(s["state"] == self.LOADED for s in self._states.values() if s["required"]),
+                "mode": self.mode,
+                "offline": config.MODELS_OFFLINE,
+                "models": {name: dict(state) for name, state in self._states.items()},
+            }
@@ -1,11 +1,70 @@
+import cv2
 import easyocr
 import numpy as np
+from easyocr.config import imgH
+from easyocr.recognition import get_text
+from easyocr.utils import get_image_list
+
+import config
+from model_registry import ModelRegistry
+
+
+OCR_PRECISIONS = ("int8", "fp32")
+
+# Reader.readtext's recognition defaults, passed by name to easyocr's get_text
+RECOGNIZE_ARGS = {
+    "decoder": "greedy",
+    "beamWidth": 5,
+    "contrast_ths": 0.1,
+    "adjust_contrast": 0.5,
+    "filter_ths": 0.003,
+    "workers": 0,
+}
+
+
+def load_reader(precision=None):
+    """
+    Initialize EasyOCR reader for English. 'int8' is EasyOCR's own CPU default
+    (quantize=True), i.e. what this app always ran; 'fp32' turns quantization off.
+    """
+    # gpu=False for broader compatibility, set True if CUDA available
+    precision = precision or config.OCR_PRECISION
+    if precision not in OCR_PRECISIONS:
+        raise ValueError(f"Unknown OCR precision '{precision}'")
+    return easyocr.Reader(
+        ['en'],
+        gpu=False,
+        model_storage_directory=config.EASYOCR_MODEL_DIR or None,
+        download_enabled=not config.MODELS_OFFLINE,
+        # With quantize on CPU, EasyOCR applies torch dynamic INT8 quantization to the
+        # LSTM / Linear layers, i.e. the recognizer's BiLSTM and head (CRAFT is all
+        # convolutions and stays fp32)
+        quantize=precision == "int8",
+    )
+
+
+def detect_args():
+    """Text detector (CRAFT) arguments shared by the full and the region scans."""
+    return {"canvas_size": config.OCR_CANVAS_SIZE, "mag_ratio": config.OCR_MAG_RATIO}
+
+
+def register_models(registry):
+    """Registers the EasyOCR reader with a ModelRegistry."""
+    registry.register("ocr", load_reader)
+
 
 class OCRProcessor:
-    def __init__(self):
-        # Initialize EasyOCR reader for English
-        # gpu=False for broader compatibility, set True if CUDA available
-        self.reader = easyocr.Reader(['en'], gpu=False) 
+    def __init__(self, registry=None):
+        # The reader comes from a shared ModelRegistry; without one, load it now
+        if registry is None:
+            registry = ModelRegistry(mode="eager")
+            register_models(registry)
+            registry.startup()
+        self.registry = registry
+
+    @property
+    def reader(self):
+        return self.registry.get("ocr")
 
     MAX_TEXT_LENGTH = 500  # truncate very long text
 
@@ -23,26 +82,74 @@ class OCRProcessor:
         Run OCR on the full image and return detections in standard format:
         {'box': [x1, y1, x2, y2], 'confidence': float, 'class': 'Text', 'ocr_text': str}
         """
-        output = []
         try:
-            results = self.reader.readtext(image)
-            for (bbox, text, prob) in results:
-                # bbox is list of 4 points [[x,y], [x,y]..]
-                # We need [x1, y1, x2, y2]
-                pts = np.array(bbox, dtype=np.int32)
-                x1 = int(np.min(pts[:, 0]))
-                y1 = int(np.min(pts[:, 1]))
-                x2 = int(np.max(pts[:, 0]))
-                y2 = int(np.max(pts[:, 1]))
-                
-                output.append({
-                    'box': [x1, y1, x2, y2],
-                    'confidence': float(prob),
-                    'class': 'Text',
-                    'ocr_text': text,
-                    'description': f"detected text '{text}'"
-                })
+            # detect + recognize_batched rather than readtext, which recognizes box by box on CPU
+            horizontal_list, free_list = self.reader.detect(image, **detect_args())
+            results = self.recognize_batched(image, horizontal_list[0], free_list[0])
+            return self._to_detections(results)
         except Exception as e:
             print(f"OCR Full Scan Error: {e}")
-        
+            return []
+
+    def detect_text_regions(self, image, regions):
+        """
+        Region-gated OCR: runs the text detector only inside `regions` ([x1, y1, x2, y2]
+        crops chosen by ocr_planner.plan_regions), then recognizes every text box found
+        in all crops in batches. Returns detections in the same format as detect_text_full.
+        """
+        if not regions:
+            return []
+        try:
+            horizontal_list, free_list = [], []
+            for x1, y1, x2, y2 in regions:
+                crop = image[y1:y2, x1:x2]
+                crop_horizontal, crop_free = self.reader.detect(crop, **detect_args())
+                # Map crop coordinates back to the full image
+                for hx1, hx2, hy1, hy2 in crop_horizontal[0]:
+                    horizontal_list.append([int(hx1) + x1, int(hx2) + x1, int(hy1) + y1, int(hy2) + y1])
+                for points in crop_free[0]:
+                    free_list.append([[int(px) + x1, int(py) + y1] for px, py in points])
+            return self._to_detections(self.recognize_batched(image, horizontal_list, free_list))
+        except Exception as e:
+            print(f"OCR Region Scan Error: {e}")
+            return []
+
+    def recognize_batched(self, image, horizontal_list, free_list):
+        """
+        Recognizes the given text boxes in batches of OCR_BATCH_SIZE.
+        (Reader.recognize always goes box by box on CPU.)
+        Returns readtext-style (bbox, text, prob) tuples.
+        """
+        if not horizontal_list and not free_list:
+            return []
+        reader = self.reader
+        img_cv_grey = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+        image_list, max_width = get_image_list(horizontal_list, free_list, img_cv_grey, model_height=imgH)
+        if not image_list:
+            return []
+        ignore_char = ''.join(set(reader.character) - set(reader.lang_char))
+        return get_text(
+            reader.character, imgH, int(max_width), reader.recognizer, reader.converter, image_list,
+            ignore_char=ignore_char, batch_size=config.OCR_BATCH_SIZE, device=reader.device,
+            **RECOGNIZE_ARGS,
+        )
+
+    def _to_detections(self, results):
+        output = []
+        for (bbox, text, prob) in results:
+            # bbox is list of 4 points [[x,y], [x,y]..]
+            # We need [x1, y1, x2, y2]
+            pts = np.array(bbox, dtype=np.int32)
+            x1 = int(np.min(pts[:, 0]))
+            y1 = int(np.min(pts[:, 1]))
+            x2 = int(np.max(pts[:, 0]))
+            y2 = int(np.max(pts[:, 1]))
+            
+            output.append({
+                'box': [x1, y1, x2, y2],
+                'confidence': float(prob),
+                'class': 'Text',
+                'ocr_text': text,
+                'description': f"detected text '{text}'"
+            })
         return output
@@ -0,0 +1,104 @@
+from collections import namedtuple
+
+import cv2
+import numpy as np
+
+import config
+
+# Cheap text-presence scan result: candidate text-line boxes (full-image coordinates),
+# the fraction of the frame they cover and whether a full EasyOCR scan is warranted.
+TextMap = namedtuple("TextMap", ["boxes", "density", "full_scan"])
+
+# Vehicles (YOLO and ViT-refined names): number plates sit in the lower part of the box
+VEHICLE_CLASSES = {
+    'car', 'truck', 'bus', 'motorcycle', 'train', 'vehicle', 'van', 'ambulance', 'police car',
+    'taxi', 'fire engine', 'school bus', 'convertible', 'sports car', 'minivan', 'pickup truck',
+}
+# YOLO classes that usually carry readable text (signs, screens, documents)
+TEXT_BEARING_CLASSES = {'stop sign', 'parking meter', 'book', 'laptop', 'tv', 'cell phone', 'clock'}
+
+# Plates are searched in the bottom part of a vehicle box
+PLATE_REGION_START = 0.4
+# Padding around planned crops, as a fraction of the crop height
+REGION_PADDING = 0.15
+MIN_REGION_SIDE = 16
+
+
+def scan_text(image):
+    """
+    Cheap text-presence detector: morphological gradient + Otsu + horizontal closing
+    on a downscaled grey frame, then keeps connected components shaped like text lines.
+    Costs a few milliseconds, versus a full CRAFT pass.
+    """
+    height, width = image.shape[:2]
+    scale = min(1.0, config.OCR_SCAN_MAX_SIDE / max(height, width))
+    small = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA) if scale < 1.0 else image
+    gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY) if small.ndim == 3 else small
+
+    gradient = cv2.morphologyEx(gray, cv2.MORPH_GRADIENT, cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3)))
+    _, binary = cv2.threshold(gradient, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+    # Join the characters of a line into one blob
+    lines = cv2.morphologyEx(binary, cv2.MORPH_CLOSE, cv2.getStructuringElement(cv2.MORPH_RECT, (9, 1)))
+
+    _, _, stats, _ = cv2.connectedComponentsWithStats(lines, connectivity=8)
+    stats = stats[1:]  # drop background
+    x, y, w, h, area = stats[:, 0], stats[:, 1], stats[:, 2], stats[:, 3], stats[:, 4]
+    fill = area / np.maximum(w * h, 1)
+    small_h = gray.shape[0]
+    keep = (h >= 6) & (h <= 0.15 * small_h) & (w >= 1.5 * h) & (fill >= 0.45)
+
+    boxes = np.stack([x, y, x + w, y + h], axis=1)[keep] / scale
+    density = float((w * h)[keep].sum()) / float(gray.shape[0] * gray.shape[1])
+    full_scan = density >= config.OCR_FULL_SCAN_DENSITY or int(keep.sum()) >= config.OCR_FULL_SCAN_LINES
+    return TextMap(boxes.astype(int).tolist(), density, full_scan)
+
+
+def _merge_regions(regions):
+    # Union overlapping regions until stable; region counts are small
+    regions = [list(r) for r in regions]
+    changed = True
+    while changed:
+        changed = False
+        merged = []
+        for region in regions:
+            for other in merged:
+                if region[0] < other[2] and other[0] < region[2] and region[1] < other[3] and other[1] < region[3]:
+                    other[:] = [min(region[0], other[0]), min(region[1], other[1]),
+                                max(region[2], other[2]), max(region[3], other[3])]
+                    changed = True
+                    break
+            else:
+                merged.append(region)
+        regions = merged
+    return regions
+
+
+def plan_regions(image_shape, detections, text_map):
+    """
+    Decides which crops to OCR from the YOLO output (plate area of vehicles,
+    text-bearing objects; `detections` is a DetectionSet) and the cheap text scan.
+    Returns merged [x1, y1, x2, y2] crops.
+    """
+    height, width = image_shape[:2]
+    regions = []
+
+    for (x1, y1, x2, y2), cls, original in zip(
+        detections.boxes.tolist(), detections.class_names(), detections.original_names()
+    ):
+        cls, original = cls.lower(), original.lower()
+        if cls in VEHICLE_CLASSES or original in VEHICLE_CLASSES:
+            regions.append([x1, int(y1 + PLATE_REGION_START * (y2 - y1)), x2, y2])
+        elif original in TEXT_BEARING_CLASSES:
+            regions.append([x1, y1, x2, y2])
+
+    regions.extend(text_map.boxes)
+
+    padded = []
+    for x1, y1, x2, y2 in regions:
+        pad = int(REGION_PADDING * (y2 - y1)) + 2
+        x1, y1 = max(0, x1 - pad), max(0, y1 - pad)
+        x2, y2 = min(width, x2 + pad), min(height, y2 + pad)
+        if x2 - x1 >= MIN_REGION_SIDE and y2 - y1 >= MIN_REGION_SIDE:
+            padded.append([x1, y1, x2, y2])
+
+    return _merge_regions(padded)
@@ -0,0 +1,168 @@
+from collections import Counter
+
+import numpy as np
+
+import tracing
+from geometry import centers_inside, intersection_over_a
+
+
+def detect_bill(text_detections, receipt_parser):
+    """
+    --- BILL / RECEIPT DETECTION LOGIC ---
+    Returns the parsed bill dict if the text looks like a receipt, else None.
+    """
+    bill_data = None
+    # Heuristic: If there are many text detections (e.g. > 10) and few/no natural objects
+    # or if specific keywords like "Total", "Subtotal" are found.
+
+    # For a robust check, let's look for "Total" or high text count
+    has_total = any("total" in d['ocr_text'].lower() for d in text_detections)
+    if len(text_detections) > 10 or has_total:
+        parsed_bill = receipt_parser.parse(text_detections)
+        if parsed_bill and (parsed_bill['total'] or len(parsed_bill['items']) > 0):
+            bill_data = parsed_bill
+    return bill_data
+
+
+VEHICLE_CLASSES = ['car', 'truck', 'bus', 'motorcycle', 'vehicle', 'ambulance', 'police car', 'taxi', 'van']
+
+
+def associate_results(detections, text_detections):
+    """
+    Attaches overlapping OCR text, number plates, helmet status and descriptions to
+    the YOLO detections (the text columns of the DetectionSet, see detections.py).
+    Returns the standalone text boxes, i.e. those not inside any object.
+    """
+    # Merge results
+    # We want to associate text with objects if they overlap significantly,
+    # otherwise treat text as a separate object.
+
+    # Pairwise geometry, computed once for all boxes (see geometry.py)
+    text_boxes = [text_det['box'] for text_det in text_detections]
+    # intersection over object area, detections x text boxes
+    text_overlap = intersection_over_a(detections.boxes, text_boxes)
+    # centers of other detections inside each detection, detections x detections
+    contained = centers_inside(detections.boxes, detections.boxes)
+    np.fill_diagonal(contained, False)
+
+    # --- HELMET ASSOCIATION LOGIC ---
+    # For each detection, the last 'Helmet' / 'No Helmet' box centered inside it decides
+    ppe_inside = contained & detections.is_class('Helmet', 'No Helmet')[None, :]
+    last_ppe = np.where(ppe_inside, np.arange(len(detections))[None, :], -1).max(axis=1, initial=-1)
+    has_ppe = last_ppe >= 0
+    helmet_inside = has_ppe & detections.is_class('Helmet')[last_ppe]
+
+    classes = detections.class_names()
+    colors = detections.color_names()
+    ocr_texts, plates, descriptions = [], [], []
+
+    # 1. Add YOLO detections
+    for i, main_obj in enumerate(classes):
+        # Check if any text box overlaps this object (30% overlap);
+        # main_obj is the refined class, e.g. "Ambulance" thanks to ViT
+        associated_text = [text_detections[j]['ocr_text'] for j in np.flatnonzero(text_overlap[i] > 0.3)]
+        ocr_text_combined = " ".join(associated_text)
+
+        # --- VEHICLE NUMBER PLATE LOGIC ---
+        # For vehicles, rely on the text found by the scan: plate-like (alphanumeric, > 4
+        # chars) associated text wins, otherwise the first associated text
+        number_plate_text = ""
+        if main_obj.lower() in VEHICLE_CLASSES and associated_text:
+            for t in associated_text:
+                if len(t) > 4 and sum(c.isdigit() for c in t) > 0 and sum(c.isalpha() for c in t) > 0:
+                    number_plate_text = t
+                    break
+            if not number_plate_text:
+                # Fallback: just use the text
+                number_plate_text = associated_text[0]
+
+        helmet_status = ""
+        if main_obj.lower() == 'person' and has_ppe[i]:
+            helmet_status = "wearing a helmet" if helmet_inside[i] else "not wearing a helmet"
+
+        if main_obj.lower() == 'helmet':
+            base_desc = f"detected a {main_obj}"
+        else:
+            base_desc = f"detected a {colors[i].lower()} {main_obj}"
+
+        if helmet_status:
+            base_desc += f" {helmet_status}"
+
+        if number_plate_text:
+            base_desc += f", Number Plate: {number_plate_text}"
+
+        if not number_plate_text and ocr_text_combined:
+            descriptions.append(f"{base_desc} containing text '{ocr_text_combined}'")
+        else:
+            descriptions.append(base_desc)
+        ocr_texts.append(ocr_text_combined)
+        plates.append(number_plate_text)
+
+    detections.ocr_text = np.array(ocr_texts, dtype=object)
+    detections.number_plate = np.array(plates, dtype=object)
+    detections.description = np.array(descriptions, dtype=object)
+
+    # 2. Standalone Text
+    # We might want to HIDE text if it was used for a receipt/bill to avoid clutter?
+    # Let's keep them for now, but maybe the UI can filter them.
+    is_inside_object = (text_overlap > 0.5).any(axis=0)
+    return [text_det for text_det, inside in zip(text_detections, is_inside_object) if not inside]
+
+
+def build_summary(detections, standalone_text, bill_data):
+    """Generates the overall natural-language scene summary."""
+    summary_items = []
+    detected_text = [det['ocr_text'] for det in standalone_text if det.get('ocr_text')]
+
+    descriptions = detections.description if detections.description is not None else [''] * len(detections)
+    for item_desc, color, description in zip(detections.class_names(), detections.color_names(), descriptions):
+        # Helmets are auxiliary: they show up in the person's description instead
+        if item_desc in ['Helmet', 'No Helmet']:
+            continue
+
+        if item_desc.lower() == 'person':
+            if "wearing a helmet" in description:
+                item_desc = "Person (with Helmet)"
+            elif "not wearing a helmet" in description:
+                item_desc = "Person (No Helmet)"
+
+        if color and color != "Unknown Color":
+            item_desc = f"{color} {item_desc}"
+
+        summary_items.append(item_desc)
+
+    # Count items
+    item_counts = Counter(summary_items)
+
+    summary_parts = []
+    for item, count in item_counts.items():
+        summary_parts.append(f"{count} {item}{'s' if count > 1 else ''}")
+
+    if summary_parts:
+        summary_text = "This image contains " + ", ".join(summary_parts) + "."
+    else:
+        summary_text = "No objects were clearly detected."
+
+    if bill_data:
+        summary_text += f" It appears to be a Shop Bill from '{bill_data['shop_name']}' with {len(bill_data['items'])} items totaling {bill_data['total'] or 'Unknown'}."
+    elif detected_text: # Only show random text if not a bill, to avoid spam
+        unique_text = list(set(detected_text))[:3]
+        summary_text += f" It also features text: '{', '.join(unique_text)}'."
+
+    return summary_text
+
+
+def build_response(detections, text_detections, receipt_parser):
+    """
+    Turns the raw detector / OCR output into the /detect response body
+    (without the per-request 'filename').
+    """
+    with tracing.stage("receipt_parse"):
+        bill_data = detect_bill(text_detections, receipt_parser)
+    with tracing.stage("associate"):
+        standalone_text = associate_results(detections, text_detections)
+    with tracing.stage("summary"):
+        summary_text = build_summary(detections, standalone_text, bill_data)
+    # The single conversion from columns to the JSON shape
+    results = detections.to_dicts() + standalone_text
+    return {"results": results, "summary": summary_text, "bill_data": bill_data}
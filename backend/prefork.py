@@ -0,0 +1,175 @@
+"""
+Multi-worker serving with model weights shared between the workers.
+
+`uvicorn --workers N` starts N fresh interpreters, each importing main.py and loading
+its own copy of every model, so memory grows with the worker count. Here the parent
+imports main.py once (models loaded eagerly), runs each model once, freezes the
+garbage collector and forks the workers. The workers share the loaded weights
+copy-on-write and serve one listening socket; inference never writes the weights, so
+those pages stay shared and each extra worker mostly adds its own activations and
+Python heap.
+
+The parent restarts workers that exit, and prints a memory report (rss / pss / unique /
+shared per process, see memstats.py) once the workers are up and on SIGUSR1.
+/metrics and /metrics/memory report the memory of the worker answering.
+
+State kept in the app process is per worker: the result cache, camera states
+(/detect?camera_id=...) and bulk jobs. Only worker 0 resumes unfinished jobs; poll a
+job on the worker that accepted it (sticky sessions) or run jobs on a single worker.
+
+Usage (from the backend directory):
+    python prefork.py [--workers 4] [--host 0.0.0.0] [--port 7860]
+"""
+import argparse
+import gc
+import json
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+import traceback
+
+# The models must be in memory before the fork, or every worker loads its own
+os.environ["MODEL_LOAD_MODE"] = "eager"
+
+import cv2
+import numpy as np
+import torch
+import uvicorn
+
+import config
+from memstats import memory_report
+from replicas import core_slices, pin_to_cores
+
+
+def load_app(warmup=True):
+    """Imports main.py (loading the models) and leaves the process single-threaded."""
+    import main
+
+    if config.REPLICAS > 1 and config.REPLICA_MODE == "process":
+        sys.exit("prefork.py cannot fork process replicas; use REPLICA_MODE=thread or REPLICAS=1")
+    main.model_registry.stop_loader()
+    if warmup:
+        # Lazy first-call setup (predictor construction, conv/BN fusion) writes to the
+        # weights; done here it lands in pages every worker shares
+        image = np.full((320, 320, 3), 127, dtype=np.uint8)
+        main.detector.detect(image)
+        main.ocr_processor.detect_text_full(image)
+    return main
+
+
+def listen(host, port, backlog=2048):
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def _exit_with_parent(parent):
+    # A worker whose parent is gone (killed with SIGKILL) shuts down instead of lingering
+    while os.getppid() == parent:
+        time.sleep(1.0)
+    os.kill(os.getpid(), signal.SIGTERM)
+
+
+def run_worker(main, index, sock, cores, log_level):
+    """Body of a forked worker: never returns."""
+    code = 0
+    try:
+        for signum in (signal.SIGTERM, signal.SIGINT, signal.SIGUSR1):
+            signal.signal(signum, signal.SIG_DFL)
+        gc.enable()
+        threading.Thread(target=_exit_with_parent, args=(os.getppid(),), daemon=True).start()
+        # Thread pools are created here, after the fork (see load_app)
+        pin_to_cores(cores, len(cores))
+        cv2.setNumThreads(len(cores))
+        main.worker_index = index
+        server = uvicorn.Server(uvicorn.Config(main.app, log_level=log_level))
+        server.run(sockets=[sock])
+    except BaseException:
+        traceback.print_exc()
+        code = 1
+    finally:
+        os._exit(code)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=config.PREFORK_WORKERS)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=int(os.environ.get("PORT", 7860)))
+    parser.add_argument("--log-level", default="info")
+    parser.add_argument("--no-warmup", dest="warmup", action="store_false", default=config.PREFORK_WARMUP)
+    parser.add_argument("--report-after", type=float, default=10.0,
+                        help="seconds after startup to print the memory report (0: only on SIGUSR1)")
+    args = parser.parse_args()
+
+    # Objects created during loading are long-lived; without collections in the parent
+    # and with them frozen before the fork, the workers' GC never writes to their pages
+    gc.disable()
+    # Torch / OpenCV thread pools do not survive a fork, so none may exist in the parent
+    torch.set_num_threads(1)
+    cv2.setNumThreads(1)
+    app = load_app(args.warmup)
+    sock = listen(args.host, args.port)
+    slices = core_slices(args.workers)
+    gc.collect()
+    gc.freeze()
+
+    workers = {}  # pid -> index
+    flags = {"stopping": False, "report": False}
+
+    def spawn(index):
+        pid = os.fork()
+        if pid == 0:
+            run_worker(app, index, sock, slices[index], args.log_level)
+        workers[pid] = index
+
+    def stop(signum, frame):
+        flags["stopping"] = True
+        for pid in list(workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def request_report(signum, frame):
+        flags["report"] = True
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGUSR1, request_report)
+
+    for index in range(args.workers):
+        spawn(index)
+    print(f"Serving on {args.host}:{args.port} with {args.workers} forked workers on core slices {slices}")
+
+    report_at = time.monotonic() + args.report_after if args.report_after > 0 else None
+    while workers:
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            break
+        if pid:
+            index = workers.pop(pid, None)
+            if index is not None and not flags["stopping"]:
+                print(f"Warning: worker {index} (pid {pid}) exited with status {status}, restarting")
+                time.sleep(1.0)
+                spawn(index)
+            continue
+
+        if flags["report"] or (report_at is not None and time.monotonic() >= report_at):
+            flags["report"] = False
+            report_at = None
+            pids = {"parent": os.getpid(), **{f"worker-{index}": pid for pid, index in sorted(workers.items(), key=lambda w: w[1])}}
+            print(json.dumps(memory_report(pids), indent=2))
+        time.sleep(0.5)
+
+
+if __name__ == "__main__":
+    main()
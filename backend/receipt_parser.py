@@ -1,8 +1,32 @@
 import re
+from itertools import chain
+
+import numpy as np
+
+# Compiled once; the patterns are the same ones the per-line heuristics always used
+DATE_PATTERN = re.compile(r'\d{2}/\d{2}')
+AMOUNT_PATTERN = re.compile(r'[\d,]+\.\d{2}')
+# Line ending in a price like 12.00 or 12.99
+ITEM_PATTERN = re.compile(r'\d+\.\d{2}$')
+
+# Boxes whose vertical centers differ by less than this fraction of the typical text
+# height belong to the same line. Relative to the text size, so it works the same on
+# a phone photo of a receipt and on a 300 dpi scan.
+LINE_TOLERANCE = 0.5
+
 
 class ReceiptParser:
-    def __init__(self):
-        pass
+    """
+    Extracts shop name, item lines and total from OCR text detections.
+
+    Lines are found by clustering the boxes' vertical centers (vectorized, relative to
+    the median box height), each line's text is built once and the heuristics run on
+    the line texts with precompiled patterns, so the cost per receipt grows linearly
+    with the number of OCR boxes.
+    """
+
+    def __init__(self, line_tolerance=LINE_TOLERANCE):
+        self.line_tolerance = line_tolerance
 
     def parse(self, text_detections):
         """
@@ -12,91 +36,75 @@ class ReceiptParser:
         if not text_detections:
             return None
 
-        # Sort by Y coordinate (top to bottom), then X (left to right)
-        # box is [x1, y1, x2, y2]
-        sorted_dets = sorted(text_detections, key=lambda d: (d['box'][1], d['box'][0]))
-        
-        lines = self._group_into_lines(sorted_dets)
-        
-        shop_name = self._extract_shop_name(lines)
-        total = self._extract_total(lines)
-        items = self._extract_items(lines)
+        lines = self.line_texts(text_detections)
+        lowered = [text.lower() for text in lines]
 
         return {
-            "shop_name": shop_name,
-            "items": items,
-            "total": total
+            "shop_name": self._extract_shop_name(lines),
+            "items": self._extract_items(lines),
+            "total": self._extract_total(lines, lowered),
         }
 
-    def _group_into_lines(self, detections, y_threshold=10):
-        """Groups detections into lines based on Y-coordinate proximity."""
-        lines = []
-        current_line = []
-        
-        for det in detections:
-            if not current_line:
-                current_line.append(det)
-                continue
-            
-            # Check vertical overlap with the last item in the current line
-            last_det = current_line[-1]
-            y1_diff = abs(det['box'][1] - last_det['box'][1])
-            
-            if y1_diff <= y_threshold:
-                current_line.append(det)
-            else:
-                # Sort current line by X
-                current_line.sort(key=lambda d: d['box'][0])
-                lines.append(current_line)
-                current_line = [det]
-        
-        if current_line:
-            current_line.sort(key=lambda d: d['box'][0])
-            lines.append(current_line)
-            
-        return lines
-
-    def _get_line_text(self, line):
-        return " ".join([d['ocr_text'] for d in line])
+    def parse_many(self, receipts):
+        """parse() for many receipts (e.g. a bulk job), in order."""
+        parse = self.parse
+        return [parse(text_detections) for text_detections in receipts]
+
+    def group_lines(self, boxes):
+        """
+        Line index per box and the reading order: returns (line_ids, order) where
+        `order` sorts the boxes top to bottom, then left to right within a line.
+        box is [x1, y1, x2, y2].
+        """
+        boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        centers = (boxes[:, 1] + boxes[:, 3]) / 2
+        heights = np.maximum(boxes[:, 3] - boxes[:, 1], 1.0)
+
+        # A new line starts wherever the gap between consecutive sorted centers exceeds
+        # the tolerance; the median height ignores the odd oversized title or tiny dot
+        by_center = np.argsort(centers, kind="stable")
+        gaps = np.diff(centers[by_center])
+        threshold = self.line_tolerance * np.median(heights)
+        sorted_ids = np.concatenate(([0], np.cumsum(gaps > threshold)))
+
+        line_ids = np.empty(len(boxes), dtype=np.int64)
+        line_ids[by_center] = sorted_ids
+        # One sort on (line, x1) folded into a single key; x1 is shifted to be >= 0
+        x1 = boxes[:, 0] - boxes[:, 0].min()
+        order = np.argsort(line_ids * (x1.max() + 1) + x1, kind="stable")
+        return line_ids, order
+
+    def line_texts(self, text_detections):
+        """The text of every line, top to bottom, words joined left to right."""
+        boxes = np.fromiter(chain.from_iterable(d['box'] for d in text_detections),
+                            dtype=np.float64, count=4 * len(text_detections))
+        line_ids, order = self.group_lines(boxes)
+        texts = [text_detections[i]['ocr_text'] for i in order.tolist()]
+        # Boundaries between lines in reading order
+        starts = np.flatnonzero(np.diff(line_ids[order])) + 1
+        bounds = [0] + starts.tolist() + [len(texts)]
+        return [" ".join(texts[a:b]) for a, b in zip(bounds[:-1], bounds[1:])]
 
     def _extract_shop_name(self, lines):
         # Heuristic: Shop name is usually the first or second line, often centered or large.
         # For now, just take the first line that looks like a name (not a date/phone).
-        for line in lines[:3]:
-            text = self._get_line_text(line)
-            if len(text) > 3 and not re.search(r'\d{2}/\d{2}', text): # Avoid dates
+        for text in lines[:3]:
+            if len(text) > 3 and not DATE_PATTERN.search(text):  # Avoid dates
                 return text
         return "Unknown Shop"
 
-    def _extract_total(self, lines):
-        # Look for "Total" keyword at the bottom half
-        for line in reversed(lines):
-            text = self._get_line_text(line).lower()
-            if "total" in text:
+    def _extract_total(self, lines, lowered):
+        # Look for "Total" keyword, starting from the bottom
+        for text, lower in zip(reversed(lines), reversed(lowered)):
+            if "total" in lower:
                 # Try to find a number in this line
-                match = re.search(r'[\d,]+\.\d{2}', text)
+                match = AMOUNT_PATTERN.search(lower)
                 if match:
                     return match.group(0)
-                # Or maybe the number is on the same line but distinct
-                # or strictly looking for the largest number at the bottom?
-                return self._get_line_text(line) # Return full line if specific number parsing fails
+                # Return full line if specific number parsing fails
+                return text
         return None
 
     def _extract_items(self, lines):
-        items = []
-        # Heuristic: Lines in the middle that end with a price
-        # Skip header (first few lines) and footer (where Total is found)
-        # This is tricky without strict structure, but let's try.
-        
-        start_idx = 0
-        end_idx = len(lines)
-        
-        # refinement: simplistic approach
-        for i, line in enumerate(lines):
-            text = self._get_line_text(line)
-            # Regex for line ending in price like 12.00 or 12.99
-            # Allowing for some potential OCR noise or currency symbol
-            if re.search(r'\d+\.\d{2}$', text):
-                items.append(text)
-                
-        return items
+        # Heuristic: Lines that end with a price (header and total lines rarely do)
+        return [text for text in lines if ITEM_PATTERN.search(text)]
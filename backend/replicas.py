@@ -0,0 +1,184 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import torch
+
+import config
+from detector import ObjectDetector, register_models as register_detector_models
+from executor import InferenceExecutor
+from model_registry import ModelRegistry
+from ocr import OCRProcessor, register_models as register_ocr_models
+
+
+def available_cores():
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def core_slices(replicas):
+    """Splits the cores this process may run on into one contiguous slice per replica."""
+    cores = available_cores()
+    per_replica = max(1, len(cores) // replicas)
+    slices = []
+    for i in range(replicas):
+        chunk = cores[i * per_replica:(i + 1) * per_replica]
+        # More replicas than cores: share round-robin
+        slices.append(chunk or [cores[i % len(cores)]])
+    return slices
+
+
+def pin_to_cores(cores, threads=None):
+    """
+    Pins the calling thread (or the process, when called in a fresh worker process) to
+    `cores`. Thread pools that torch / OpenMP create from this thread inherit the
+    affinity. `threads` sets the torch intra-op thread budget, which is process-wide:
+    pass it only from a process of its own.
+    """
+    if hasattr(os, "sched_setaffinity"):
+        try:
+            os.sched_setaffinity(0, cores)
+        except OSError as e:
+            print(f"Warning: Could not pin to cores {cores}: {e}")
+    if threads:
+        torch.set_num_threads(threads)
+
+
+def _new_registry(mode=None):
+    registry = ModelRegistry(mode=mode)
+    register_detector_models(registry)
+    register_ocr_models(registry)
+    return registry
+
+
+class ThreadReplica:
+    """A full set of models in this process, served by threads pinned to a core slice."""
+
+    def __init__(self, index, cores, threads, registry=None):
+        self.index = index
+        self.cores = cores
+        self.threads = threads
+        if registry is None:
+            registry = _new_registry()
+            registry.startup()
+        self.registry = registry
+        # One request at a time per replica, so batching would only add wait time
+        self.executor = InferenceExecutor(
+            ObjectDetector(registry), OCRProcessor(registry),
+            batching=False, initializer=pin_to_cores, initargs=(cores,),
+        )
+
+    async def run(self, image, resolution=None, cascade=None):
+        return await self.executor.run(image, resolution, cascade)
+
+    def status(self):
+        return {"index": self.index, "mode": "thread", "cores": self.cores, "threads": self.threads,
+                **self.registry.status()}
+
+
+# --- Process replicas: state living inside each worker process ---
+
+_worker = {}
+
+
+def _init_process_worker(cores, threads):
+    pin_to_cores(cores, threads)
+    registry = _new_registry(mode="eager")
+    registry.startup()
+    _worker["registry"] = registry
+    _worker["executor"] = InferenceExecutor(ObjectDetector(registry), OCRProcessor(registry), batching=False)
+
+
+def _process_status():
+    return _worker["registry"].status()
+
+
+def _process_run(image, resolution=None, cascade=None):
+    # Same concurrent pipeline as in the app process, driven by a private event loop
+    return asyncio.run(_worker["executor"].run(image, resolution, cascade))
+
+
+class ProcessReplica:
+    """A full set of models in a dedicated worker process pinned to a core slice."""
+
+    def __init__(self, index, cores, threads):
+        self.index = index
+        self.cores = cores
+        self.threads = threads
+        # spawn, not fork: forking a process that already initialised torch / OpenMP can deadlock
+        self.pool = ProcessPoolExecutor(
+            max_workers=1, mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_process_worker, initargs=(cores, threads),
+        )
+        # Starts the worker and loads its models in the background
+        self._startup = self.pool.submit(_process_status)
+
+    async def run(self, image, resolution=None, cascade=None):
+        return await asyncio.wrap_future(self.pool.submit(_process_run, image, resolution, cascade))
+
+    def status(self):
+        status = {"index": self.index, "mode": "process", "cores": self.cores, "threads": self.threads}
+        if not self._startup.done():
+            return {**status, "ready": False, "state": "loading"}
+        error = self._startup.exception()
+        if error is not None:
+            return {**status, "ready": False, "state": "failed", "error": str(error)}
+        return {**status, **self._startup.result()}
+
+
+class ReplicaPool:
+    """
+    Dispatches each request to an idle replica; requests wait when all replicas are busy.
+    Exposes the same `run(image, resolution, cascade)` coroutine as InferenceExecutor.
+    """
+
+    def __init__(self, replicas):
+        self.replicas = replicas
+        self._idle = None
+
+    def _idle_queue(self):
+        # Created lazily so it binds to the server's event loop
+        if self._idle is None:
+            self._idle = asyncio.Queue()
+            for replica in self.replicas:
+                self._idle.put_nowait(replica)
+        return self._idle
+
+    async def run(self, image, resolution=None, cascade=None):
+        idle = self._idle_queue()
+        replica = await idle.get()
+        try:
+            return await replica.run(image, resolution, cascade)
+        finally:
+            idle.put_nowait(replica)
+
+    def status(self):
+        replicas = [replica.status() for replica in self.replicas]
+        return {
+            "ready": all(r.get("ready") for r in replicas),
+            "idle_replicas": self._idle.qsize() if self._idle else len(self.replicas),
+            "replicas": replicas,
+        }
+
+
+def create_replica_pool(registry=None):
+    """
+    Builds REPLICAS replicas in REPLICA_MODE. In thread mode the first replica reuses
+    `registry` (the app's own models) so no extra copy is loaded for it.
+    """
+    slices = core_slices(config.REPLICAS)
+    if config.REPLICA_MODE != "process":
+        # The budget is process-wide, but each replica's inference thread gets an intra-op
+        # pool of that size pinned to its own slice: size it to one slice, not the host
+        threads = config.REPLICA_THREADS or len(slices[0])
+        torch.set_num_threads(threads)
+    replicas = []
+    for index, cores in enumerate(slices):
+        if config.REPLICA_MODE == "process":
+            replicas.append(ProcessReplica(index, cores, config.REPLICA_THREADS or len(cores)))
+        else:
+            replicas.append(ThreadReplica(index, cores, threads, registry if index == 0 else None))
+    print(f"Started {len(replicas)} {config.REPLICA_MODE} replicas on core slices {slices}")
+    return ReplicaPool(replicas)
@@ -0,0 +1,239 @@
+from collections import namedtuple
+
+import cv2
+import numpy as np
+
+import config
+from geometry import intersection_over_smaller
+
+# Resolution policies, selectable per request (?resolution=...):
+#   full  - every pass sees the decoded frame as is (YOLO letterboxes it internally)
+#   fast  - the YOLO passes see one copy downscaled to COARSE_MAX_SIDE; boxes are
+#           mapped back, so colors, ViT and OCR still work on full-resolution pixels
+#   tiled - the fast coarse pass plus overlapping TILE_SIZE tiles of the full frame
+#           (SAHI-style), merged across tiles; recovers small, distant objects
+RESOLUTION_MODES = ("full", "fast", "tiled")
+
+# Detector output as plain arrays in full-image coordinates; merge_results accepts
+# these in place of ultralytics Results
+BoxArrays = namedtuple("BoxArrays", ["xyxy", "conf", "cls"])
+
+
+def box_arrays(result, offset=(0, 0), scale=1.0):
+    """Converts an ultralytics Results (or BoxArrays) into BoxArrays, mapped by offset / scale."""
+    if isinstance(result, BoxArrays):
+        xyxy, conf, cls = result
+    else:
+        boxes = result.boxes
+        xyxy = boxes.xyxy.cpu().numpy()
+        conf = boxes.conf.cpu().numpy()
+        cls = boxes.cls.cpu().numpy()
+    xyxy = np.asarray(xyxy, dtype=np.float64).reshape(-1, 4)
+    if scale != 1.0 or offset != (0, 0):
+        xyxy = xyxy * scale + np.array([offset[0], offset[1], offset[0], offset[1]], dtype=np.float64)
+    return BoxArrays(xyxy, np.asarray(conf, dtype=np.float64).ravel(), np.asarray(cls).astype(int).ravel())
+
+
+def downscale(image, max_side):
+    """Returns (image, factor) with the longest side at most max_side; factor maps back to the input."""
+    height, width = image.shape[:2]
+    longest = max(height, width)
+    if not max_side or longest <= max_side:
+        return image, 1.0
+    ratio = max_side / float(longest)
+    small = cv2.resize(image, (round(width * ratio), round(height * ratio)), interpolation=cv2.INTER_AREA)
+    return small, width / float(small.shape[1])
+
+
+def tile_windows(height, width, tile, overlap):
+    """
+    [x1, y1, x2, y2] windows of side `tile` covering the frame with at least `overlap`
+    (a fraction of the tile) between neighbours; the last window is aligned to the edge.
+    """
+    def starts(length):
+        if length <= tile:
+            return [0]
+        stride = max(1, int(tile * (1.0 - overlap)))
+        count = int(np.ceil((length - tile) / stride)) + 1
+        return np.linspace(0, length - tile, count).round().astype(int).tolist()
+
+    return [
+        [x, y, min(width, x + tile), min(height, y + tile)]
+        for y in starts(height) for x in starts(width)
+    ]
+
+
+def cut_by_tile(xyxy, window, height, width, margin=2):
+    """True for boxes touching an edge of `window` that is not also an edge of the frame."""
+    x1, y1, x2, y2 = window
+    cut = np.zeros(len(xyxy), dtype=bool)
+    if x1 > 0:
+        cut |= xyxy[:, 0] <= x1 + margin
+    if y1 > 0:
+        cut |= xyxy[:, 1] <= y1 + margin
+    if x2 < width:
+        cut |= xyxy[:, 2] >= x2 - margin
+    if y2 < height:
+        cut |= xyxy[:, 3] >= y2 - margin
+    return cut
+
+
+def region_windows(xyxy, height, width, padding=0.0, min_side=96):
+    """
+    [x1, y1, x2, y2] crops around `xyxy`: each box grown by `padding` (a fraction of
+    its size) to at least min_side, clipped to the frame, overlapping crops merged.
+    """
+    windows = []
+    for x1, y1, x2, y2 in np.asarray(xyxy, dtype=np.float64).reshape(-1, 4):
+        half_w = max((x2 - x1) * (1 + 2 * padding), min_side) / 2
+        half_h = max((y2 - y1) * (1 + 2 * padding), min_side) / 2
+        cx, cy = (x1 + x2) / 2, (y1 + y2) / 2
+        windows.append([max(0, int(cx - half_w)), max(0, int(cy - half_h)),
+                        min(width, int(np.ceil(cx + half_w))), min(height, int(np.ceil(cy + half_h)))])
+
+    # Few windows per frame, so a simple fixpoint merge is enough
+    merged = True
+    while merged:
+        merged = False
+        for i in range(len(windows)):
+            for j in range(i + 1, len(windows)):
+                a, b = windows[i], windows[j]
+                if a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]:
+                    windows[i] = [min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3])]
+                    del windows[j]
+                    merged = True
+                    break
+            if merged:
+                break
+    return windows
+
+
+def window_area(windows):
+    return sum((x2 - x1) * (y2 - y1) for x1, y1, x2, y2 in windows)
+
+
+def merge_boxes(arrays, cut=None, match_threshold=None):
+    """
+    Class-aware greedy non-maximum merging (as in SAHI) of boxes from overlapping tiles
+    and the coarse pass: best box first, every same-class box overlapping it by more
+    than `match_threshold` (intersection over the smaller box, so a partial box cut by
+    a tile edge matches the full one) is folded into it and the union box kept.
+    Boxes flagged in `cut` (truncated by a tile edge, so often misclassified) are folded
+    into an overlapping better box whatever its class.
+    """
+    match_threshold = config.TILE_MATCH_THRESHOLD if match_threshold is None else match_threshold
+    if cut is None:
+        cut = [np.zeros(len(a.conf), dtype=bool) for a in arrays]
+    cut = [c for a, c in zip(arrays, cut) if len(a.conf)]
+    arrays = [a for a in arrays if len(a.conf)]
+    if not arrays:
+        return BoxArrays(np.zeros((0, 4)), np.zeros(0), np.zeros(0, dtype=int))
+    xyxy = np.concatenate([a.xyxy for a in arrays])
+    conf = np.concatenate([a.conf for a in arrays])
+    cls = np.concatenate([a.cls for a in arrays])
+    cut = np.concatenate(cut)
+
+    overlap = intersection_over_smaller(xyxy, xyxy) > match_threshold
+    overlap &= (cls[:, None] == cls[None, :]) | cut[None, :]
+
+    order = np.argsort(-conf, kind="stable")
+    merged = np.zeros(len(conf), dtype=bool)
+    keep_boxes, keep_conf, keep_cls = [], [], []
+    for i in order:
+        if merged[i]:
+            continue
+        group = overlap[i] & ~merged
+        group[i] = True
+        merged |= group
+        members = xyxy[group]
+        keep_boxes.append([members[:, 0].min(), members[:, 1].min(), members[:, 2].max(), members[:, 3].max()])
+        keep_conf.append(conf[i])
+        keep_cls.append(cls[i])
+    return BoxArrays(np.asarray(keep_boxes, dtype=np.float64), np.asarray(keep_conf), np.asarray(keep_cls, dtype=int))
+
+
+class ResolutionPlan:
+    """
+    Which images the YOLO passes run on for one frame, and how their results are mapped
+    back. `inputs` are the images to predict on (any mix of single and batched calls);
+    `combine(per_input_results)` takes one results list per input, in order, and
+    returns a results list for ObjectDetector.merge_results in full-frame coordinates.
+    """
+
+    def __init__(self, image, mode=None):
+        self.mode = mode or config.RESOLUTION_MODE
+        if self.mode not in RESOLUTION_MODES:
+            raise ValueError(f"Unknown resolution mode '{self.mode}'")
+        self.shape = image.shape[:2]
+        self.inputs = [image]
+        self.offsets = [(0, 0)]
+        self.scales = [1.0]
+        self.windows = [None]
+        if self.mode == "full":
+            return
+
+        coarse, factor = downscale(image, config.COARSE_MAX_SIDE)
+        self.inputs = [coarse]
+        self.scales = [factor]
+        if self.mode == "tiled":
+            height, width = image.shape[:2]
+            # Tiling only pays off when the frame is clearly larger than one tile
+            if max(height, width) > config.TILE_SIZE * 1.25:
+                tile = config.TILE_SIZE
+                windows = tile_windows(height, width, tile, config.TILE_OVERLAP)
+                # Bound the cost on very large frames by growing the tiles instead
+                while len(windows) > config.TILE_MAX_TILES:
+                    tile = int(tile * 1.25)
+                    windows = tile_windows(height, width, tile, config.TILE_OVERLAP)
+                for x1, y1, x2, y2 in windows:
+                    self.inputs.append(np.ascontiguousarray(image[y1:y2, x1:x2]))
+                    self.offsets.append((x1, y1))
+                    self.scales.append(1.0)
+                    self.windows.append([x1, y1, x2, y2])
+
+    @property
+    def tiles(self):
+        return len(self.inputs) - 1 if self.mode == "tiled" else 0
+
+    def combine(self, per_input_results):
+        if self.mode == "full":
+            return per_input_results[0]
+        height, width = self.shape
+        arrays, cut = [], []
+        for results, offset, scale, window in zip(per_input_results, self.offsets, self.scales, self.windows):
+            for result in results:
+                array = box_arrays(result, offset, scale)
+                arrays.append(array)
+                if window is None:
+                    cut.append(np.zeros(len(array.conf), dtype=bool))
+                else:
+                    cut.append(cut_by_tile(array.xyxy, window, height, width))
+        if not arrays:
+            return []
+        if len(arrays) == 1:
+            return arrays
+        return [merge_boxes(arrays, cut)]
+
+
+class CropPlan:
+    """
+    Crops of a frame as YOLO inputs (same interface as ResolutionPlan): results are
+    mapped back to frame coordinates and merged across crops like tiles.
+    """
+
+    def __init__(self, image, windows):
+        self.shape = image.shape[:2]
+        self.windows = windows
+        self.inputs = [np.ascontiguousarray(image[y1:y2, x1:x2]) for x1, y1, x2, y2 in windows]
+
+    def combine(self, per_input_results):
+        height, width = self.shape
+        arrays, cut = [], []
+        for results, window in zip(per_input_results, self.windows):
+            for result in results:
+                array = box_arrays(result, offset=(window[0], window[1]))
+                arrays.append(array)
+                cut.append(cut_by_tile(array.xyxy, window, height, width))
+        if not arrays:
+            return []
+        return [merge_boxes(arrays, cut)]
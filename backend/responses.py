@@ -0,0 +1,120 @@
+"""
+Output formats of /detect and /detect/batch (?output=...):
+
+  json     the verbose response: one object per detection (default, RESPONSE_FORMAT)
+  compact  the same content as parallel arrays; repeated strings (class, original
+           class, color, size, description) are sent once in a dictionary and
+           referenced by index, boxes are one flat [x1, y1, x2, y2, ...] array
+  msgpack  the compact form, MessagePack-encoded (application/msgpack; needs msgpack)
+
+Responses are rendered straight to bytes (orjson when installed) instead of going
+through FastAPI's jsonable_encoder.
+"""
+import json
+
+from fastapi import Response
+
+import config
+
+try:
+    import orjson
+except ImportError:  # optional: falls back to the json module
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # optional: only needed for ?output=msgpack
+    msgpack = None
+
+OUTPUT_FORMATS = ("json", "compact", "msgpack")
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+
+# Compact columns: dictionary-encoded (index into a table, -1 if absent) and plain
+DICTIONARY_COLUMNS = ("class", "original_class", "color", "size", "description")
+PLAIN_COLUMNS = ("confidence", "ocr_text", "number_plate")
+
+
+def compact_results(results):
+    """
+    Columnar form of a 'results' list:
+        {"count": N, "box": [x1, y1, x2, y2, ...],
+         "confidence": [...], "ocr_text": [...], "number_plate": [...],
+         "class": [ids], ..., "dictionaries": {"class": [names], ...}}
+    Missing values are null (plain columns) or -1 (dictionary columns).
+    """
+    box = []
+    columns = {name: [] for name in DICTIONARY_COLUMNS + PLAIN_COLUMNS}
+    tables = {name: {} for name in DICTIONARY_COLUMNS}
+    for det in results:
+        box.extend(det['box'])
+        for name in PLAIN_COLUMNS:
+            columns[name].append(det.get(name))
+        for name in DICTIONARY_COLUMNS:
+            value = det.get(name)
+            if value is None:
+                columns[name].append(-1)
+            else:
+                table = tables[name]
+                columns[name].append(table.setdefault(value, len(table)))
+    return {
+        "count": len(results),
+        "box": box,
+        **columns,
+        "dictionaries": {name: list(table) for name, table in tables.items()},
+    }
+
+
+def expand_results(compact):
+    """Inverse of compact_results, for Python clients."""
+    output = []
+    dictionaries = compact["dictionaries"]
+    for i in range(compact["count"]):
+        det = {"box": compact["box"][4 * i:4 * i + 4]}
+        for name in PLAIN_COLUMNS:
+            if compact[name][i] is not None:
+                det[name] = compact[name][i]
+        for name in DICTIONARY_COLUMNS:
+            index = compact[name][i]
+            if index >= 0:
+                det[name] = dictionaries[name][index]
+        output.append(det)
+    return output
+
+
+def compact_response(body):
+    """A /detect response (or a /detect/batch entry) with its results in compact form."""
+    if "results" not in body:
+        return body
+    return {**body, "format": "compact", "results": compact_results(body["results"])}
+
+
+def dumps(body):
+    if orjson is not None:
+        return orjson.dumps(body)
+    return json.dumps(body, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+def render(body, output="json"):
+    """
+    Encodes a response body into a ready Response. For 'compact' / 'msgpack' the
+    body's results should already be compacted (compact_response).
+    """
+    if output == "msgpack":
+        if msgpack is None:
+            raise ValueError("msgpack output needs the msgpack package")
+        return Response(msgpack.packb(body, use_bin_type=True), media_type=MSGPACK_MEDIA_TYPE)
+    return Response(dumps(body), media_type="application/json")
+
+
+def supported(output):
+    """False for formats whose optional encoder is not installed."""
+    return output != "msgpack" or msgpack is not None
+
+
+def negotiate(output, accept=None):
+    """The output format of a request: ?output=..., an Accept of application/msgpack, or RESPONSE_FORMAT."""
+    if output:
+        return output
+    if accept and MSGPACK_MEDIA_TYPE in accept:
+        return "msgpack"
+    return config.RESPONSE_FORMAT
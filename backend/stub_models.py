@@ -0,0 +1,205 @@
+"""
+Deterministic stand-ins for YOLO, the hard-hat YOLO and EasyOCR, used by the offline
+benchmarks (MODEL_BACKEND=stub). They need no weights and no network, and they do
+real image work (OpenCV segmentation) so box and text counts follow the image
+content and every post-processing stage sees realistic input.
+STUB_LATENCY_MS adds a fixed per-image delay to mimic model cost.
+"""
+import time
+
+import cv2
+import numpy as np
+
+import config
+from ocr import OCRProcessor
+
+PERSON_NAMES = {0: 'person', 2: 'car', 7: 'truck', 28: 'suitcase'}
+PPE_NAMES = {0: 'Hardhat', 1: 'NO-Hardhat'}
+
+
+class _Tensor:
+    """Just enough of a torch tensor for the detector: .cpu().numpy()."""
+
+    def __init__(self, array):
+        self._array = array
+
+    def cpu(self):
+        return self
+
+    def numpy(self):
+        return self._array
+
+    def __len__(self):
+        return len(self._array)
+
+
+class StubBoxes:
+    def __init__(self, xyxy, conf, cls):
+        self.xyxy = _Tensor(np.asarray(xyxy, dtype=np.float32).reshape(-1, 4))
+        self.conf = _Tensor(np.asarray(conf, dtype=np.float32))
+        self.cls = _Tensor(np.asarray(cls, dtype=np.float32))
+
+    def __len__(self):
+        return len(self.xyxy)
+
+
+class StubResult:
+    def __init__(self, boxes):
+        self.boxes = boxes
+
+
+def _sleep(latency_ms):
+    if latency_ms:
+        time.sleep(latency_ms / 1000.0)
+
+
+def find_objects(image, min_area=400):
+    """
+    Saturated blobs as object boxes: [x1, y1, x2, y2] and a fill-based confidence.
+    (The synthetic corpus draws objects in saturated colors on a grey background.)
+    """
+    hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
+    mask = cv2.inRange(hsv, (0, 90, 40), (180, 255, 255))
+    mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, np.ones((5, 5), np.uint8))
+    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    boxes, confs = [], []
+    for contour in contours:
+        x, y, w, h = cv2.boundingRect(contour)
+        if w * h < min_area:
+            continue
+        boxes.append([x, y, x + w, y + h])
+        confs.append(0.5 + 0.5 * cv2.contourArea(contour) / float(w * h))
+    return boxes, confs
+
+
+class StubYOLO:
+    """Callable like ultralytics.YOLO: model(image or [images], conf=..., iou=...) -> [results]."""
+
+    names = PERSON_NAMES
+
+    def __init__(self, latency_ms=None):
+        self.latency_ms = config.STUB_LATENCY_MS if latency_ms is None else latency_ms
+
+    def __call__(self, source, conf=0.25, iou=0.7, **kwargs):
+        images = source if isinstance(source, list) else [source]
+        # One forward pass per call, like a batched model
+        _sleep(self.latency_ms)
+        return [self._predict(image, conf) for image in images]
+
+    def _predict(self, image, conf):
+        boxes, confs, classes = [], [], []
+        for box, score in zip(*find_objects(image)):
+            if score < conf:
+                continue
+            x1, y1, x2, y2 = box
+            w, h = x2 - x1, y2 - y1
+            # Tall blobs are people, wide ones vehicles
+            cls = 0 if h > 1.3 * w else (2 if w > 1.3 * h else 28)
+            if cls == 2 and w * h > 0.1 * image.shape[0] * image.shape[1]:
+                cls = 7
+            boxes.append(box)
+            confs.append(score)
+            classes.append(cls)
+        return StubResult(StubBoxes(boxes, confs, classes))
+
+
+class StubFastYOLO(StubYOLO):
+    """The small cascade model: same boxes, but unsure about small objects."""
+
+    def _predict(self, image, conf):
+        result = super()._predict(image, 0.0)
+        xyxy, scores = result.boxes.xyxy.numpy(), result.boxes.conf.numpy()
+        sides = np.minimum(xyxy[:, 2] - xyxy[:, 0], xyxy[:, 3] - xyxy[:, 1])
+        scores = scores * np.clip(sides / 48.0, 0.3, 1.0)
+        keep = scores >= conf
+        return StubResult(StubBoxes(xyxy[keep], scores[keep], result.boxes.cls.numpy()[keep]))
+
+
+class StubPPEYOLO(StubYOLO):
+    """Head boxes on top of every person-shaped blob, alternating Hardhat / NO-Hardhat."""
+
+    names = PPE_NAMES
+
+    def _predict(self, image, conf):
+        boxes, confs, classes = [], [], []
+        person = super()._predict(image, conf).boxes
+        for i, ((x1, y1, x2, y2), cls) in enumerate(zip(person.xyxy.numpy(), person.cls.numpy())):
+            if int(cls) != 0:
+                continue
+            head = 0.2 * (y2 - y1)
+            boxes.append([x1 + 0.2 * (x2 - x1), y1, x2 - 0.2 * (x2 - x1), y1 + head])
+            confs.append(0.8)
+            classes.append(i % 2)
+        return StubResult(StubBoxes(boxes, confs, classes))
+
+
+def find_text_lines(image, max_line_height=120):
+    """
+    Text-line boxes [x1, y1, x2, y2] from gradient + Otsu + horizontal closing, like
+    ocr_planner.scan_text but at full resolution and without the frame-relative height
+    limit, so it also works on the small crops of the gated OCR path.
+    """
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    gradient = cv2.morphologyEx(gray, cv2.MORPH_GRADIENT, cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3)))
+    _, binary = cv2.threshold(gradient, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+    lines = cv2.morphologyEx(binary, cv2.MORPH_CLOSE, cv2.getStructuringElement(cv2.MORPH_RECT, (9, 1)))
+    _, _, stats, _ = cv2.connectedComponentsWithStats(lines, connectivity=8)
+    boxes = []
+    for x, y, w, h, area in stats[1:]:
+        if 6 <= h <= max_line_height and w >= 1.5 * h and area >= 0.45 * w * h:
+            boxes.append([int(x), int(y), int(x + w), int(y + h)])
+    return sorted(boxes, key=lambda b: (b[1], b[0]))
+
+
+def _line_text(index, count):
+    # Receipt-shaped content so ReceiptParser has shop name, items and a total to find
+    if index == 0:
+        return "STUB MART"
+    if index == count - 1:
+        return "TOTAL 42.00"
+    return f"Item {index} {index * 1.25:.2f}"
+
+
+class StubReader:
+    """
+    Stands in for easyocr.Reader: text lines come from find_text_lines, the text is
+    synthetic receipt content.
+    """
+
+    def __init__(self, latency_ms=None):
+        self.latency_ms = config.STUB_LATENCY_MS if latency_ms is None else latency_ms
+
+    def readtext(self, image, **kwargs):
+        _sleep(self.latency_ms)
+        lines = find_text_lines(image)
+        return [
+            ([[x1, y1], [x2, y1], [x2, y2], [x1, y2]], _line_text(i, len(lines)), 0.9)
+            for i, (x1, y1, x2, y2) in enumerate(lines)
+        ]
+
+    def detect(self, image, **kwargs):
+        # EasyOCR layout: ([horizontal boxes as x1, x2, y1, y2], [free-form boxes]) per image
+        _sleep(self.latency_ms / 2)
+        return [[[x1, x2, y1, y2] for x1, y1, x2, y2 in find_text_lines(image)]], [[]]
+
+
+class StubOCRProcessor(OCRProcessor):
+    """OCRProcessor whose batched recognizer is replaced by the stub reader's text."""
+
+    def recognize_batched(self, image, horizontal_list, free_list):
+        _sleep(self.reader.latency_ms / 2)
+        boxes = sorted(horizontal_list, key=lambda b: (b[2], b[0]))
+        return [
+            ([[x1, y1], [x2, y1], [x2, y2], [x1, y2]], _line_text(i, len(boxes)), 0.9)
+            for i, (x1, x2, y1, y2) in enumerate(boxes)
+        ]
+
+
+def register_models(registry):
+    """Registers the stub models under the same names as detector / ocr register_models."""
+    registry.register("person", StubYOLO)
+    registry.register("person_fast", StubFastYOLO, required=False)
+    registry.register("ppe", StubPPEYOLO, required=False)
+    # No ViT: refinement is skipped, as when the ViT weights are unavailable
+    registry.register("vit", lambda: None, required=False)
+    registry.register("ocr", StubReader)
@@ -0,0 +1,170 @@
+import asyncio
+import time
+
+import pytest
+from fastapi import HTTPException
+
+import admission
+from admission import AdmissionController
+
+
+def controller(max_concurrent=1, max_queue=4, service_time=0.01):
+    c = AdmissionController(max_concurrent, max_queue)
+    c._service_time = service_time
+    return c
+
+
+async def settle():
+    # Lets the admission tasks reach their slot or the queue
+    await asyncio.sleep(0.01)
+
+
+async def outcome(c, work, priority="normal", timeout=5.0):
+    try:
+        return await c.run(work, priority=priority, deadline=c.deadline(timeout))
+    except HTTPException as e:
+        return e.status_code
+
+
+def test_waiters_are_admitted_by_priority_then_arrival():
+    order = []
+
+    async def run():
+        c = controller()
+        gate = asyncio.Event()
+
+        def job(name):
+            async def work():
+                order.append(name)
+                if name == "first":
+                    await gate.wait()
+            return work
+
+        first = asyncio.ensure_future(outcome(c, job("first")))
+        await settle()
+        waiting = []
+        for name, priority in [("low", "low"), ("normal-1", "normal"), ("high", "high"), ("normal-2", "normal")]:
+            waiting.append(asyncio.ensure_future(outcome(c, job(name), priority)))
+            await settle()
+        assert c.stats()["queue_depth"] == 4
+        gate.set()
+        await asyncio.gather(first, *waiting)
+        return c.stats()
+
+    stats = asyncio.run(run())
+    assert order == ["first", "high", "normal-1", "normal-2", "low"]
+    assert stats["active"] == 0 and stats["admitted"] == 5
+
+
+def test_full_queue_sheds_lower_priority_or_rejects():
+    async def run():
+        c = controller(max_queue=1)
+        gate = asyncio.Event()
+
+        async def hold():
+            await gate.wait()
+
+        first = asyncio.ensure_future(outcome(c, hold))
+        await settle()
+        low = asyncio.ensure_future(outcome(c, hold, "low"))
+        await settle()
+        # Queue full: a normal request takes the low one's place...
+        normal = asyncio.ensure_future(outcome(c, hold, "normal"))
+        await settle()
+        # ...and another normal one finds nothing to shed
+        rejected = await outcome(c, hold, "normal")
+        gate.set()
+        return rejected, await asyncio.gather(first, low, normal), c.stats()
+
+    rejected, (first, low, normal), stats = asyncio.run(run())
+    assert rejected == 429
+    assert low == 503 and first is None and normal is None
+    assert stats["shed"] == 1 and stats["rejected_full"] == 1 and stats["active"] == 0
+
+
+def test_rejection_carries_retry_after():
+    async def run():
+        c = controller(max_queue=0, service_time=2.5)
+        gate = asyncio.Event()
+
+        async def hold():
+            await gate.wait()
+
+        first = asyncio.ensure_future(outcome(c, hold))
+        await settle()
+        with pytest.raises(HTTPException) as rejected:
+            await c.run(hold)
+        gate.set()
+        await first
+        return rejected.value
+
+    error = asyncio.run(run())
+    assert error.status_code == 429 and error.headers["Retry-After"] == "3"
+
+
+def test_deadlines():
+    async def run():
+        c = controller(service_time=1.0)
+        gate = asyncio.Event()
+
+        async def hold():
+            await gate.wait()
+
+        # Still running at its deadline: cancelled with 504
+        timed_out = await outcome(c, hold, timeout=0.05)
+        first = asyncio.ensure_future(outcome(c, hold))
+        await settle()
+        # Cannot get a slot and finish within 0.5 s at ~1 s per request: 503 up front
+        hopeless = await outcome(c, hold, timeout=0.5)
+        gate.set()
+        await first
+        return timed_out, hopeless, c.stats()
+
+    timed_out, hopeless, stats = asyncio.run(run())
+    assert timed_out == 504 and hopeless == 503
+    assert stats["deadline_exceeded"] == 1 and stats["rejected_deadline"] == 1 and stats["active"] == 0
+
+
+def test_queue_timeout_returns_a_slot_granted_at_the_same_time(monkeypatch):
+    async def run():
+        c = controller()
+        await c._acquire(1, time.monotonic() + 5)  # the slot holder
+        real_wait_for = asyncio.wait_for
+
+        async def racing_wait_for(awaitable, timeout):
+            if isinstance(awaitable, asyncio.Future):
+                # The holder finishes and hands its slot over just as the timeout fires
+                c._release(None)
+                raise asyncio.TimeoutError()
+            return await real_wait_for(awaitable, timeout)
+
+        monkeypatch.setattr(admission.asyncio, "wait_for", racing_wait_for)
+        with pytest.raises(HTTPException) as error:
+            await c._acquire(1, time.monotonic() + 5)
+        return error.value.status_code, c.stats()
+
+    status, stats = asyncio.run(run())
+    assert status == 503 and stats["queue_timeouts"] == 1
+    assert stats["active"] == 0
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    async def run():
+        c = controller()
+        gate = asyncio.Event()
+
+        async def hold():
+            await gate.wait()
+
+        first = asyncio.ensure_future(outcome(c, hold))
+        await settle()
+        waiter = asyncio.ensure_future(outcome(c, hold))
+        await settle()
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        gate.set()
+        await first
+        return c.stats()
+
+    stats = asyncio.run(run())
+    assert stats["active"] == 0 and stats["queue_depth"] == 0
@@ -0,0 +1,99 @@
+import os
+
+import numpy as np
+import pytest
+
+import cache
+import config
+from cache import ResultCache
+
+
+def image(value=0, shape=(4, 6, 3)):
+    return np.full(shape, value, dtype=np.uint8)
+
+
+def test_key_depends_on_pixels_shape_and_request_settings():
+    c = ResultCache(max_entries=4, cache_dir="")
+    key = c.key_for(image(), ((1.0, 1.0), "full", "off"))
+    assert key == c.key_for(image(), ((1.0, 1.0), "full", "off"))
+    assert key != c.key_for(image(1), ((1.0, 1.0), "full", "off"))
+    assert key != c.key_for(image(shape=(6, 4, 3)), ((1.0, 1.0), "full", "off"))
+    assert key != c.key_for(image(), ((1.0, 1.0), "tiled", "off"))
+    # Non-contiguous views hash like their contents
+    wide = np.zeros((4, 12, 3), dtype=np.uint8)
+    assert c.key_for(wide[:, ::2], "x") == c.key_for(image(), "x")
+
+
+@pytest.mark.parametrize("setting, value", [
+    ("OCR_MODE", "full"), ("OCR_BATCH_SIZE", 4), ("COLOR_METHOD", "kmeans"), ("TILE_SIZE", 320),
+    ("COARSE_MAX_SIDE", 640), ("CONF_THRESHOLD", 0.3), ("OCR_CANVAS_SIZE", 1280),
+])
+def test_fingerprint_covers_response_settings(monkeypatch, setting, value):
+    before = cache.model_fingerprint()
+    monkeypatch.setattr(config, setting, value)
+    assert cache.model_fingerprint() != before
+
+
+def test_lru_eviction():
+    c = ResultCache(max_entries=2, ttl=60, cache_dir="")
+    c.put("a", {"n": 1})
+    c.put("b", {"n": 2})
+    assert c.get("a") == {"n": 1}  # 'a' becomes the most recently used
+    c.put("c", {"n": 3})
+    assert c.get("b") is None
+    assert c.get("a") == {"n": 1} and c.get("c") == {"n": 3}
+    stats = c.stats()
+    assert stats["entries"] == 2 and stats["evictions"] == 1 and stats["misses"] == 1
+
+
+def test_ttl_expiry(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache.time, "time", lambda: now[0])
+    c = ResultCache(max_entries=2, ttl=10, cache_dir="")
+    c.put("a", {"n": 1})
+    now[0] += 11
+    assert c.get("a") is None
+    assert c.stats()["entries"] == 0
+
+
+def test_disabled_cache_stores_nothing():
+    c = ResultCache(max_entries=0, cache_dir="")
+    c.put("a", {"n": 1})
+    assert not c.enabled and c.get("a") is None
+
+
+def test_disk_tier_survives_restart_and_is_bounded(tmp_path):
+    c = ResultCache(max_entries=1, ttl=60, cache_dir=str(tmp_path), disk_max_entries=2)
+    for i, key in enumerate("abc"):
+        c.put(key, {"n": i})
+        os.utime(tmp_path / f"{key}.json", (i, i))  # distinct mtimes for the eviction order
+    assert sorted(os.listdir(tmp_path)) == ["b.json", "c.json"]
+
+    restarted = ResultCache(max_entries=1, ttl=60, cache_dir=str(tmp_path), disk_max_entries=2)
+    assert restarted.get("b") == {"n": 1}
+    assert restarted.stats()["disk_hits"] == 1
+    assert restarted.get("b") == {"n": 1}
+    assert restarted.stats()["hits"] == 1  # promoted into memory
+
+
+def test_disk_tier_scans_only_past_its_bound(tmp_path, monkeypatch):
+    for key in "ab":
+        (tmp_path / f"{key}.json").write_text('{"stored_at": 0, "response": {}}')
+        os.utime(tmp_path / f"{key}.json", (0, 0))
+    scans = []
+    real_scandir = os.scandir
+    monkeypatch.setattr(cache.os, "scandir", lambda path: scans.append(path) or real_scandir(path))
+
+    c = ResultCache(max_entries=1, ttl=60, cache_dir=str(tmp_path), disk_max_entries=20)
+    assert len(scans) == 1  # seeded once at startup, existing files included
+    for i in range(18):
+        c.put(f"k{i}", {"n": i})
+        os.utime(tmp_path / f"k{i}.json", (i + 1, i + 1))  # distinct mtimes for the eviction order
+    assert len(scans) == 1 and len(os.listdir(tmp_path)) == 20
+
+    # Past the bound: one scan trims the oldest files to a tenth below it
+    c.put("k18", {"n": 18})
+    assert len(scans) == 2
+    assert sorted(os.listdir(tmp_path)) == sorted(f"k{i}.json" for i in range(1, 19))
+    c.put("k19", {"n": 19})
+    assert len(scans) == 2
@@ -0,0 +1,121 @@
+import cv2
+import numpy as np
+import pytest
+
+import camera_gate
+import config
+from camera_gate import FULL, REGION, REUSE, CameraGate
+from detections import DetectionSet
+
+HEIGHT, WIDTH = 480, 640
+
+
+@pytest.fixture
+def frame():
+    rng = np.random.default_rng(0)
+    image = cv2.resize(rng.integers(0, 255, (24, 32, 3), dtype=np.uint8), (WIDTH, HEIGHT))
+    return image
+
+
+def changed(frame, x1, y1, x2, y2, value=255):
+    image = frame.copy()
+    image[y1:y2, x1:x2] = value
+    return image
+
+
+def seeded_gate(frame, detections=None, texts=None):
+    gate = CameraGate(max_cameras=4, ttl=600)
+    plan = gate.plan("cam", frame)
+    assert plan.path == FULL and plan.reason == "new" and plan.inputs[0] is frame
+    detections = detections if detections is not None else DetectionSet([[10, 10, 60, 60], [300, 200, 360, 260]])
+    texts = texts if texts is not None else [{'box': [500, 400, 560, 420], 'ocr_text': 'A'}]
+    gate.update("cam", plan, detections, texts, {"results": "first"})
+    return gate
+
+
+def test_unchanged_frame_is_reused(frame):
+    gate = seeded_gate(frame)
+    plan = gate.plan("cam", frame.copy())
+    assert plan.path == REUSE and plan.inputs == []
+    detections, texts = plan.combine([])
+    assert len(detections) == 2 and texts[0]['ocr_text'] == 'A'
+
+
+def test_uniform_exposure_change_is_ignored(frame):
+    gate = seeded_gate(frame)
+    brighter = np.clip(frame.astype(np.int16) + 15, 0, 255).astype(np.uint8)
+    assert gate.plan("cam", brighter).path == REUSE
+
+
+def test_settings_change_forces_full(frame):
+    gate = seeded_gate(frame)
+    plan = gate.plan("cam", frame, key=("tiled", "off"))
+    assert plan.path == FULL and plan.reason == "settings"
+
+
+def test_refresh_after_interval(frame, monkeypatch):
+    gate = seeded_gate(frame)
+    now = camera_gate.time.time()
+    monkeypatch.setattr(camera_gate.time, "time", lambda: now + config.CAMERA_REFRESH_SECONDS + 1)
+    plan = gate.plan("cam", frame)
+    assert plan.path == FULL and plan.reason == "refresh"
+
+
+def test_large_change_forces_full(frame):
+    gate = seeded_gate(frame)
+    plan = gate.plan("cam", changed(frame, 0, 0, WIDTH, HEIGHT // 2))
+    assert plan.path == FULL and plan.reason == "change"
+
+
+def test_local_change_reanalyses_a_region(frame):
+    gate = seeded_gate(frame)
+    image = changed(frame, 310, 210, 350, 250)
+    plan = gate.plan("cam", image)
+    assert plan.path == REGION and len(plan.windows) == 1
+    x1, y1, x2, y2 = plan.windows[0]
+    # Grown over the previous box the change touches, and the crop is that part of the frame
+    assert x1 <= 300 and y1 <= 200 and x2 >= 360 and y2 >= 260
+    assert np.array_equal(plan.inputs[0], image[y1:y2, x1:x2])
+
+    # A new object in the middle of the crop (crop coordinates)
+    cx, cy = (x2 - x1) // 2, (y2 - y1) // 2
+    crop_detections = DetectionSet([[cx - 10, cy - 10, cx + 10, cy + 10]])
+    crop_texts = [{'box': [cx - 5, cy - 5, cx + 5, cy + 5], 'ocr_text': 'B'}]
+    detections, texts = plan.combine([(crop_detections, crop_texts)])
+
+    # The untouched previous box stays, the replaced one is gone, the new one is in frame coordinates
+    assert sorted(detections.boxes.tolist()) == sorted([
+        [10, 10, 60, 60], [x1 + cx - 10, y1 + cy - 10, x1 + cx + 10, y1 + cy + 10],
+    ])
+    assert [t['ocr_text'] for t in texts] == ['A', 'B']
+    assert texts[1]['box'] == [x1 + cx - 5, y1 + cy - 5, x1 + cx + 5, y1 + cy + 5]
+
+    gate.update("cam", plan, detections, texts, {"results": "second"})
+    assert gate.plan("cam", image).path == REUSE
+
+
+def test_box_cut_by_the_crop_edge_escalates(frame):
+    gate = seeded_gate(frame)
+    image = changed(frame, 310, 210, 350, 250)
+    plan = gate.plan("cam", image)
+    x1, y1, x2, y2 = plan.windows[0]
+    # Reaches the crop's left edge (not a frame edge): only part of the object was seen
+    cut = DetectionSet([[0, 10, 20, 30]])
+    assert x1 > 0
+    assert plan.combine([(cut, [])]) is None
+
+    plan.escalate(image)
+    assert plan.path == FULL and plan.reason == "cut" and plan.inputs[0] is image
+
+
+def test_lru_eviction_and_ttl(frame, monkeypatch):
+    gate = CameraGate(max_cameras=2, ttl=100)
+    for camera in ("a", "b", "c"):
+        plan = gate.plan(camera, frame)
+        gate.update(camera, plan, DetectionSet(), [], {})
+    assert gate.stats()["cameras"] == 2 and gate.stats()["evictions"] == 1
+    assert gate.plan("a", frame).reason == "new"
+
+    now = camera_gate.time.time()
+    monkeypatch.setattr(camera_gate.time, "time", lambda: now + 101)
+    assert gate.stats()["cameras"] == 0
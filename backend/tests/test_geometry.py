@@ -0,0 +1,52 @@
+import numpy as np
+
+from geometry import centers_inside, intersection_areas, intersection_over_a, intersection_over_smaller, iou_matrix
+
+
+def scalar_iou(a, b):
+    x1, y1 = max(a[0], b[0]), max(a[1], b[1])
+    x2, y2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0, x2 - x1) * max(0, y2 - y1)
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union else 0.0
+
+
+def random_boxes(rng, count):
+    xy = rng.integers(0, 200, (count, 2))
+    wh = rng.integers(1, 80, (count, 2))
+    return np.concatenate([xy, xy + wh], axis=1).tolist()
+
+
+def test_iou_matrix_matches_scalar():
+    rng = np.random.default_rng(0)
+    a, b = random_boxes(rng, 30), random_boxes(rng, 20)
+    expected = [[scalar_iou(x, y) for y in b] for x in a]
+    np.testing.assert_allclose(iou_matrix(a, b), expected)
+
+
+def test_intersections():
+    a = [[0, 0, 10, 10]]
+    b = [[5, 5, 15, 15], [20, 20, 30, 30], [0, 0, 2, 5]]
+    np.testing.assert_array_equal(intersection_areas(a, b), [[25, 0, 10]])
+    np.testing.assert_allclose(intersection_over_a(a, b), [[0.25, 0, 0.1]])
+    np.testing.assert_allclose(intersection_over_smaller(a, b), [[0.25, 0, 1.0]])
+
+
+def test_zero_area_boxes_give_zero():
+    a = [[5, 5, 5, 5]]
+    b = [[0, 0, 10, 10], [5, 5, 5, 5]]
+    np.testing.assert_array_equal(iou_matrix(a, b), [[0, 0]])
+    np.testing.assert_array_equal(intersection_over_a(a, b), [[0, 0]])
+    np.testing.assert_array_equal(intersection_over_smaller(a, b), [[0, 0]])
+
+
+def test_empty_sets():
+    assert iou_matrix([], [[0, 0, 1, 1]]).shape == (0, 1)
+    assert centers_inside([[0, 0, 1, 1]], []).shape == (1, 0)
+
+
+def test_centers_inside_is_strict():
+    a = [[0, 0, 10, 10]]
+    # Centers at (5, 5), on the edge (10, 5), and outside (15, 5)
+    b = [[4, 4, 6, 6], [8, 4, 12, 6], [14, 4, 16, 6]]
+    np.testing.assert_array_equal(centers_inside(a, b), [[True, False, False]])
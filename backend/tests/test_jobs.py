@@ -0,0 +1,182 @@
+import asyncio
+import json
+import os
+
+import cv2
+import numpy as np
+import pytest
+
+import jobs
+from jobs import Job, JobManager
+
+
+async def call(func, *args):
+    return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+
+@pytest.fixture
+def images(tmp_path):
+    paths = []
+    for i in range(12):
+        path = str(tmp_path / f"{i:02d}.png")
+        cv2.imwrite(path, np.full((8, 8, 3), i, dtype=np.uint8))
+        paths.append(path)
+    return paths
+
+
+def manager(tmp_path, analyze=None, **kwargs):
+    async def default_analyze(image, scale):
+        await asyncio.sleep(0.01)
+        return {"mean": float(image.mean())}
+
+    kwargs.setdefault("concurrency", 2)
+    kwargs.setdefault("queue_size", 2)
+    kwargs.setdefault("max_running", 1)
+    return JobManager(analyze or default_analyze, call, root=str(tmp_path / "jobs"), **kwargs)
+
+
+def saved_state(job):
+    with open(os.path.join(job.dir, "job.json")) as f:
+        return json.load(f)["state"]
+
+
+def result_indices(job):
+    with open(job.results_path) as f:
+        return sorted(json.loads(line)["index"] for line in f)
+
+
+def test_job_completes(tmp_path, images):
+    async def run():
+        m = manager(tmp_path)
+        job = m.start(m.create(images, "paths"))
+        await job.task
+        return job
+
+    job = asyncio.run(run())
+    assert job.state == "completed" and saved_state(job) == "completed"
+    assert job.processed == len(images) and job.failed == 0
+    assert result_indices(job) == list(range(len(images)))
+
+
+def test_cancel_while_queued_is_saved_and_resumable(tmp_path, images):
+    async def run():
+        m = manager(tmp_path)
+        first = m.start(m.create(images, "paths"))
+        second = m.start(m.create(images, "paths"))
+        await asyncio.sleep(0.02)
+        m.cancel(second.id)
+        await asyncio.wait([second.task])
+        state = (second.state, saved_state(second))
+        m.resume(second.id)
+        await asyncio.gather(first.task, second.task)
+        return state, second
+
+    (state, saved), job = asyncio.run(run())
+    assert state == "cancelled" and saved == "cancelled"
+    assert job.state == "completed"
+
+
+def test_resume_continues_where_cancel_stopped(tmp_path, images):
+    async def run():
+        m = manager(tmp_path)
+        job = m.start(m.create(images, "paths"))
+        while job.processed < 3:
+            await asyncio.sleep(0.005)
+        m.cancel(job.id)
+        await asyncio.wait([job.task])
+        done = len(result_indices(job))
+        m.resume(job.id)
+        await job.task
+        return done, job
+
+    done, job = asyncio.run(run())
+    assert 3 <= done < len(images)
+    assert job.state == "completed"
+    assert result_indices(job) == list(range(len(images)))  # nothing processed twice
+
+
+def test_writer_failure_fails_the_job(tmp_path, images, monkeypatch):
+    def broken_append(handle, line):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(jobs, "_append_line", broken_append)
+
+    async def run():
+        m = manager(tmp_path, queue_size=1)
+        job = m.start(m.create(images, "paths"))
+        await asyncio.wait_for(job.task, 5)
+        return job
+
+    job = asyncio.run(run())
+    assert job.state == "failed" and job.error == "disk full"
+    assert saved_state(job) == "failed"
+
+
+def test_unreadable_images_are_recorded(tmp_path, images):
+    (tmp_path / "broken.png").write_bytes(b"not an image")
+
+    async def run():
+        m = manager(tmp_path)
+        job = m.start(m.create(images[:2] + [str(tmp_path / "broken.png")], "paths"))
+        await job.task
+        return job
+
+    job = asyncio.run(run())
+    assert job.state == "completed" and job.processed == 3 and job.failed == 1
+
+
+def test_completed_indices_drops_a_torn_line(tmp_path, images):
+    job = Job.create(str(tmp_path), images, "paths")
+    with open(job.results_path, "w") as f:
+        f.write('{"index": 0, "filename": "a"}\n{"index": 1, "error": "x"}\n{"index": 2, "fil')
+    done, failed = job.completed_indices()
+    assert done == {0, 1} and failed == 1
+    with open(job.results_path) as f:
+        assert len(f.readlines()) == 2
+
+
+def test_results_of_a_running_job_are_whole_lines(tmp_path, images):
+    async def run():
+        m = manager(tmp_path)
+        job = m.start(m.create(images, "paths"))
+        snapshots = []
+        while job.state != "completed":
+            snapshots.append((job.state, job.results_snapshot()))
+            await asyncio.sleep(0.005)
+        return job, snapshots
+
+    job, snapshots = asyncio.run(run())
+    assert any(state == "running" and data for state, data in snapshots)
+    for _, data in snapshots:
+        assert data == b"" or data.endswith(b"\n")
+        assert all(json.loads(line)["index"] in range(len(images)) for line in data.splitlines())
+    assert len(job.results_snapshot().splitlines()) == len(images)
+
+
+def test_results_snapshot_leaves_out_a_partial_line(tmp_path, images):
+    job = Job.create(str(tmp_path), images, "paths")
+    assert job.results_snapshot() == b""
+    with open(job.results_path, "w") as f:
+        f.write('{"index": 0, "filename": "a"}\n{"index": 1, "fil')
+    assert job.results_snapshot() == b'{"index": 0, "filename": "a"}\n'
+
+
+def test_resume_all_restarts_active_jobs(tmp_path, images):
+    root = tmp_path / "jobs"
+    os.makedirs(root)
+    running = Job.create(str(root), images, "paths")
+    running.state = "running"
+    running.save()
+    cancelled = Job.create(str(root), images, "paths")
+    cancelled.state = "cancelled"
+    cancelled.save()
+
+    async def run():
+        m = manager(tmp_path)
+        m.resume_all()
+        await m.get(running.id).task
+        return m
+
+    m = asyncio.run(run())
+    assert m.get(running.id).state == "completed"
+    assert m.get(cancelled.id).state == "cancelled" and m.get(cancelled.id).task is None
@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+
+from receipt_parser import ReceiptParser
+
+
+def receipt(lines, scale=1.0, x_jitter=0):
+    """Text detections for `lines` of words; each word a box of `scale` x the base text size."""
+    height = 20 * scale
+    detections = []
+    for row, words in enumerate(lines):
+        x = 10 * scale
+        # Slight baseline wobble within a line, as on a photographed receipt
+        y = row * 30 * scale + (3 * scale if row % 2 else 0)
+        for i, word in enumerate(words):
+            width = 12 * scale * len(word)
+            wobble = (-1) ** i * 2 * scale
+            detections.append({
+                'box': [x + x_jitter, y + wobble, x + width + x_jitter, y + wobble + height],
+                'ocr_text': word,
+            })
+            x += width + 8 * scale
+    return detections
+
+
+LINES = [
+    ["CORNER", "MARKET"],
+    ["12/03/2024", "12:30"],
+    ["MILK", "2.49"],
+    ["BREAD", "x2", "3.10"],
+    ["TOTAL", "5.59"],
+]
+
+
+@pytest.mark.parametrize("scale", [0.5, 1.0, 3.0])
+def test_reconstructs_lines_at_any_text_scale(scale):
+    detections = receipt(LINES, scale)
+    # OCR output order is arbitrary
+    shuffled = [detections[i] for i in np.random.default_rng(0).permutation(len(detections))]
+    assert ReceiptParser().line_texts(shuffled) == [" ".join(words) for words in LINES]
+
+
+def test_parse_fields():
+    bill = ReceiptParser().parse(receipt(LINES))
+    assert bill == {
+        "shop_name": "CORNER MARKET",
+        "items": ["MILK 2.49", "BREAD x2 3.10", "TOTAL 5.59"],
+        "total": "5.59",
+    }
+
+
+def test_shop_name_skips_dates_and_short_lines():
+    bill = ReceiptParser().parse(receipt([["12/03"], ["A"], ["CAFE", "NOIR"], ["TOTAL", "1.00"]]))
+    assert bill["shop_name"] == "CAFE NOIR"
+
+
+def test_total_without_amount_returns_the_line():
+    assert ReceiptParser().parse(receipt([["SHOP"], ["TOTAL", "DUE"]]))["total"] == "TOTAL DUE"
+
+
+def test_empty_input():
+    assert ReceiptParser().parse([]) is None
+
+
+def test_group_lines_orders_left_to_right_with_negative_coordinates():
+    boxes = [[50, 0, 60, 10], [-20, 1, -10, 11], [0, 30, 10, 40]]
+    line_ids, order = ReceiptParser().group_lines(boxes)
+    assert line_ids.tolist() == [0, 0, 1]
+    assert order.tolist() == [1, 0, 2]
+
+
+def test_parse_many_matches_parse():
+    parser = ReceiptParser()
+    receipts = [receipt(LINES), receipt(LINES[:2], 2.0), []]
+    assert parser.parse_many(receipts) == [parser.parse(r) for r in receipts]
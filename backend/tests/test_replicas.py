@@ -0,0 +1,49 @@
+import pytest
+
+pytest.importorskip("torch")
+pytest.importorskip("easyocr")
+pytest.importorskip("transformers")
+pytest.importorskip("ultralytics")
+
+import config
+import replicas
+
+
+class FakeReplica:
+    def __init__(self, index, cores, threads, registry=None):
+        self.index = index
+        self.cores = cores
+        self.threads = threads
+
+
+@pytest.fixture
+def budgets(monkeypatch):
+    calls = []
+    monkeypatch.setattr(replicas, "available_cores", lambda: list(range(8)))
+    monkeypatch.setattr(replicas.torch, "set_num_threads", calls.append)
+    monkeypatch.setattr(replicas, "ThreadReplica", FakeReplica)
+    monkeypatch.setattr(replicas, "ProcessReplica", FakeReplica)
+    monkeypatch.setattr(config, "REPLICAS", 4)
+    return calls
+
+
+def test_core_slices_split_the_host():
+    assert replicas.core_slices(1) == [replicas.available_cores()]
+
+
+@pytest.mark.parametrize("mode", ["thread", "process"])
+def test_thread_budget_is_one_core_slice(monkeypatch, budgets, mode):
+    monkeypatch.setattr(config, "REPLICA_MODE", mode)
+    monkeypatch.setattr(config, "REPLICA_THREADS", 0)
+    pool = replicas.create_replica_pool()
+    assert [r.cores for r in pool.replicas] == [[0, 1], [2, 3], [4, 5], [6, 7]]
+    assert [r.threads for r in pool.replicas] == [2, 2, 2, 2]
+    # Thread replicas set the process-wide budget once; process replicas set it in their worker
+    assert budgets == ([2] if mode == "thread" else [])
+
+
+def test_configured_thread_budget_wins(monkeypatch, budgets):
+    monkeypatch.setattr(config, "REPLICA_MODE", "thread")
+    monkeypatch.setattr(config, "REPLICA_THREADS", 3)
+    pool = replicas.create_replica_pool()
+    assert budgets == [3] and all(r.threads == 3 for r in pool.replicas)
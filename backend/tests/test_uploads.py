@@ -0,0 +1,51 @@
+import cv2
+import numpy as np
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+from starlette.formparsers import MultiPartParser
+
+import config
+from uploads import UploadLimitMiddleware, decode_image, read_upload
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.add_middleware(UploadLimitMiddleware, max_bytes=4 * 1024 * 1024)
+
+    @app.post("/upload")
+    async def upload(request: Request):
+        file = await read_upload(request)
+        data = await file.read()
+        return {"filename": file.filename, "size": len(data), "in_memory": not file.file._rolled}
+
+    return TestClient(app)
+
+
+def test_upload_is_kept_in_memory(client, monkeypatch):
+    monkeypatch.setattr(config, "MAX_UPLOAD_BYTES", 4 * 1024 * 1024)
+    data = b"x" * (2 * 1024 * 1024)
+    response = client.post("/upload", files={"file": ("big.jpg", data, "image/jpeg")})
+    assert response.json() == {"filename": "big.jpg", "size": len(data), "in_memory": True}
+    # Only that request's parser: the Starlette default other routes use is untouched
+    assert MultiPartParser.spool_max_size == 1024 * 1024
+
+
+def test_bad_uploads(client):
+    assert client.post("/upload", files={"name": (None, "x")}).status_code == 422
+    assert client.post("/upload", content=b"raw", headers={"content-type": "image/jpeg"}).status_code == 422
+    assert client.post("/upload").status_code == 422
+    broken = client.post("/upload", content=b"raw", headers={"content-type": "multipart/form-data"})
+    assert broken.status_code == 400
+    too_large = client.post("/upload", files={"file": ("big.jpg", b"x" * (5 * 1024 * 1024), "image/jpeg")})
+    assert too_large.status_code == 413
+
+
+def test_decode_image():
+    image = np.zeros((400, 600, 3), dtype=np.uint8)
+    image[100:200, 100:300] = 255
+    data = cv2.imencode(".png", image)[1].tobytes()
+    decoded, scale = decode_image(data)
+    assert decoded.shape == image.shape and scale == (1.0, 1.0)
+    assert decode_image(b"not an image")[0] is None
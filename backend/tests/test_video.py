@@ -0,0 +1,179 @@
+import asyncio
+import io
+import json
+import os
+
+import cv2
+import numpy as np
+import pytest
+
+from detections import CLASSES, DetectionSet
+from video import BoxTracker, open_capture, remove_file, save_upload, stream_detections
+
+FRAMES, WIDTH, HEIGHT = 12, 160, 120
+
+
+@pytest.fixture
+def clip(tmp_path):
+    path = str(tmp_path / "clip.avi")
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), 10.0, (WIDTH, HEIGHT))
+    if not writer.isOpened():
+        pytest.skip("no MJPG encoder in this OpenCV build")
+    for i in range(FRAMES):
+        frame = np.zeros((HEIGHT, WIDTH, 3), dtype=np.uint8)
+        cv2.putText(frame, str(i), (60, 70), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
+        writer.write(frame)
+    writer.release()
+    return path
+
+
+def detection(box, name="person"):
+    return {'box': box, 'class': name}
+
+
+def moving_person(frames):
+    """A detector whose single person moves 2 px right per frame; records what it saw."""
+    def detect(frame):
+        frames.append(frame.shape)
+        x = 10 + 2 * (len(frames) - 1) * 4
+        return DetectionSet([[x, 20, x + 30, 80]], class_ids=CLASSES.ids(["person"]))
+    return detect
+
+
+async def call(func, *args):
+    return func(*args)
+
+
+async def collect_raw(stream):
+    return [line async for line in stream]
+
+
+async def collect(stream):
+    return [json.loads(line) for line in await collect_raw(stream)]
+
+
+def test_stride_and_keyframes(clip):
+    seen = []
+    records = asyncio.run(collect(stream_detections(open_capture(clip), moving_person(seen), call, stride=4)))
+    frames, end = records[:-1], records[-1]
+    assert [r["frame"] for r in frames] == list(range(FRAMES))
+    assert [r["keyframe"] for r in frames] == [i % 4 == 0 for i in range(FRAMES)]
+    # Only keyframes are decoded and detected
+    assert seen == [(HEIGHT, WIDTH, 3)] * 3
+    assert end["done"] and end["frames"] == FRAMES and end["keyframes"] == 3 and end["stride"] == 4
+    assert end["source_fps"] == pytest.approx(10.0)
+    assert frames[5]["timestamp_ms"] == 500.0
+
+
+def test_skipped_frames_carry_propagated_boxes(clip):
+    records = asyncio.run(collect(stream_detections(open_capture(clip), moving_person([]), call, stride=4)))
+    boxes = [r["results"][0]["box"] for r in records[:-1]]
+    # Keyframes 0 and 4 see x1 = 10 and 18; from then on the track moves 2 px per frame
+    assert boxes[0] == [10, 20, 40, 80] and boxes[4] == [18, 20, 48, 80]
+    assert boxes[5] == [20, 20, 50, 80] and boxes[7] == [24, 20, 54, 80]
+    assert all(r["results"][0].get("tracked") for r in records[5:8])
+    assert len({r["results"][0]["track_id"] for r in records[:-1]}) == 1
+
+
+def test_max_frames_and_sse(clip):
+    lines = asyncio.run(collect_raw(stream_detections(
+        open_capture(clip), moving_person([]), call, stride=2, fmt="sse", max_frames=3,
+    )))
+    assert [line.split("\n")[0] for line in lines] == ["event: frame"] * 3 + ["event: end"]
+    assert json.loads(lines[-1].split("data: ")[1])["frames"] == 3
+
+
+def test_track_ids_are_stable_and_tracks_expire():
+    tracker = BoxTracker(max_misses=1)
+    first = tracker.update([detection([0, 0, 10, 10]), detection([50, 50, 60, 60], "car")], 0)
+    assert [d['track_id'] for d in first] == [1, 2]
+
+    # Both objects moved a little: same ids, in any detection order
+    second = tracker.update([detection([52, 50, 62, 60], "car"), detection([1, 0, 11, 10])], 5)
+    assert [d['track_id'] for d in second] == [2, 1]
+
+    # A different class at the same place starts a new track
+    third = tracker.update([detection([1, 0, 11, 10], "car")], 10)
+    assert third[0]['track_id'] == 3
+    # Missed tracks are kept (but not drawn) for max_misses keyframes...
+    assert {t.track_id for t in tracker.tracks} == {1, 2, 3}
+    assert [d['track_id'] for d in tracker.predict(11, 100, 100)] == [3]
+    # ...then dropped
+    tracker.update([detection([1, 0, 11, 10], "car")], 15)
+    assert [t.track_id for t in tracker.tracks] == [3]
+
+
+def test_predict_clips_to_the_frame():
+    tracker = BoxTracker()
+    tracker.update([detection([70, 0, 90, 10])], 0)
+    tracker.update([detection([75, 0, 95, 10])], 1)
+    assert tracker.predict(3, 100, 100)[0]['box'] == [85, 0, 100, 10]
+    # Moved out of the frame entirely
+    assert tracker.predict(6, 100, 100) == []
+
+
+def test_spooled_upload_is_removed_on_close(clip):
+    with open(clip, "rb") as f:
+        path = save_upload(io.BytesIO(f.read()), ".avi")
+    assert os.path.exists(path)
+
+    async def run():
+        stream = stream_detections(open_capture(path), moving_person([]), call, on_close=lambda: remove_file(path))
+        # The client goes away after the first frame
+        await stream.__anext__()
+        await stream.aclose()
+
+    asyncio.run(run())
+    assert not os.path.exists(path)
+    remove_file(path)  # a second cleanup is harmless
+
+
+@pytest.fixture(scope="module")
+def app_main():
+    for module in ("torch", "easyocr", "transformers", "ultralytics", "httpx"):
+        pytest.importorskip(module)
+    import config
+    backend = config.MODEL_BACKEND
+    # Weight-free models: only the endpoint's plumbing is under test
+    config.MODEL_BACKEND = "stub"
+    try:
+        import main
+    finally:
+        config.MODEL_BACKEND = backend
+    return main
+
+
+@pytest.fixture
+def spooled(app_main, monkeypatch):
+    paths = []
+
+    def recording_save_upload(fileobj, suffix=".mp4"):
+        paths.append(save_upload(fileobj, suffix))
+        return paths[-1]
+
+    monkeypatch.setattr(app_main, "save_upload", recording_save_upload)
+    monkeypatch.setattr(app_main.detector, "detect", moving_person([]))
+    return paths
+
+
+def test_video_endpoint_streams_and_removes_the_upload(app_main, spooled, clip):
+    from fastapi.testclient import TestClient
+
+    with open(clip, "rb") as f:
+        response = TestClient(app_main.app).post(
+            "/detect/video?stride=4", files={"file": ("clip.avi", f, "video/x-msvideo")},
+        )
+    assert response.status_code == 200
+    records = [json.loads(line) for line in response.text.splitlines()]
+    assert records[-1]["frames"] == FRAMES and records[-1]["keyframes"] == 3
+    assert spooled and not os.path.exists(spooled[0])
+
+
+def test_video_endpoint_removes_an_unreadable_upload(app_main, spooled):
+    from fastapi.testclient import TestClient
+
+    response = TestClient(app_main.app).post(
+        "/detect/video", files={"file": ("clip.avi", b"not a video", "video/x-msvideo")},
+    )
+    assert response.status_code == 400
+    assert spooled and not os.path.exists(spooled[0])
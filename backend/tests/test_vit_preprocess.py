@@ -0,0 +1,22 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("torch")
+transformers = pytest.importorskip("transformers")
+pytest.importorskip("ultralytics")
+
+from detector import vit_pixel_values
+
+
+def test_batch_matches_per_roi_processor():
+    processor = transformers.ViTImageProcessor()
+    rng = np.random.default_rng(0)
+    rois = [
+        rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+        for height, width in [(37, 81), (224, 224), (3, 50), (400, 120), (1, 1)]
+    ]
+    batch = vit_pixel_values(processor, rois).numpy()
+    assert batch.shape == (len(rois), 3, 224, 224)
+    for roi, pixel_values in zip(rois, batch):
+        expected = processor(images=roi, return_tensors="pt", input_data_format="channels_last").pixel_values
+        np.testing.assert_allclose(pixel_values, expected[0].numpy(), atol=1e-5)
@@ -0,0 +1,276 @@
+import bisect
+import contextvars
+import threading
+import time
+
+import config
+
+# Histogram buckets: stage latencies in seconds, per-request counts (boxes, ViT calls, ...)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+# The trace of the request being handled. The inference executor copies the context
+# into its worker threads, so stages timed there land on the right request.
+_current = contextvars.ContextVar("trace", default=None)
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus sense."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    """
+    Process-wide metrics: per-stage latency histograms, per-request count histograms,
+    running totals and request latency per path. Rendered in the Prometheus text
+    exposition format by `render()`; extra gauges / counters (cache, batchers, ...) come
+    from collector callbacks returning (name, labels, value, type) tuples.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stage_seconds = {}
+        self.request_seconds = {}
+        self.per_request = {}
+        self.totals = {}
+        self.requests = {}
+        self.collectors = []
+
+    def observe_stage(self, name, seconds):
+        with self._lock:
+            histogram = self.stage_seconds.get(name)
+            if histogram is None:
+                histogram = self.stage_seconds[name] = Histogram(LATENCY_BUCKETS)
+            histogram.observe(seconds)
+
+    def add_total(self, name, value):
+        with self._lock:
+            self.totals[name] = self.totals.get(name, 0) + value
+
+    def observe_request(self, path, trace, seconds):
+        with self._lock:
+            self.requests[path] = self.requests.get(path, 0) + 1
+            histogram = self.request_seconds.get(path)
+            if histogram is None:
+                histogram = self.request_seconds[path] = Histogram(LATENCY_BUCKETS)
+            histogram.observe(seconds)
+            for name, value in trace.counts.items():
+                histogram = self.per_request.get(name)
+                if histogram is None:
+                    histogram = self.per_request[name] = Histogram(COUNT_BUCKETS)
+                histogram.observe(value)
+
+    def add_collector(self, collector):
+        self.collectors.append(collector)
+
+    def render(self):
+        lines = []
+        with self._lock:
+            _render_histograms(lines, "detect_stage_seconds", "Time spent per pipeline stage.",
+                               "stage", self.stage_seconds)
+            _render_histograms(lines, "http_request_seconds", "Request latency per path.",
+                               "path", self.request_seconds)
+            _render_histograms(lines, "detect_per_request", "Per-request counts (boxes, ViT calls, OCR boxes).",
+                               "name", self.per_request)
+            _render_family(lines, "http_requests_total", "counter", "Traced requests per path.",
+                           [({"path": path}, value) for path, value in sorted(self.requests.items())])
+            _render_family(lines, "detect_items_total", "counter", "Running totals of the per-request counts.",
+                           [({"name": name}, value) for name, value in sorted(self.totals.items())])
+
+        families = {}
+        for collector in self.collectors:
+            try:
+                samples = list(collector())
+            except Exception as e:
+                print(f"Warning: Metrics collector failed: {e}")
+                continue
+            for name, labels, value, kind in samples:
+                families.setdefault((name, kind), []).append((labels, value))
+        for (name, kind), samples in families.items():
+            _render_family(lines, name, kind, None, samples)
+        return "\n".join(lines) + "\n"
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    parts = []
+    for key, value in labels.items():
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        parts.append(f'{key}="{value}"')
+    return "{" + ",".join(parts) + "}"
+
+
+def _render_family(lines, name, kind, help_text, samples):
+    if not samples:
+        return
+    if help_text:
+        lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} {kind}")
+    for labels, value in samples:
+        lines.append(f"{name}{_labels(labels)} {float(value):g}")
+
+
+def _render_histograms(lines, name, help_text, label, histograms):
+    if not histograms:
+        return
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} histogram")
+    for key in sorted(histograms):
+        histogram = histograms[key]
+        cumulative = 0
+        for bound, count in zip(list(histogram.buckets) + ["+Inf"], histogram.counts):
+            cumulative += count
+            le = bound if bound == "+Inf" else f"{bound:g}"
+            lines.append(f"{name}_bucket{_labels({label: key, 'le': le})} {cumulative}")
+        lines.append(f"{name}_sum{_labels({label: key})} {histogram.sum:g}")
+        lines.append(f"{name}_count{_labels({label: key})} {histogram.count}")
+
+
+metrics = MetricsRegistry()
+
+
+class Trace:
+    """Stage timings (summed if a stage repeats) and counts of one request."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = time.perf_counter()
+        self.stages = {}
+        self.counts = {}
+
+    def add_stage(self, name, seconds):
+        with self._lock:
+            self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def add_count(self, name, value):
+        with self._lock:
+            self.counts[name] = self.counts.get(name, 0) + value
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                "total_ms": round(self.elapsed() * 1000, 2),
+                "stages_ms": {name: round(seconds * 1000, 2) for name, seconds in self.stages.items()},
+                "counts": dict(self.counts),
+            }
+
+    def server_timing(self):
+        """Value for the standard Server-Timing response header (shown by browser devtools)."""
+        with self._lock:
+            parts = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in self.stages.items()]
+        parts.append(f"total;dur={self.elapsed() * 1000:.1f}")
+        return ", ".join(parts)
+
+
+class _Stage:
+    __slots__ = ("name", "trace", "start")
+
+    def __init__(self, name, trace):
+        self.name = name
+        self.trace = trace
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        metrics.observe_stage(self.name, elapsed)
+        if self.trace is not None:
+            self.trace.add_stage(self.name, elapsed)
+        return False
+
+
+class _NoopStage:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP_STAGE = _NoopStage()
+
+
+def stage(name):
+    """
+    Times a block as pipeline stage `name`:
+
+        with tracing.stage("yolo_person"):
+            ...
+
+    With TRACING disabled this returns a shared no-op context manager.
+    """
+    if not config.TRACING:
+        return _NOOP_STAGE
+    return _Stage(name, _current.get())
+
+
+def count(name, value=1):
+    """Adds to a per-request count (boxes, ViT calls, OCR boxes, ...)."""
+    if not config.TRACING:
+        return
+    metrics.add_total(name, value)
+    trace = _current.get()
+    if trace is not None:
+        trace.add_count(name, value)
+
+
+def current():
+    return _current.get()
+
+
+def run_in_context(func, *args):
+    """Wraps `func` to run inside a copy of the caller's context (for thread pools)."""
+    context = contextvars.copy_context()
+    return lambda: context.run(func, *args)
+
+
+class TracingMiddleware:
+    """
+    ASGI middleware opening a Trace for requests to `paths`. Adds a Server-Timing
+    header when TRACE_HEADER is set or the client sends 'X-Trace: 1', and records the
+    request latency and per-request counts in the metrics registry.
+    """
+
+    def __init__(self, app, paths):
+        self.app = app
+        self.paths = set(paths)
+
+    async def __call__(self, scope, receive, send):
+        if not config.TRACING or scope["type"] != "http" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        trace = Trace()
+        token = _current.set(trace)
+        wants_header = config.TRACE_HEADER or (b"x-trace", b"1") in scope.get("headers", [])
+
+        async def traced_send(message):
+            if message["type"] == "http.response.start" and wants_header:
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", trace.server_timing().encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, traced_send)
+        finally:
+            _current.reset(token)
+            metrics.observe_request(scope["path"], trace, trace.elapsed())
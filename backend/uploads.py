@@ -0,0 +1,182 @@
+import struct
+
+import cv2
+import numpy as np
+from fastapi import HTTPException
+from starlette.datastructures import Headers, UploadFile
+from starlette.formparsers import MultiPartException, MultiPartParser
+
+import config
+
+# IMREAD_REDUCED_* flags decode JPEGs directly at 1/2, 1/4 or 1/8 resolution
+_REDUCED_FLAGS = [
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2),
+]
+
+
+class UploadLimitMiddleware:
+    """
+    ASGI middleware enforcing MAX_UPLOAD_BYTES while the request body is streamed in,
+    so an oversized upload is rejected with 413 before it is buffered completely.
+    """
+
+    def __init__(self, app, max_bytes=None, path_limits=None):
+        self.app = app
+        self.default_max_bytes = max_bytes or config.MAX_UPLOAD_BYTES
+        # Per-path overrides, e.g. a larger limit for video uploads
+        self.path_limits = path_limits or {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in ("POST", "PUT"):
+            await self.app(scope, receive, send)
+            return
+
+        max_bytes = self.path_limits.get(scope["path"], self.default_max_bytes)
+
+        # Cheap early rejection when the client announces the size
+        content_length = Headers(scope=scope).get("content-length")
+        if content_length and content_length.isdigit() and int(content_length) > max_bytes:
+            await _send_too_large(send, max_bytes)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > max_bytes:
+                    # Raised inside the body read, FastAPI turns it into the 413 response
+                    raise HTTPException(status_code=413, detail=_too_large_detail(max_bytes))
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+def _too_large_detail(max_bytes):
+    return f"Upload exceeds the maximum size of {max_bytes} bytes"
+
+
+async def _send_too_large(send, max_bytes):
+    body = ('{"detail":"%s"}' % _too_large_detail(max_bytes)).encode()
+    await send({
+        "type": "http.response.start",
+        "status": 413,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+# Request body schema of routes that read their upload with read_upload (for the docs)
+UPLOAD_REQUEST_BODY = {
+    "required": True,
+    "content": {"multipart/form-data": {"schema": {
+        "type": "object",
+        "required": ["file"],
+        "properties": {"file": {"type": "string", "format": "binary"}},
+    }}},
+}
+
+
+async def read_upload(request, field="file"):
+    """
+    Parses the multipart body of `request` and returns the UploadFile `field`.
+
+    Unlike FastAPI's File(...) parsing, which spools parts over 1 MB to a temporary
+    file, this keeps an upload of up to MAX_UPLOAD_BYTES in memory. The limit is set on
+    this request's parser only; other routes keep Starlette's defaults.
+    Call it before anything else receives from the request (e.g. a disconnect watcher).
+    """
+    missing = HTTPException(status_code=422, detail=f"Missing '{field}' upload")
+    if not request.headers.get("content-type", "").startswith("multipart/form-data"):
+        raise missing
+    parser = MultiPartParser(request.headers, request.stream())
+    parser.spool_max_size = config.MAX_UPLOAD_BYTES
+    try:
+        form = await parser.parse()
+    except MultiPartException as e:
+        raise HTTPException(status_code=400, detail=e.message)
+    upload = form.get(field)
+    if not isinstance(upload, UploadFile):
+        raise missing
+    return upload
+
+
+def jpeg_size(data):
+    """
+    Returns (width, height) from the JPEG SOF header without decoding, or None
+    if the buffer is not a JPEG.
+    """
+    if data[:2] != b"\xff\xd8":
+        return None
+    offset = 2
+    while offset + 9 < len(data):
+        if data[offset] != 0xFF:
+            offset += 1
+            continue
+        marker = data[offset + 1]
+        # Standalone markers without a length field
+        if marker == 0xFF or marker == 0x01 or 0xD0 <= marker <= 0xD9:
+            offset += 2 if marker != 0xFF else 1
+            continue
+        length = struct.unpack(">H", data[offset + 2:offset + 4])[0]
+        # SOF0..SOF15, except DHT (C4), JPG (C8) and DAC (CC)
+        if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            height, width = struct.unpack(">HH", data[offset + 5:offset + 9])
+            return width, height
+        offset += 2 + length
+    return None
+
+
+def decode_image(data, max_side=None):
+    """
+    Decodes an image straight from the upload bytes with cv2.imdecode.
+
+    Oversized JPEGs are decoded at a reduced resolution (1/2, 1/4 or 1/8) when
+    DECODE_MAX_SIDE is set, as long as the longest side stays >= max_side.
+    Returns (image, (scale_x, scale_y)) where the scale maps coordinates of the
+    decoded image back to the original; image is None if the data is not an image.
+    """
+    if max_side is None:
+        max_side = config.DECODE_MAX_SIDE
+
+    buffer = np.frombuffer(data, dtype=np.uint8)
+    if buffer.size == 0:
+        return None, (1.0, 1.0)
+
+    flags = cv2.IMREAD_COLOR
+    size = jpeg_size(data) if max_side else None
+    if size:
+        longest = max(size)
+        for factor, reduced_flag in _REDUCED_FLAGS:
+            if longest / factor >= max_side:
+                flags = reduced_flag
+                break
+
+    image = cv2.imdecode(buffer, flags)
+    if image is None:
+        return None, (1.0, 1.0)
+
+    if flags == cv2.IMREAD_COLOR:
+        return image, (1.0, 1.0)
+    width, height = size
+    rows, cols = image.shape[:2]
+    # imdecode applies the EXIF orientation, while the SOF header has the stored axes:
+    # a 90 / 270 degree rotation swaps them
+    if abs(cols / width - rows / height) > abs(cols / height - rows / width):
+        width, height = height, width
+    return image, (width / cols, height / rows)
+
+
+def rescale_results(results, scale):
+    """Maps 'box' coordinates from the decoded image back to the original upload."""
+    scale_x, scale_y = scale
+    if scale_x == 1.0 and scale_y == 1.0:
+        return results
+    for det in results:
+        x1, y1, x2, y2 = det['box']
+        det['box'] = [int(x1 * scale_x), int(y1 * scale_y), int(x2 * scale_x), int(y2 * scale_y)]
+    return results
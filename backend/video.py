@@ -0,0 +1,195 @@
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+import config
+from geometry import iou_matrix
+
+STREAM_URL_SCHEMES = ("rtsp://", "rtsps://", "http://", "https://")
+
+
+class _Track:
+    __slots__ = ("track_id", "detection", "box", "velocity", "last_frame", "misses")
+
+    def __init__(self, track_id, detection, frame_index):
+        self.track_id = track_id
+        self.detection = detection
+        self.box = np.asarray(detection['box'], dtype=np.float64)
+        self.velocity = np.zeros(4)
+        self.last_frame = frame_index
+        self.misses = 0
+
+
+class BoxTracker:
+    """
+    Lightweight IoU tracker used to fill in the frames the detector skips.
+
+    On every keyframe, new detections are greedily matched to existing tracks of the
+    same class by IoU; each track keeps a constant per-frame velocity so its box can be
+    propagated to the frames in between. Tracks unmatched for `max_misses` keyframes are
+    dropped, so memory stays bounded by the number of objects in view.
+    """
+
+    def __init__(self, iou_threshold=0.3, max_misses=None):
+        self.iou_threshold = iou_threshold
+        self.max_misses = config.VIDEO_TRACK_MAX_MISSES if max_misses is None else max_misses
+        self.tracks = []
+        self._next_id = 1
+
+    def update(self, detections, frame_index):
+        """Feeds keyframe detections; returns them annotated with 'track_id'."""
+        ious = iou_matrix([t.box for t in self.tracks], [d['box'] for d in detections])
+        matched_tracks = set()
+        matched_dets = set()
+
+        # Greedy matching, best IoU first
+        for flat in np.argsort(-ious, axis=None):
+            ti, di = np.unravel_index(flat, ious.shape)
+            if ious[ti, di] <= self.iou_threshold:
+                break
+            if ti in matched_tracks or di in matched_dets:
+                continue
+            track = self.tracks[ti]
+            if track.detection['class'] != detections[di]['class']:
+                continue
+            new_box = np.asarray(detections[di]['box'], dtype=np.float64)
+            elapsed = max(1, frame_index - track.last_frame)
+            track.velocity = (new_box - track.box) / elapsed
+            track.box = new_box
+            track.detection = detections[di]
+            track.last_frame = frame_index
+            track.misses = 0
+            matched_tracks.add(ti)
+            matched_dets.add(di)
+
+        survivors = []
+        for ti, track in enumerate(self.tracks):
+            if ti not in matched_tracks:
+                track.misses += 1
+                if track.misses > self.max_misses:
+                    continue
+            survivors.append(track)
+        self.tracks = survivors
+
+        for di, det in enumerate(detections):
+            if di not in matched_dets:
+                track = _Track(self._next_id, det, frame_index)
+                self._next_id += 1
+                self.tracks.append(track)
+                matched_dets.add(di)
+
+        by_detection = {id(t.detection): t.track_id for t in self.tracks}
+        return [{**det, 'track_id': by_detection.get(id(det))} for det in detections]
+
+    def predict(self, frame_index, width, height):
+        """Propagated boxes of all live tracks for a skipped frame."""
+        output = []
+        for track in self.tracks:
+            if track.misses:
+                continue
+            box = track.box + track.velocity * (frame_index - track.last_frame)
+            x1, y1, x2, y2 = np.clip(box, 0, [width, height, width, height]).astype(int).tolist()
+            if x2 <= x1 or y2 <= y1:
+                continue
+            output.append({**track.detection, 'box': [x1, y1, x2, y2], 'track_id': track.track_id, 'tracked': True})
+        return output
+
+
+def save_upload(fileobj, suffix=".mp4"):
+    """
+    Copies an uploaded clip to a temporary file in chunks (cv2.VideoCapture needs a
+    path) and returns the path. The caller removes it when done.
+    """
+    with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as tmp:
+        shutil.copyfileobj(fileobj, tmp, 1024 * 1024)
+        return tmp.name
+
+
+def remove_file(path):
+    """Removes a spooled upload; safe to call more than once."""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def open_capture(source):
+    capture = cv2.VideoCapture(source)
+    if not capture.isOpened():
+        return None
+    return capture
+
+
+def _encode(event, payload, fmt):
+    body = json.dumps(payload)
+    if fmt == "sse":
+        return f"event: {event}\ndata: {body}\n\n"
+    return body + "\n"
+
+
+async def stream_detections(capture, detect, call, stride=None, fmt="ndjson", max_frames=None, on_close=None):
+    """
+    Async generator yielding one NDJSON line (or server-sent event) per frame.
+
+    Frames are pulled from `capture` one at a time: skipped frames are only grabbed,
+    never decoded, and keyframes (every `stride` frames) are decoded and passed to
+    `detect`. `call(func, *args)` runs blocking work off the event loop. Nothing is
+    buffered beyond the current frame, so memory is independent of clip length.
+    """
+    stride = max(1, stride or config.VIDEO_STRIDE)
+    if max_frames is None:
+        max_frames = config.VIDEO_MAX_FRAMES
+    tracker = BoxTracker()
+    fps_source = capture.get(cv2.CAP_PROP_FPS) or 0.0
+    width = int(capture.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(capture.get(cv2.CAP_PROP_FRAME_HEIGHT))
+
+    started = time.perf_counter()
+    frame_index = 0
+    keyframes = 0
+    try:
+        while not max_frames or frame_index < max_frames:
+            is_keyframe = frame_index % stride == 0
+
+            if is_keyframe:
+                ok, frame = await call(capture.read)
+                if not ok:
+                    break
+                height, width = frame.shape[:2]
+                detections = await call(detect, frame)
+                results = tracker.update(detections.to_dicts(), frame_index)
+                keyframes += 1
+            else:
+                if not await call(capture.grab):
+                    break
+                results = tracker.predict(frame_index, width, height)
+
+            elapsed = time.perf_counter() - started
+            yield _encode("frame", {
+                "frame": frame_index,
+                "timestamp_ms": round(frame_index * 1000.0 / fps_source, 1) if fps_source else None,
+                "keyframe": is_keyframe,
+                "results": results,
+                "fps": round((frame_index + 1) / elapsed, 2) if elapsed else None,
+            }, fmt)
+            frame_index += 1
+
+        elapsed = time.perf_counter() - started
+        yield _encode("end", {
+            "done": True,
+            "frames": frame_index,
+            "keyframes": keyframes,
+            "stride": stride,
+            "elapsed_s": round(elapsed, 3),
+            "fps": round(frame_index / elapsed, 2) if elapsed else None,
+            "source_fps": fps_source or None,
+        }, fmt)
+    finally:
+        capture.release()
+        if on_close:
+            on_close()
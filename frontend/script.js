@@ -7,7 +7,8 @@ const overlay = document.getElementById('overlay');
 const resultsContent = document.getElementById('results-content');
 const loader = document.getElementById('loader');
 
-const API_URL = '/detect';
+// Compact output: parallel arrays with dictionary-encoded strings (see backend/responses.py)
+const API_URL = '/detect?output=compact';
 
 const backBtn = document.getElementById('back-btn');
 
@@ -97,6 +98,9 @@ async function handleFile(file) {
         if (!response.ok) throw new Error('Detection failed');
 
         const data = await response.json();
+        if (data.format === 'compact') {
+            data.results = expandResults(data.results);
+        }
         currentDetections = data.results; // Store for filtering
 
         // Show Summary
@@ -166,6 +170,24 @@ function filterResults(query) {
     renderResults(filtered);
 }
 
+// Turns the compact columnar results back into one object per detection
+function expandResults(compact) {
+    const dictionaries = compact.dictionaries;
+    const detections = [];
+    for (let i = 0; i < compact.count; i++) {
+        const det = { box: compact.box.slice(4 * i, 4 * i + 4) };
+        ['confidence', 'ocr_text', 'number_plate'].forEach((name) => {
+            if (compact[name][i] !== null) det[name] = compact[name][i];
+        });
+        Object.keys(dictionaries).forEach((name) => {
+            const index = compact[name][i];
+            if (index >= 0) det[name] = dictionaries[name][index];
+        });
+        detections.push(det);
+    }
+    return detections;
+}
+
 function renderResults(detections) {
     // Clear previous
     resultsContent.innerHTML = '';